@@ -5,7 +5,9 @@ from .routes import register_routes
 def create_routes(app):
 
     api_bp = Blueprint('api', __name__, url_prefix='/api')
+    tiles_bp = Blueprint('tiles', __name__, url_prefix='/tiles')
 
-    register_routes(api_bp)
+    register_routes(api_bp, tiles_bp)
 
-    app.register_blueprint(api_bp)
\ No newline at end of file
+    app.register_blueprint(api_bp)
+    app.register_blueprint(tiles_bp)
\ No newline at end of file
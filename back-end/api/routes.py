@@ -1,11 +1,132 @@
-from flask import jsonify, request
-from services.data_service import DataService
+import datetime
+import math
+from flask import Response, current_app, jsonify, request
+from services.loader import ServiceLoader
+from config import DEFAULT_AGENCY, STARTUP_MODE, STARTUP_TARGET_SECONDS, TILE_MAX_ZOOM
+from utils.timing import phase_stats
+from utils.admission import admission
 
 
-def register_routes(bp):
+# Latest timestamp accepted by parse_timestamp (9999-12-31T23:59:59Z)
+MAX_TIMESTAMP = 253402300799
 
-   # Initialize data service
-   data_service = DataService()
+
+def parse_timestamp(value):
+   """
+   Parse a timestamp query parameter
+
+   Args:
+       value (str): Unix seconds or ISO 8601 string
+
+   Returns:
+       float: Unix timestamp, or None if invalid, not finite or outside 1970-9999
+   """
+   try:
+       timestamp = float(value)
+   except ValueError:
+       try:
+           timestamp = datetime.datetime.fromisoformat(value).timestamp()
+       except (ValueError, OverflowError, OSError):
+           return None
+
+   if not math.isfinite(timestamp) or not 0 <= timestamp <= MAX_TIMESTAMP:
+       return None
+   return timestamp
+
+
+def parse_service_date(value):
+   """
+   Parse a service date query parameter
+
+   Args:
+       value (str): YYYYMMDD or YYYY-MM-DD, or None
+
+   Returns:
+       tuple: (datetime.date or None, error dict or None)
+   """
+   if not value:
+       return None, None
+
+   for fmt in ('%Y%m%d', '%Y-%m-%d'):
+       try:
+           return datetime.datetime.strptime(value, fmt).date(), None
+       except ValueError:
+           pass
+
+   return None, {"error": f"Invalid date: {value}"}
+
+
+def parse_departure_time(value):
+   """
+   Parse a departure time query parameter
+
+   Args:
+       value (str): HH:MM or HH:MM:SS (hours may exceed 24), or None
+
+   Returns:
+       tuple: (seconds after midnight or None, error dict or None)
+   """
+   if not value:
+       return None, None
+
+   parts = value.split(':')
+   if len(parts) in (2, 3) and all(part.isdigit() for part in parts):
+       hours, minutes, seconds = (int(part) for part in parts + ['0'] * (3 - len(parts)))
+       if minutes < 60 and seconds < 60 and hours < 48:
+           return hours * 3600 + minutes * 60 + seconds, None
+
+   return None, {"error": f"Invalid time: {value}"}
+
+
+# Realtime feed output formats by media type
+FEED_FORMATS = {
+   'application/json': 'json',
+   'application/x-protobuf': 'protobuf',
+   'application/protobuf': 'protobuf',
+   'application/vnd.google.protobuf': 'protobuf',
+   'application/msgpack': 'msgpack',
+   'application/x-msgpack': 'msgpack',
+}
+FORMAT_MIMETYPES = {'protobuf': 'application/x-protobuf', 'msgpack': 'application/msgpack'}
+
+
+def negotiate_format():
+   """
+   Pick the realtime feed output format from ?format= or the Accept header
+
+   Returns:
+       str: 'json', 'protobuf' or 'msgpack', or None for an unknown ?format=
+   """
+   fmt = request.args.get('format')
+   if fmt:
+       return fmt if fmt in FEED_FORMATS.values() else None
+
+   best = request.accept_mimetypes.best_match(list(FEED_FORMATS), default='application/json')
+   return FEED_FORMATS[best]
+
+
+def parse_list(name):
+   """
+   Parse a comma-separated or repeated query parameter
+
+   Args:
+       name (str): Parameter name
+
+   Returns:
+       set: Values, or None if absent
+   """
+   values = {value for arg in request.args.getlist(name) for value in arg.split(',') if value}
+   return values or None
+
+
+def register_routes(bp, tiles_bp=None):
+
+   # Initialize data service (heavy imports and static indexes) per STARTUP_MODE
+   data_service = ServiceLoader('services.data_service', 'DataService')
+   if STARTUP_MODE == 'background':
+       data_service.start_background()
+   elif STARTUP_MODE != 'lazy':
+       data_service.get()
 
    @bp.route('/feeds')
    def list_feeds():
@@ -13,11 +134,47 @@ def register_routes(bp):
        feeds = data_service.get_available_feeds()
        return jsonify(feeds)
 
+   def feed_response(category, feed_id, get_feed):
+       """
+       Serve a realtime feed as JSON, protobuf or MessagePack
+
+       Protobuf can be filtered with ?route_id= and ?entity=trip_update,vehicle,alert.
+       """
+       fmt = negotiate_format()
+       if fmt is None:
+           response = jsonify({"error": f"Invalid format: {request.args.get('format')}"})
+       elif fmt == 'json':
+           response = jsonify(get_feed(feed_id))
+       else:
+           data, error = data_service.get_feed_bytes(
+               category, feed_id, fmt, parse_list('route_id'), parse_list('entity')
+           )
+           response = jsonify(error) if error else Response(data, mimetype=FORMAT_MIMETYPES[fmt])
+
+       response.vary.add('Accept')
+       return response
+
    @bp.route('/health')
    def health_check():
        """Health check endpoint"""
        return jsonify({"status": "ok", "message": "Service is running"})
 
+   @bp.route('/ready')
+   def readiness_check():
+       """Readiness check: 503 until the data service can answer without a cold build"""
+       ready = data_service.state == "ready" or (STARTUP_MODE == 'lazy' and data_service.state != "failed")
+       first_response = current_app.extensions.get('startup', {}).get('first_response_seconds')
+       return jsonify({
+           "ready": ready,
+           "mode": STARTUP_MODE,
+           "state": data_service.state,
+           "load_seconds": data_service.load_seconds,
+           "error": data_service.error,
+           "first_response_seconds": first_response,
+           "target_seconds": STARTUP_TARGET_SECONDS,
+           "target_met": None if first_response is None else first_response <= STARTUP_TARGET_SECONDS
+       }), 200 if ready else 503
+
    # Subway endpoints
    @bp.route('/subway/feeds')
    def list_subway_feeds():
@@ -26,30 +183,131 @@ def register_routes(bp):
 
    @bp.route('/subway/feeds/<feed_id>')
    def get_subway_feed(feed_id):
-       """Get data for specific subway feed"""
-       data = data_service.get_subway_feed(feed_id)
+       """Get data for specific subway feed (JSON, or protobuf/MessagePack via Accept or ?format=)"""
+       return feed_response('subway', feed_id, data_service.get_subway_feed)
+
+   @bp.route('/subway/feeds/<feed_id>/predictions')
+   def get_subway_predictions(feed_id):
+       """Get full per-trip ETA vectors for a subway feed (optional ?trip_id=)"""
+       data = data_service.get_subway_predictions(feed_id, request.args.get('trip_id'))
+       return jsonify(data)
+
+   @bp.route('/subway/feeds/<feed_id>/positions')
+   def get_subway_positions(feed_id):
+       """Get train positions interpolated along shapes (optional ?at= time)"""
+       at = request.args.get('at')
+       timestamp = parse_timestamp(at) if at is not None else None
+       if at is not None and timestamp is None:
+           return jsonify({"error": f"Invalid timestamp: {at}"})
+
+       data = data_service.get_subway_positions(feed_id, timestamp)
        return jsonify(data)
 
    # LIRR endpoints
    @bp.route('/lirr/feeds/<feed_id>')
    def get_lirr_feed(feed_id):
-       """Get LIRR data"""
-       data = data_service.get_lirr_feed(feed_id)
-       return jsonify(data)
+       """Get LIRR data (JSON, or protobuf/MessagePack via Accept or ?format=)"""
+       return feed_response('lirr', feed_id, data_service.get_lirr_feed)
 
    # Metro-North endpoints
    @bp.route('/mnr/feeds/<feed_id>')
    def get_mnr_feed(feed_id):
-       """Get Metro-North data"""
-       data = data_service.get_mnr_feed(feed_id)
+       """Get Metro-North data (JSON, or protobuf/MessagePack via Accept or ?format=)"""
+       return feed_response('mnr', feed_id, data_service.get_mnr_feed)
+
+   # Historical replay endpoints
+   @bp.route('/replay/<category>/feeds/<feed_id>')
+   def get_replay_feed(category, feed_id):
+       """Get an archived feed as it was at a given time (?at=unix seconds or ISO 8601)"""
+       at = request.args.get('at')
+       if at is None:
+           return jsonify({"error": "Missing 'at' parameter"})
+
+       timestamp = parse_timestamp(at)
+       if timestamp is None:
+           return jsonify({"error": f"Invalid timestamp: {at}"})
+
+       data = data_service.get_replay_feed(category, feed_id, timestamp)
+       return jsonify(data)
+
+   # Realtime analytics endpoints
+   @bp.route('/analytics/routes')
+   def get_route_analytics():
+       """Get rolling delay and headway statistics for all routes, by feed category"""
+       return jsonify(data_service.analytics.get_route_summaries())
+
+   @bp.route('/analytics/routes/<route_id>')
+   def get_route_analytics_detail(route_id):
+       """Get rolling delay and headway statistics for a route (?category=subway|lirr|mnr)"""
+       return jsonify(data_service.analytics.get_route(route_id, request.args.get('category', 'subway')))
+
+   @bp.route('/analytics/routes/<route_id>/schedule')
+   def get_route_headway_comparison(route_id):
+       """Compare realtime headways with scheduled ones for the current hour"""
+       return jsonify(data_service.get_headway_comparison(route_id))
+
+   @bp.route('/analytics/stations/<stop_id>')
+   def get_station_analytics(stop_id):
+       """Get rolling delay and headway statistics for a station (?category=subway|lirr|mnr)"""
+       return jsonify(data_service.analytics.get_station(stop_id, request.args.get('category', 'subway')))
+
+   @bp.route('/timing/feeds')
+   def get_feed_timing():
+       """Get fetch / parse / serialize latency per feed over recent requests"""
+       return jsonify(phase_stats.summary())
+
+   @bp.route('/admission')
+   def get_admission():
+       """Get admission control limits, in-flight and queued computations and shed counts per cost class"""
+       return jsonify(admission.get_stats())
+
+   # Notification subscription endpoints
+   @bp.route('/subscriptions', methods=['POST'])
+   def create_subscription():
+       """Subscribe to a route and/or stop (JSON: route_id, stop_id, category, min_delay, alerts, webhook_url)"""
+       body = request.get_json(silent=True)
+       if not isinstance(body, dict):
+           return jsonify({"error": "Expected a JSON object"})
+
+       data = data_service.subscriptions.subscribe(
+           route_id=body.get('route_id'),
+           stop_id=body.get('stop_id'),
+           min_delay=body.get('min_delay'),
+           alerts=body.get('alerts', True),
+           webhook_url=body.get('webhook_url'),
+           client=request.remote_addr,
+           category=body.get('category', 'subway')
+       )
+       return jsonify(data)
+
+   @bp.route('/subscriptions/stats')
+   def get_subscription_stats():
+       """Get subscription counts and notification queue depth"""
+       return jsonify(data_service.subscriptions.get_stats())
+
+   @bp.route('/subscriptions/<subscription_id>', methods=['GET', 'DELETE'])
+   def subscription(subscription_id):
+       """Get or delete a subscription"""
+       if request.method == 'DELETE':
+           removed = data_service.subscriptions.unsubscribe(subscription_id)
+           return jsonify({"deleted": True} if removed else {"error": f"Unknown subscription: {subscription_id}"})
+
+       data = data_service.subscriptions.get(subscription_id)
+       return jsonify(data or {"error": f"Unknown subscription: {subscription_id}"})
+
+   @bp.route('/subscriptions/<subscription_id>/notifications')
+   def get_subscription_notifications(subscription_id):
+       """Take pending notifications of a subscription without a webhook"""
+       data = data_service.subscriptions.notifications(subscription_id)
+       if data is None:
+           return jsonify({"error": f"Unknown subscription: {subscription_id}"})
        return jsonify(data)
 
    # Service alert endpoints
    @bp.route('/alerts/<alert_type>')
    def get_service_alerts(alert_type):
-       """Get service alerts"""
-       data = data_service.get_service_alerts(alert_type)
-       return jsonify(data)
+       """Get service alerts (JSON, or protobuf/MessagePack via Accept or ?format=)"""
+       return feed_response('alerts', alert_type, data_service.get_service_alerts)
 
    # Accessibility endpoints
    @bp.route('/accessibility/<data_type>')
@@ -64,32 +322,135 @@ def register_routes(bp):
        data = data_service.get_station_accessibility(station_id)
        return jsonify(data)
 
+   @bp.route('/service-calendar')
+   def get_service_calendar():
+       """Get the services running on a date (optional ?date=YYYYMMDD)"""
+       date, error = parse_service_date(request.args.get('date'))
+       if error:
+           return jsonify(error)
+
+       return jsonify(data_service.get_service_calendar(request.args.get('agency', DEFAULT_AGENCY), date))
+
    @bp.route('/stations')
    def list_stations():
        """List all stations"""
-       stations = data_service.get_stations()
+       stations = data_service.get_stations(request.args.get('agency', DEFAULT_AGENCY))
        return jsonify(stations)
 
+   @bp.route('/stations/search')
+   def search_stations():
+       """Search stations by name (?q=, optional ?limit= and ?agency=)"""
+       query = request.args.get('q', '')
+       limit = request.args.get('limit', 10, type=int)
+       data = data_service.search_stations(query, max(1, min(limit, 50)), request.args.get('agency'))
+       return jsonify(data)
+
+   @bp.route('/complexes')
+   def list_complexes():
+       """List station complexes (stations grouped by parent station and transfers)"""
+       complexes = data_service.get_complexes(request.args.get('agency', DEFAULT_AGENCY))
+       return jsonify(complexes)
+
+   @bp.route('/complexes/<complex_id>')
+   def get_complex(complex_id):
+       """Get a complex's stations, platforms, routes and transfers; accepts any member stop ID"""
+       data = data_service.get_complex(complex_id, request.args.get('agency', DEFAULT_AGENCY))
+       return jsonify(data)
+
+   @bp.route('/complexes/<complex_id>/routes')
+   def get_complex_routes(complex_id):
+       """Get all routes serving a complex; accepts any member stop ID"""
+       data = data_service.get_complex_routes(complex_id, request.args.get('agency', DEFAULT_AGENCY))
+       return jsonify(data)
+
+   @bp.route('/stations/<stop_id>/isochrone')
+   def get_isochrone(stop_id):
+       """Stations reachable within ?minutes= (default 30) leaving at ?time=HH:MM on ?date="""
+       date, error = parse_service_date(request.args.get('date'))
+       if error:
+           return jsonify(error)
+       departure, error = parse_departure_time(request.args.get('time'))
+       if error:
+           return jsonify(error)
+
+       minutes = request.args.get('minutes', 30, type=int)
+       data = data_service.get_isochrone(stop_id, minutes, departure, request.args.get('agency', DEFAULT_AGENCY), date)
+       return jsonify(data)
+
    @bp.route('/routes')
    def list_routes():
        """List all routes"""
-       routes = data_service.get_routes()
+       routes = data_service.get_routes(request.args.get('agency', DEFAULT_AGENCY))
        return jsonify(routes)
 
+   @bp.route('/routes/batch')
+   def get_routes_batch():
+       """Get shapes and stops of many routes in one response (?ids=A,C,E&include=shape,stops)"""
+       date, error = parse_service_date(request.args.get('date'))
+       if error:
+           return jsonify(error)
+
+       data = data_service.get_routes_batch(
+           parse_list('ids'), parse_list('include'), request.args.get('agency', DEFAULT_AGENCY), date
+       )
+       return jsonify(data)
+
    @bp.route('/routes/<route_id>/shape')
    def get_route_shape(route_id):
        """Get shape for a specific route"""
-       shape_data = data_service.get_line_shape(route_id)
+       date, error = parse_service_date(request.args.get('date'))
+       if error:
+           return jsonify(error)
+
+       shape_data = data_service.get_line_shape(route_id, request.args.get('agency', DEFAULT_AGENCY), date)
        return jsonify(shape_data)
 
+   @bp.route('/routes/<route_id>/frequencies')
+   def get_route_frequencies(route_id):
+       """Get scheduled trips and headways by hour (optional ?stop_id=, ?date=, ?service_id=, ?direction=)"""
+       date, error = parse_service_date(request.args.get('date'))
+       if error:
+           return jsonify(error)
+
+       data = data_service.get_frequencies(
+           route_id, request.args.get('agency', DEFAULT_AGENCY), request.args.get('stop_id'), date,
+           request.args.get('service_id'), request.args.get('direction', type=int)
+       )
+       return jsonify(data)
+
    @bp.route('/routes/<route_id>/stops')
    def get_route_stops(route_id):
        """Get stops for a specific route"""
-       stops_data = data_service.get_stops_for_route(route_id)
+       date, error = parse_service_date(request.args.get('date'))
+       if error:
+           return jsonify(error)
+
+       stops_data = data_service.get_stops_for_route(route_id, request.args.get('agency', DEFAULT_AGENCY), date)
        return jsonify(stops_data)
 
    @bp.route('/line/<line_id>')
    def get_line(line_id):
        """Get line coordinates"""
-       line_data = data_service.get_line(line_id)
-       return jsonify(line_data)
\ No newline at end of file
+       date, error = parse_service_date(request.args.get('date'))
+       if error:
+           return jsonify(error)
+
+       line_data = data_service.get_line(line_id, request.args.get('agency', DEFAULT_AGENCY), date)
+       return jsonify(line_data)
+
+   if tiles_bp is not None:
+       @tiles_bp.route('/<int:z>/<int:x>/<int:y>')
+       @tiles_bp.route('/<int:z>/<int:x>/<int:y>.mvt')
+       @tiles_bp.route('/<int:z>/<int:x>/<int:y>.pbf')
+       def get_tile(z, x, y):
+           """Get a Mapbox Vector Tile of stations and route shapes"""
+           if z > TILE_MAX_ZOOM or x >= (1 << z) or y >= (1 << z):
+               return jsonify({"error": f"Invalid tile: {z}/{x}/{y}"}), 404
+
+           data = data_service.get_tile(z, x, y, request.args.get('agency', DEFAULT_AGENCY))
+           if isinstance(data, dict):
+               return jsonify(data), 404
+
+           response = Response(data, mimetype='application/vnd.mapbox-vector-tile')
+           response.headers['Cache-Control'] = 'public, max-age=86400'
+           return response
@@ -1,6 +1,16 @@
+import os
+import time
+import click
 from flask import Flask
 from flask_cors import CORS
 from api import create_routes
+from utils import admission, metrics, profiler, timing
+from config import (
+    PROFILER_ENABLED, PROFILER_THRESHOLD, PROFILER_INTERVAL, PROFILER_MAX_PROFILES, PROFILER_ADMIN_TOKEN,
+    TIMING_LOG_ENABLED, STARTUP_TARGET_SECONDS, STATIC_FEEDS, STATIC_CHUNK_ROWS, CACHE_TIMEOUT
+)
+
+PROCESS_START = time.time()
 
 
 def create_app():
@@ -12,6 +22,53 @@ def create_app():
     # 注册路由
     create_routes(app)
 
+    # Time from process start to the first response, reported by /api/ready
+    startup = app.extensions['startup'] = {"first_response_seconds": None}
+
+    @app.after_request
+    def record_first_response(response):
+        if startup["first_response_seconds"] is None:
+            startup["first_response_seconds"] = time.time() - PROCESS_START
+            met = 'met' if startup["first_response_seconds"] <= STARTUP_TARGET_SECONDS else 'missed'
+            print(f"First response after {startup['first_response_seconds']:.3f}s "
+                  f"(target {STARTUP_TARGET_SECONDS}s {met})")
+        return response
+
+    # Fetch / parse / serialize timing (Server-Timing header, logs, /api/timing/feeds)
+    timing.init_app(app, TIMING_LOG_ENABLED)
+
+    # Prometheus metrics at /metrics
+    metrics.init_app(app)
+
+    # 503 + Retry-After when cold computations exceed their cost class limits
+    admission.init_app(app)
+
+    # Sampling profiler for slow requests, served under /admin/profiles
+    if PROFILER_ENABLED:
+        profiler.init_app(
+            app,
+            profiler.RequestProfiler(PROFILER_THRESHOLD, PROFILER_INTERVAL, PROFILER_MAX_PROFILES),
+            PROFILER_ADMIN_TOKEN
+        )
+
+    @app.cli.command('pregenerate-tiles')
+    @click.option('--min-zoom', default=10, help='Lowest zoom level to render')
+    @click.option('--max-zoom', default=15, help='Highest zoom level to render')
+    @click.option('--agency', default='subway', help='Static feed to render')
+    def pregenerate_tiles(min_zoom, max_zoom, agency):
+        """Render vector tiles for the agency's extent into the tile cache"""
+        # Only the one static feed is needed; DataService would also start realtime feeds and the feed store
+        from services.tile_service import TileService
+        from utils.gtfs_static import StaticFeed
+
+        source = STATIC_FEEDS.get(agency)
+        if source is None or not os.path.exists(source):
+            raise click.ClickException(f"No static data for agency: {agency}")
+
+        tiles = TileService(StaticFeed(source, STATIC_CHUNK_ROWS), agency)
+        count = tiles.pregenerate(range(min_zoom, max_zoom + 1), CACHE_TIMEOUT['tiles_default'])
+        click.echo(f"Generated {count} tiles")
+
     return app
 
 
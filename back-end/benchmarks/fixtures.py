@@ -0,0 +1,77 @@
+import os
+import requests
+from simulator.feeds import FEED_GROUPS, synthetic_feed, synthetic_accessibility
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+
+
+def fixture_path(category, feed_id):
+    """
+    Get the path of a recorded fixture
+
+    Args:
+        category (str): Feed category
+        feed_id (str): Feed ID
+
+    Returns:
+        str: Fixture file path
+    """
+    extension = 'json' if category == 'accessibility' else 'pb'
+    return os.path.join(FIXTURES_DIR, f"{category}_{feed_id}.{extension}")
+
+
+def load_fixtures(generate=True):
+    """
+    Load every recorded fixture, keyed by upstream URL
+
+    Args:
+        generate (bool): Write deterministic synthetic fixtures for feeds
+            that have not been recorded
+
+    Returns:
+        dict: URL -> payload bytes
+    """
+    payloads = {}
+    for category, feeds in FEED_GROUPS.items():
+        for feed_id, url in feeds.items():
+            path = fixture_path(category, feed_id)
+            if not os.path.exists(path):
+                if not generate:
+                    continue
+                os.makedirs(FIXTURES_DIR, exist_ok=True)
+                if category == 'accessibility':
+                    data = synthetic_accessibility(feed_id, timestamp=1740000000)
+                else:
+                    data = synthetic_feed(category, feed_id, timestamp=1740000000)
+                with open(path, 'wb') as f:
+                    f.write(data)
+
+            with open(path, 'rb') as f:
+                payloads[url] = f.read()
+
+    return payloads
+
+
+def record():
+    """
+    Record the live upstream feeds as fixtures
+
+    Returns:
+        dict: Fixture path -> size in bytes, or error message
+    """
+    os.makedirs(FIXTURES_DIR, exist_ok=True)
+    recorded = {}
+    for category, feeds in FEED_GROUPS.items():
+        for feed_id, url in feeds.items():
+            path = fixture_path(category, feed_id)
+            try:
+                response = requests.get(url.strip(), timeout=30)
+                if response.status_code != 200:
+                    recorded[path] = f"HTTP error: {response.status_code}"
+                    continue
+                with open(path, 'wb') as f:
+                    f.write(response.content)
+                recorded[path] = len(response.content)
+            except Exception as e:
+                recorded[path] = str(e)
+    return recorded
@@ -0,0 +1,326 @@
+"""
+DataService benchmark suite
+
+Runs offline against recorded GTFS-RT fixtures and the checked-in static
+GTFS data. Run from the back-end directory:
+
+    python -m benchmarks.run                  # run and write results
+    python -m benchmarks.run --compare OLD    # also diff against a previous run
+    python -m benchmarks.run record           # re-record fixtures from the live feeds
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import time
+import tracemalloc
+import requests
+from benchmarks.fixtures import FEED_GROUPS, load_fixtures, record
+from config import SUBWAY_FEEDS, LIRR_FEEDS, MNR_FEEDS, SERVICE_ALERT_FEEDS, ELEVATOR_ESCALATOR_FEEDS
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), 'results')
+SUBSCRIPTION_COUNT = 100000  # Subscriptions matched per feed refresh in the subscription cases
+
+# Sample values for URL parameters of the /api routes
+ROUTE_PARAMS = {
+    'feed_id': list(SUBWAY_FEEDS),
+    'alert_type': list(SERVICE_ALERT_FEEDS),
+    'data_type': list(ELEVATOR_ESCALATOR_FEEDS),
+    'category': ['subway'],
+    'route_id': ['1', 'A', 'L'],
+    'line_id': ['1', 'A', 'L'],
+    'station_id': ['101'],
+    'stop_id': ['101S'],
+}
+
+# feed_id samples for routes outside the subway
+FEED_IDS = {
+    '/api/lirr/': list(LIRR_FEEDS),
+    '/api/mnr/': list(MNR_FEEDS),
+}
+
+
+class FixtureResponse:
+    """
+    Stand-in for requests.Response serving a recorded payload
+    """
+
+    def __init__(self, content):
+        self.content = content
+        self.status_code = 200 if content is not None else 404
+
+    def json(self):
+        return json.loads(self.content)
+
+
+def install_fixtures():
+    """
+    Route requests.get to the recorded fixtures
+
+    Returns:
+        int: Number of fixtures loaded
+    """
+    payloads = load_fixtures()
+    by_url = {url.strip(): data for url, data in payloads.items()}
+    requests.get = lambda url, *args, **kwargs: FixtureResponse(by_url.get(url.strip()))
+    return len(payloads)
+
+
+def percentile(samples, fraction):
+    """
+    Get a percentile of sorted samples
+
+    Args:
+        samples (list): Sorted samples
+        fraction (float): Percentile as a fraction (0.5 for p50)
+
+    Returns:
+        float: Sample at the percentile
+    """
+    return samples[min(len(samples) - 1, int(round(fraction * (len(samples) - 1))))]
+
+
+def measure(func, iterations, setup=None):
+    """
+    Time a callable and record its peak memory
+
+    Latency is measured without tracemalloc; one extra traced call
+    measures peak allocation.
+
+    Args:
+        func (callable): Code under test
+        iterations (int): Timed calls
+        setup (callable): Run before every call, outside the timing
+
+    Returns:
+        dict: Latency percentiles in milliseconds and peak memory in KiB
+    """
+    samples = []
+    for _ in range(iterations):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+
+    if setup:
+        setup()
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    samples.sort()
+    return {
+        "iterations": iterations,
+        "p50_ms": round(percentile(samples, 0.5), 4),
+        "p99_ms": round(percentile(samples, 0.99), 4),
+        "mean_ms": round(sum(samples) / len(samples), 4),
+        "peak_kib": round(peak / 1024, 1)
+    }
+
+
+def api_urls(app):
+    """
+    Expand every /api route into concrete sample URLs
+
+    Args:
+        app (Flask): Application
+
+    Returns:
+        list: URLs
+    """
+    urls = []
+    for rule in sorted(app.url_map.iter_rules(), key=lambda r: r.rule):
+        if not rule.rule.startswith('/api') or 'GET' not in rule.methods:
+            continue
+
+        names = re.findall(r'<(?:[^:<>]+:)?([^<>]+)>', rule.rule)
+        if any(name not in ROUTE_PARAMS for name in names):
+            continue
+
+        url = rule.rule
+        for name in names:
+            values = ROUTE_PARAMS[name]
+            if name == 'feed_id':
+                values = next((ids for prefix, ids in FEED_IDS.items() if url.startswith(prefix)), values)
+            url = re.sub(rf'<(?:[^:<>]+:)?{name}>', values[0], url)
+        if 'replay' in url:
+            url += f"?at={int(time.time())}"
+        urls.append(url)
+
+    return urls
+
+
+def run(iterations, name_filter=None):
+    """
+    Run every benchmark
+
+    Args:
+        iterations (int): Timed iterations per case
+        name_filter (str): Only run cases whose name contains this
+
+    Returns:
+        dict: Case name -> measurements
+    """
+    install_fixtures()
+
+    from app import create_app
+    from services.data_service import DataService
+    from utils.cache import SimpleCache, cache
+
+    cases = {}
+
+    def add(name, func, setup=None, count=iterations):
+        if name_filter and name_filter not in name:
+            return
+        cases[name] = measure(func, count, setup)
+        print(f"{name:60s} p50 {cases[name]['p50_ms']:9.3f} ms  p99 {cases[name]['p99_ms']:9.3f} ms  "
+              f"peak {cases[name]['peak_kib']:10.1f} KiB")
+
+    # Startup: static indexes for every configured agency
+    add('startup/DataService', DataService, count=max(1, iterations // 10))
+
+    service = DataService()
+
+    # GTFS-RT parsing per recorded feed
+    payloads = load_fixtures()
+    for category, feeds in FEED_GROUPS.items():
+        if category == 'accessibility':
+            continue
+        for feed_id, url in feeds.items():
+            content = payloads[url]
+            add(f"parse_gtfs_rt/{category}/{feed_id}", lambda c=content, f=feed_id: service.parse_gtfs_rt(c, f))
+
+    # SimpleCache primitives
+    simple = SimpleCache()
+    simple.set('hit', {"value": 1})
+    add('cache/get_hit', lambda: [simple.get('hit', 60) for _ in range(1000)])
+    add('cache/get_miss', lambda: [simple.get('miss', 60) for _ in range(1000)])
+    add('cache/set', lambda: [simple.set(f"key{i}", i) for i in range(1000)])
+
+    # Subscription matching against consecutive simulator snapshots
+    add_subscription_cases(add)
+
+    # Every /api route through the test client, cold (empty cache) and warm
+    client = create_app().test_client()
+    for url in api_urls(client.application):
+        add(f"api/cold{url}", lambda u=url: client.get(u), setup=cache.clear)
+        client.get(url)
+        add(f"api/warm{url}", lambda u=url: client.get(u))
+
+    return cases
+
+
+def add_subscription_cases(add, count=SUBSCRIPTION_COUNT):
+    """
+    Time one feed refresh against many route, stop and delay subscriptions
+
+    Args:
+        add (callable): Registers a benchmark case
+        count (int): Subscriptions
+    """
+    from services.subscription_service import NotificationDispatcher, SubscriptionService
+    from simulator.feeds import synthetic_feed
+    from utils.gtfs_parser import parse_feed
+
+    # Queue notifications without delivering them, so only matching is timed
+    dispatcher = NotificationDispatcher(maxsize=10 ** 9, workers=0)
+    matcher = SubscriptionService(dispatcher=dispatcher, max_subscriptions=count)
+    rng = random.Random(0)
+    for i in range(count):
+        stop_id = f"{100 + rng.randrange(400)}{rng.choice('NS')}" if i % 2 else None
+        matcher.subscribe(route_id=None if stop_id else rng.choice('1234567ACEBDFMGJZNQRWL'), stop_id=stop_id,
+                          min_delay=rng.choice((None, 60, 120, 300)), alerts=True)
+
+    now = int(time.time())
+    trips = [parse_feed(synthetic_feed('subway', 'ace', now + 30 * k), 'ace') for k in range(2)]
+    alerts = [parse_feed(synthetic_feed('alerts', 'subway', now + 3600 * k), 'subway') for k in range(2)]
+
+    # Feed keys name the category the subscriptions are matched in
+    def reset(kind, feed_key, snapshots):
+        dispatcher.clear()
+        getattr(matcher, f"process_{kind}")(feed_key, snapshots[0])
+
+    add(f"subscriptions/trips_{count}", lambda: matcher.process_trips('subway_ace', trips[1]),
+        setup=lambda: reset('trips', 'subway_ace', trips))
+    add(f"subscriptions/alerts_{count}", lambda: matcher.process_alerts('alert_subway_alerts', alerts[1]),
+        setup=lambda: reset('alerts', 'alert_subway_alerts', alerts))
+
+
+def git_revision():
+    """
+    Get the current git commit, if available
+
+    Returns:
+        str: Commit hash or None
+    """
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, previous):
+    """
+    Print latency changes against a previous run
+
+    Args:
+        current (dict): Case results of this run
+        previous (dict): Case results of the previous run
+    """
+    print(f"\n{'case':60s} {'p50 change':>12s} {'p99 change':>12s}")
+    for name, result in current.items():
+        old = previous.get(name)
+        if not old:
+            continue
+        deltas = []
+        for key in ('p50_ms', 'p99_ms'):
+            deltas.append(f"{(result[key] - old[key]) / old[key] * 100:+11.1f}%" if old[key] else f"{'n/a':>12s}")
+        print(f"{name:60s} {deltas[0]} {deltas[1]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark DataService hot paths against recorded fixtures')
+    parser.add_argument('command', nargs='?', default='run', choices=['run', 'record'])
+    parser.add_argument('--iterations', type=int, default=50, help='Timed iterations per case')
+    parser.add_argument('--filter', help='Only run cases whose name contains this')
+    parser.add_argument('--output', help='Results file (default: benchmarks/results/<timestamp>.json)')
+    parser.add_argument('--compare', help='Previous results file to compare against')
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        for path, outcome in record().items():
+            print(f"{path}: {outcome}")
+        return
+
+    cases = run(args.iterations, args.filter)
+
+    results = {
+        "meta": {
+            "timestamp": datetime.datetime.now().isoformat(timespec='seconds'),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "iterations": args.iterations
+        },
+        "results": cases
+    }
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{datetime.datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(cases, json.load(f)["results"])
+
+
+if __name__ == '__main__':
+    main()
@@ -1,37 +1,50 @@
 """Application configuration"""
+import os
+
+# Upstream feed base URL; point at the local simulator (python -m simulator) to test offline
+MTA_FEED_BASE_URL = os.environ.get('MTA_FEED_BASE_URL', 'https://api-endpoint.mta.info').rstrip('/')
+MTA_FEED_PATH = f"{MTA_FEED_BASE_URL}/Dataservice/mtagtfsfeeds"
 
 # Data feed URLs
 SUBWAY_FEEDS = {
-   'ace': 'https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/nyct%2Fgtfs-ace',
-   'bdfm': 'https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/nyct%2Fgtfs-bdfm',
-   'g' :'https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/nyct%2Fgtfs-g',
-   'jz' : 'https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/nyct%2Fgtfs-jz',
-   'nqrw': 'https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/nyct%2Fgtfs-nqrw',
-   'l':'https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/nyct%2Fgtfs-l',
-   'num_s':'https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/nyct%2Fgtfs',
-   'sir': 'https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/nyct%2Fgtfs-si'
+   'ace': f"{MTA_FEED_PATH}/nyct%2Fgtfs-ace",
+   'bdfm': f"{MTA_FEED_PATH}/nyct%2Fgtfs-bdfm",
+   'g': f"{MTA_FEED_PATH}/nyct%2Fgtfs-g",
+   'jz': f"{MTA_FEED_PATH}/nyct%2Fgtfs-jz",
+   'nqrw': f"{MTA_FEED_PATH}/nyct%2Fgtfs-nqrw",
+   'l': f"{MTA_FEED_PATH}/nyct%2Fgtfs-l",
+   'num_s': f"{MTA_FEED_PATH}/nyct%2Fgtfs",
+   'sir': f"{MTA_FEED_PATH}/nyct%2Fgtfs-si"
 }
 
 LIRR_FEEDS = {
-   'lirr': ' https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/lirr%2Fgtfs-lirr'
+   'lirr': f"{MTA_FEED_PATH}/lirr%2Fgtfs-lirr"
 }
 
 MNR_FEEDS = {
-   'mnr':'https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/mnr%2Fgtfs-mnr'
+   'mnr': f"{MTA_FEED_PATH}/mnr%2Fgtfs-mnr"
 }
 
 SERVICE_ALERT_FEEDS = {
-   'all_alerts':'https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/camsys%2Fall-alerts',
-   'subway_alerts':'https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/camsys%2Fsubway-alerts',
-   'bus_alerts':'https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/camsys%2Fbus-alerts',
-   'lirr_alerts':'https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/camsys%2Flirr-alerts',
-   'mnr_alerts': 'https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/camsys%2Fmnr-alerts'
+   'all_alerts': f"{MTA_FEED_PATH}/camsys%2Fall-alerts",
+   'subway_alerts': f"{MTA_FEED_PATH}/camsys%2Fsubway-alerts",
+   'bus_alerts': f"{MTA_FEED_PATH}/camsys%2Fbus-alerts",
+   'lirr_alerts': f"{MTA_FEED_PATH}/camsys%2Flirr-alerts",
+   'mnr_alerts': f"{MTA_FEED_PATH}/camsys%2Fmnr-alerts"
+}
+# Feed categories with trip updates; route and stop IDs are only unique within one
+FEED_CATEGORIES = ('subway', 'lirr', 'mnr')
+# Feed category of the agency_id on service alert informed entities
+ALERT_AGENCY_CATEGORIES = {
+   'MTASBWY': 'subway',
+   'LI': 'lirr',
+   'MNR': 'mnr'
 }
 # Accessibility data feeds
 ELEVATOR_ESCALATOR_FEEDS = {
-   'current':"https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/nyct%2Fnyct_ene.json",
-   'upcoming':'https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/nyct%2Fnyct_ene_upcoming.json',
-   'equipment':'https://api-endpoint.mta.info/Dataservice/mtagtfsfeeds/nyct%2Fnyct_ene_equipments.json'
+   'current': f"{MTA_FEED_PATH}/nyct%2Fnyct_ene.json",
+   'upcoming': f"{MTA_FEED_PATH}/nyct%2Fnyct_ene_upcoming.json",
+   'equipment': f"{MTA_FEED_PATH}/nyct%2Fnyct_ene_equipments.json"
 
 }
 
@@ -54,4 +67,94 @@ CACHE_TIMEOUT = {
    'routes_default': 86400,      # Route data: 24 hours
    'lines_default': 86400,       # Line shape data: 24 hours
    'route_stops_default': 86400, # Route stop data: 24 hours
-}
\ No newline at end of file
+   'routes_batch_default': 86400, # Combined route shapes/stops: 24 hours
+   'tiles_default': 86400,       # Vector tiles: 24 hours
+   'isochrone_default': 3600,    # Isochrones: 1 hour
+   'frequencies_default': 86400, # Scheduled frequency tables: 24 hours
+}
+
+# Static GTFS feeds by agency (a directory or a GTFS .zip)
+STATIC_FEEDS = {
+   'subway': os.path.join('data', 'gtfs_subway'),
+   'lirr': os.path.join('data', 'gtfs_lirr'),
+   'mnr': os.path.join('data', 'gtfs_mnr'),
+}
+DEFAULT_AGENCY = 'subway'
+STATIC_PRELOAD = True  # Build all static indexes at startup
+STATIC_PARSE_IN_PROCESSES = True  # Parse stop_times and shapes in worker processes during preload
+STATIC_CHUNK_ROWS = 100000  # Rows buffered per chunk when parsing large tables
+
+# Realtime feed parsing in worker processes (keeps the GIL free for request threads)
+PARSE_POOL_WORKERS = int(os.environ.get('PARSE_POOL_WORKERS', min(4, os.cpu_count() or 1)))  # 0 parses inline
+PARSE_POOL_MIN_BYTES = 65536  # Smaller payloads are parsed inline, where the process hop costs more than it saves
+PARSE_POOL_TIMEOUT = 10  # Seconds to wait for a worker before parsing inline
+
+# Persistent last-known-good feed store (used for warm restarts and upstream failures)
+FEED_STORE_ENABLED = True
+FEED_STORE_PATH = os.path.join('data', 'feed_store.sqlite3')
+FEED_STORE_MAX_AGE = 86400  # Do not rehydrate entries older than 24 hours
+
+# Historical GTFS-RT archive (subway, LIRR and Metro-North snapshots)
+ARCHIVE_ENABLED = False
+ARCHIVE_DIR = os.path.join('data', 'archive')
+ARCHIVE_LOOKBACK_HOURS = 2  # How far back replay searches for the previous snapshot
+
+# Realtime on-time performance and headway analytics
+ANALYTICS_WINDOW = 3600  # Rolling window in seconds
+ANALYTICS_BUNCHING_HEADWAY = 120  # Headways shorter than this count as bunching
+ANALYTICS_HEADWAY_BINS = [120, 240, 360, 480, 600, 900, 1200]  # Histogram bin edges in seconds
+
+# Route, stop and delay notification subscriptions
+SUBSCRIPTION_MAX = 200000  # Subscriptions accepted
+SUBSCRIPTION_QUEUE_SIZE = 10000  # Pending notifications; further ones are dropped until it drains
+SUBSCRIPTION_DISPATCH_WORKERS = 4  # Delivery threads
+SUBSCRIPTION_WEBHOOK_TIMEOUT = 5  # Seconds per webhook POST
+SUBSCRIPTION_OUTBOX_SIZE = 100  # Notifications kept per polled subscription
+SUBSCRIPTION_POLL_INTERVAL = 30  # Seconds between background refreshes of subscribed feeds (0 disables)
+SUBSCRIPTION_MAX_PER_CLIENT = 100  # Subscriptions per client address
+SUBSCRIPTION_CREATE_LIMIT = (20, 60)  # At most this many subscriptions per client per window of seconds
+# Webhook hosts allowed (comma-separated); when unset, any host that resolves only to public addresses
+SUBSCRIPTION_WEBHOOK_HOSTS = {
+   host.strip().lower() for host in os.environ.get('SUBSCRIPTION_WEBHOOK_HOSTS', '').split(',') if host.strip()
+}
+
+# Per-route resources served by /api/routes/batch
+ROUTE_BATCH_KINDS = ('shape', 'stops')
+
+# Isochrones (stations reachable within a travel time budget)
+ISOCHRONE_BUCKET = 300  # Searches of departures within this many seconds share a cache entry
+ISOCHRONE_MAX_MINUTES = 120  # Largest budget; each search covers it so any smaller budget is a filter
+
+# Admission control for computations that miss the cache (cached responses are never throttled)
+ADMISSION_ENABLED = True
+ADMISSION_CLASSES = {
+   'static': {'concurrency': 2, 'queue': 8, 'timeout': 2.0},  # Line shapes and route stops from static tables
+   'search': {'concurrency': 1, 'queue': 4, 'timeout': 3.0},  # Timetable searches (isochrones)
+}
+
+# Vector tiles
+TILE_EXTENT = 4096  # Tile coordinate extent
+TILE_BUFFER = 64  # Clip buffer around each tile, in tile units
+TILE_STATION_MIN_ZOOM = 11  # Stations are omitted from tiles below this zoom
+TILE_CACHE_DIR = os.path.join('data', 'tiles')  # On-disk tile cache (None to disable)
+TILE_MAX_ZOOM = 18  # Deepest zoom served; deeper tile requests are rejected
+TILE_NYC_BOUNDS = (-74.26, 40.49, -73.70, 40.92)  # Pre-generation extent (lon/lat); tiles outside it are empty
+TILE_BOUNDS = {  # Extent of agencies reaching beyond NYC (lon/lat)
+   'lirr': (-74.05, 40.55, -71.85, 41.15),
+   'mnr': (-74.35, 40.70, -72.85, 41.75)
+}
+
+# Sampling profiler for slow requests (opt-in)
+PROFILER_ENABLED = os.environ.get('PROFILER_ENABLED', '0') == '1'
+PROFILER_THRESHOLD = 0.5  # Keep profiles of requests slower than this, in seconds
+PROFILER_INTERVAL = 0.005  # Seconds between stack samples
+PROFILER_MAX_PROFILES = 20  # Profiles kept in the ring buffer
+PROFILER_ADMIN_TOKEN = os.environ.get('PROFILER_ADMIN_TOKEN')  # Required by /admin/profiles; the profiler stays off without it
+
+# Per-request fetch / parse / serialize timing
+TIMING_LOG_ENABLED = os.environ.get('TIMING_LOG_ENABLED', '0') == '1'  # Print a JSON timing line for every request that served a realtime feed
+
+# Startup: 'eager' builds the data service before serving, 'background' builds it in a
+# thread while /api/health already answers, 'lazy' builds it on the first request that needs it
+STARTUP_MODE = os.environ.get('STARTUP_MODE', 'eager')
+STARTUP_TARGET_SECONDS = 1.0  # Target time from process start to first response
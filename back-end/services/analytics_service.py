@@ -0,0 +1,288 @@
+import bisect
+import collections
+import threading
+from config import ANALYTICS_WINDOW, ANALYTICS_BUNCHING_HEADWAY, ANALYTICS_HEADWAY_BINS, FEED_CATEGORIES
+
+
+class RollingStats:
+    """
+    Delay and headway statistics over a sliding time window
+
+    Events are kept in observation order with running sums, so adding an event
+    and expiring old ones are both O(1) amortized.
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self.events = collections.deque()  # (time, delay, headway)
+        self.delay_sum = 0
+        self.delay_count = 0
+        self.headway_sum = 0
+        self.headway_count = 0
+        self.bunched = 0
+        self.histogram = [0] * (len(ANALYTICS_HEADWAY_BINS) + 1)
+
+    def add(self, event_time, delay, headway):
+        """
+        Add an observed arrival
+
+        Args:
+            event_time (int): Arrival time
+            delay (int): Reported delay in seconds, or None
+            headway (int): Seconds since the previous arrival, or None
+        """
+        self.events.append((event_time, delay, headway))
+        self._apply(delay, headway, 1)
+        self.expire(event_time)
+
+    def expire(self, now):
+        """
+        Drop events that fell out of the window
+
+        Args:
+            now (int): Current feed time
+        """
+        while self.events and self.events[0][0] < now - self.window:
+            _, delay, headway = self.events.popleft()
+            self._apply(delay, headway, -1)
+
+    def _apply(self, delay, headway, sign):
+        if delay is not None:
+            self.delay_sum += sign * delay
+            self.delay_count += sign
+        if headway is not None:
+            self.headway_sum += sign * headway
+            self.headway_count += sign
+            self.histogram[bisect.bisect_right(ANALYTICS_HEADWAY_BINS, headway)] += sign
+            if headway < ANALYTICS_BUNCHING_HEADWAY:
+                self.bunched += sign
+
+    def summary(self, now=None):
+        """
+        Get the current statistics
+
+        Args:
+            now (int): Current feed time; expires old events first if given
+
+        Returns:
+            dict: Arrival count, average delay, headway distribution and bunching
+        """
+        if now is not None:
+            self.expire(now)
+
+        edges = [0] + ANALYTICS_HEADWAY_BINS
+        histogram = [
+            {"min": edges[i], "max": ANALYTICS_HEADWAY_BINS[i] if i < len(ANALYTICS_HEADWAY_BINS) else None,
+             "count": count}
+            for i, count in enumerate(self.histogram)
+        ]
+
+        return {
+            "arrivals": len(self.events),
+            "avg_delay": self.delay_sum / self.delay_count if self.delay_count else None,
+            "avg_headway": self.headway_sum / self.headway_count if self.headway_count else None,
+            "headway_histogram": histogram,
+            "bunched": self.bunched,
+            "bunching_ratio": self.bunched / self.headway_count if self.headway_count else None
+        }
+
+
+class AnalyticsService:
+    """
+    Streaming on-time performance and headway aggregator
+
+    Consecutive trip-update snapshots are diffed per trip. Only trips whose
+    updates changed are examined, and stops that dropped off the front of a
+    trip's stop list are counted as arrivals at their last predicted time.
+    Statistics are kept per feed category (the prefix of the feed key), as
+    the railroads reuse subway route IDs such as "1".
+    """
+
+    def __init__(self, window=ANALYTICS_WINDOW):
+        self.window = window
+        self._lock = threading.Lock()
+        self._trips = {}  # feed key -> {trip_id: (signature, route_id, stop updates)}
+        self._last_arrival = {}  # (category, route_id, stop_id) -> last arrival time
+        self._feed_times = {}  # feed key -> last ingested header timestamp
+        # Keyed by (category, route_id), (category, stop_id) and (category, route_id, stop_id)
+        self.routes = collections.defaultdict(lambda: RollingStats(self.window))
+        self.stations = collections.defaultdict(lambda: RollingStats(self.window))
+        self.route_stations = collections.defaultdict(lambda: RollingStats(self.window))
+
+    @staticmethod
+    def _signature(update):
+        """
+        Change marker for a trip update
+
+        Args:
+            update (dict): Parsed trip update
+
+        Returns:
+            tuple: Update timestamp and every stop's (stop_id, time, delay), as recorded on ingest
+        """
+        stops = []
+        for stop in update["stop_time_updates"]:
+            event = stop.get("arrival") or stop.get("departure") or {}
+            stops.append((stop["stop_id"], event.get("time"), event.get("delay")))
+        return update.get("timestamp"), tuple(stops)
+
+    def ingest(self, feed_key, result):
+        """
+        Fold a freshly fetched feed snapshot into the statistics
+
+        Args:
+            feed_key (str): Feed key (e.g. 'subway_ace')
+            result (dict): Parsed GTFS-RT feed
+        """
+        if not isinstance(result, dict) or "entities" not in result:
+            return
+
+        now = result["header"]["timestamp"]
+        category = feed_key.split('_', 1)[0]
+
+        with self._lock:
+            previous = self._trips.get(feed_key, {})
+            current = {}
+
+            for entity in result["entities"]:
+                update = entity.get("trip_update")
+                if not update:
+                    continue
+
+                trip_id = update["trip"]["trip_id"]
+                signature = self._signature(update)
+                old = previous.get(trip_id)
+
+                if old is not None and old[0] == signature:
+                    current[trip_id] = old
+                    continue
+
+                stops = {stop_id: (arrival_time, delay) for stop_id, arrival_time, delay in signature[1]}
+                current[trip_id] = (signature, update["trip"]["route_id"], stops)
+
+                # Stops that dropped off the trip were served since the last snapshot, unless
+                # they were still in the future (reroutes, skipped stops, withdrawn predictions)
+                if old is not None:
+                    for stop_id, (arrival_time, delay) in old[2].items():
+                        if stop_id not in stops and arrival_time and arrival_time <= now:
+                            self._record_arrival(category, old[1], stop_id, arrival_time, delay)
+
+            # Trips that left the feed completed their remaining past stops
+            for trip_id, (_, route_id, stops) in previous.items():
+                if trip_id not in current:
+                    for stop_id, (arrival_time, delay) in stops.items():
+                        if arrival_time and arrival_time <= now:
+                            self._record_arrival(category, route_id, stop_id, arrival_time, delay)
+
+            self._trips[feed_key] = current
+            self._feed_times[feed_key] = now
+
+    def _record_arrival(self, category, route_id, stop_id, arrival_time, delay):
+        """
+        Add an observed arrival to the route, station and route-station windows
+
+        Args:
+            category (str): Feed category ('subway', 'lirr', 'mnr')
+            route_id (str): Route ID
+            stop_id (str): Stop ID
+            arrival_time (int): Last predicted arrival time
+            delay (int): Last reported delay, or None
+        """
+        if not arrival_time:
+            return
+
+        key = (category, route_id, stop_id)
+        last = self._last_arrival.get(key)
+        headway = arrival_time - last if last is not None and arrival_time > last else None
+        if last is None or arrival_time > last:
+            self._last_arrival[key] = arrival_time
+
+        self.routes[(category, route_id)].add(arrival_time, delay, headway)
+        self.stations[(category, stop_id)].add(arrival_time, delay, headway)
+        self.route_stations[key].add(arrival_time, delay, headway)
+
+    def _now(self, category):
+        times = [t for feed_key, t in self._feed_times.items() if feed_key.split('_', 1)[0] == category]
+        return max(times) if times else None
+
+    def get_feeds(self):
+        """
+        Get the feeds folded into the statistics
+
+        Returns:
+            dict: Feed key -> last ingested feed timestamp
+        """
+        with self._lock:
+            return dict(self._feed_times)
+
+    def get_route_summaries(self):
+        """
+        Get statistics for every observed route
+
+        Returns:
+            dict: Feed timestamps and per-category, per-route statistics
+        """
+        with self._lock:
+            now = {category: self._now(category) for category in FEED_CATEGORIES}
+            routes = {}
+            for (category, route_id), stats in self.routes.items():
+                routes.setdefault(category, {})[route_id] = stats.summary(now[category])
+            return {"feeds": dict(self._feed_times), "routes": routes}
+
+    def get_route(self, route_id, category='subway'):
+        """
+        Get statistics for a route with a per-stop breakdown
+
+        Args:
+            route_id (str): Route ID
+            category (str): Feed category ('subway', 'lirr', 'mnr')
+
+        Returns:
+            dict: Route statistics or error
+        """
+        if category not in FEED_CATEGORIES:
+            return {"error": f"Invalid feed category: {category}"}
+
+        with self._lock:
+            if (category, route_id) not in self.routes:
+                return {"error": f"No analytics for {category} route: {route_id}"}
+
+            now = self._now(category)
+            return {
+                "category": category,
+                "route_id": route_id,
+                "summary": self.routes[(category, route_id)].summary(now),
+                "stops": {
+                    stop_id: stats.summary(now)
+                    for (c, r, stop_id), stats in self.route_stations.items() if c == category and r == route_id
+                }
+            }
+
+    def get_station(self, stop_id, category='subway'):
+        """
+        Get statistics for a stop with a per-route breakdown
+
+        Args:
+            stop_id (str): Stop ID
+            category (str): Feed category ('subway', 'lirr', 'mnr')
+
+        Returns:
+            dict: Station statistics or error
+        """
+        if category not in FEED_CATEGORIES:
+            return {"error": f"Invalid feed category: {category}"}
+
+        with self._lock:
+            if (category, stop_id) not in self.stations:
+                return {"error": f"No analytics for {category} station: {stop_id}"}
+
+            now = self._now(category)
+            return {
+                "category": category,
+                "stop_id": stop_id,
+                "summary": self.stations[(category, stop_id)].summary(now),
+                "routes": {
+                    route_id: stats.summary(now)
+                    for (c, route_id, s), stats in self.route_stations.items() if c == category and s == stop_id
+                }
+            }
@@ -1,19 +1,35 @@
 import requests
 import datetime
-import csv
-import os
+import time
 import json
-import pyproj
-from shapely.geometry import LineString
-from shapely.ops import transform
-import functools
-from google.transit import gtfs_realtime_pb2
+import threading
+from zoneinfo import ZoneInfo
 from config import (
     SUBWAY_FEEDS, LIRR_FEEDS, MNR_FEEDS,
     SERVICE_ALERT_FEEDS, ELEVATOR_ESCALATOR_FEEDS,
-    CACHE_TIMEOUT
+    CACHE_TIMEOUT, FEED_STORE_ENABLED, FEED_STORE_PATH, FEED_STORE_MAX_AGE,
+    ARCHIVE_ENABLED, ARCHIVE_DIR, ARCHIVE_LOOKBACK_HOURS,
+    STATIC_FEEDS, DEFAULT_AGENCY, STATIC_PRELOAD, STATIC_PARSE_IN_PROCESSES, STATIC_CHUNK_ROWS,
+    ISOCHRONE_BUCKET, ISOCHRONE_MAX_MINUTES, ROUTE_BATCH_KINDS
 )
 from utils.cache import cache
+from utils.metrics import upstream_duration, upstream_bytes, upstream_errors, parse_duration
+from utils.timing import timer
+from utils.gtfs_parser import ENTITY_KINDS, filter_feed
+from utils.parse_pool import parse_pool
+from utils.admission import admission
+from utils.feed_store import FeedStore
+from utils.feed_archive import FeedArchive
+from utils.gtfs_static import StaticFeed, FeedRegistry, format_gtfs_time
+from utils.station_search import StationIndex
+from services.analytics_service import AnalyticsService
+from services.subscription_service import SubscriptionService, FeedPoller
+from services.prediction_service import PredictionService
+
+try:
+    import msgpack
+except ImportError:  # Optional: only needed for MessagePack output
+    msgpack = None
 
 
 class DataService:
@@ -21,6 +37,219 @@ class DataService:
     Data service - handles all data retrieval and processing
     """
 
+    def __init__(self):
+        # Last-known-good store for realtime feeds
+        self.feed_store = FeedStore(FEED_STORE_PATH) if FEED_STORE_ENABLED else None
+        self._rehydrated = {}  # cache key -> stale snapshot served until its first refresh
+        self._refreshing = set()  # cache keys with a background refresh in flight
+        self._refresh_lock = threading.Lock()
+        if self.feed_store:
+            self.rehydrate_cache()
+
+        # Optional historical archive of realtime snapshots
+        self.archive = FeedArchive(ARCHIVE_DIR, lookback_hours=ARCHIVE_LOOKBACK_HOURS) if ARCHIVE_ENABLED else None
+
+        # Streaming delay and headway statistics
+        self.analytics = AnalyticsService()
+
+        # Static GTFS feeds per agency
+        self.static_feeds = FeedRegistry(STATIC_FEEDS, STATIC_PARSE_IN_PROCESSES, STATIC_CHUNK_ROWS)
+        if STATIC_PRELOAD:
+            for agency, message in self.static_feeds.load_all().items():
+                print(f"Failed to load static feed {agency}: {message}")
+
+        # Realtime predictions and positions built on the subway schedule
+        self.static_feed = self.static_feeds.get('subway') or StaticFeed(STATIC_FEEDS['subway'], STATIC_CHUNK_ROWS)
+        self.predictions = PredictionService(self.static_feed)
+        self._positions = None  # Created on first use
+        self.tiles = {}  # agency -> TileService
+        self.station_index = None  # Built on first search
+
+        # Route, stop and delay notifications matched on each feed refresh; the poller
+        # refreshes subscribed feeds even when no client is requesting them
+        self.subscriptions = SubscriptionService(station_of=self._parent_station)
+        self.subscription_poller = FeedPoller(
+            self.subscriptions, self._refresh_trip_feeds, lambda: self.get_service_alerts('all_alerts'))
+        self.subscription_poller.start()
+
+    def _parent_station(self, category, stop_id):
+        feed = self.static_feeds.get(category)
+        stop = feed.stops.get(stop_id) if feed else None
+        return stop.get('parent_station') if stop else None
+
+    def _ingest_trips(self, cache_key, result):
+        """Feed a refreshed trip update snapshot to analytics and subscriptions"""
+        self.analytics.ingest(cache_key, result)
+        self.subscriptions.process_trips(cache_key, result)
+
+    def _refresh_trip_feeds(self):
+        """Refresh every trip update feed whose cache window has expired"""
+        for feed_id in SUBWAY_FEEDS:
+            self.get_subway_feed(feed_id)
+        for feed_id in LIRR_FEEDS:
+            self.get_lirr_feed(feed_id)
+        for feed_id in MNR_FEEDS:
+            self.get_mnr_feed(feed_id)
+
+    @property
+    def positions(self):
+        """
+        Train position interpolation, created on first use
+
+        Deferred because it pulls in pyproj and shapely.
+
+        Returns:
+            PositionService: Position service
+        """
+        if self._positions is None:
+            from services.position_service import PositionService
+
+            self._positions = PositionService(self.static_feed, self.predictions)
+        return self._positions
+
+    def rehydrate_cache(self):
+        """
+        Warm the service from the persistent feed store
+
+        Rehydrated snapshots are marked stale and kept outside the cache, so
+        they are served however old they are; the first request for each one
+        starts a single background refresh that replaces it.
+
+        Returns:
+            int: Number of entries rehydrated
+        """
+        entries = self.feed_store.load_all(FEED_STORE_MAX_AGE)
+        for cache_key, entry in entries.items():
+            if cache_key not in cache.cache:
+                self._rehydrated[cache_key] = self._mark_stale(entry)
+        return len(entries)
+
+    def _mark_stale(self, entry):
+        """
+        Build a stale copy of a stored entry
+
+        Args:
+            entry (dict): Feed store entry
+
+        Returns:
+            any: Parsed data flagged as stale (dicts only)
+        """
+        data = entry["parsed"]
+        if isinstance(data, dict):
+            data = dict(data)
+            data["stale"] = True
+            data["fetched_at"] = entry["fetched_at"]
+        return data
+
+    def _fetch_realtime(self, category, item_id, url, cache_key, parse, archive=False, on_refresh=None):
+        """
+        Fetch an upstream feed through the cache and the last-known-good store
+
+        Args:
+            category (str): Cache timeout category
+            item_id (str): Feed ID
+            url (str): Upstream URL
+            cache_key (str): Cache key
+            parse (callable): Converts the raw payload into the result
+            archive (bool): Record successful snapshots in the historical archive
+            on_refresh (callable): Called with (cache_key, result) after each successful fetch
+
+        Returns:
+            any: Processed data or error
+        """
+        timer.set_feed(cache_key)
+
+        # Check cache
+        cached_data = cache.get(cache_key, self.get_cache_timeout(category, item_id))
+        if cached_data:
+            return cached_data
+
+        # Serve a rehydrated snapshot while one background fetch replaces it
+        stale = self._rehydrated.get(cache_key)
+        if stale is not None:
+            with self._refresh_lock:
+                start_refresh = cache_key not in self._refreshing
+                self._refreshing.add(cache_key)
+            if start_refresh:
+                threading.Thread(
+                    target=self._refresh_rehydrated, args=(url, cache_key, parse, archive, on_refresh),
+                    name=f"refresh-{cache_key}", daemon=True
+                ).start()
+            return stale
+
+        result, error = self._fetch_upstream(url, cache_key, parse, archive, on_refresh)
+        if error is None:
+            return result
+
+        # Fall back to the last-known-good payload
+        if self.feed_store:
+            entry = self.feed_store.load(cache_key)
+            if entry is not None:
+                return self._mark_stale(entry)
+
+        return error
+
+    def _refresh_rehydrated(self, url, cache_key, parse, archive, on_refresh):
+        """Replace a rehydrated snapshot with a fresh fetch; it stays served if the fetch fails"""
+        try:
+            _, error = self._fetch_upstream(url, cache_key, parse, archive, on_refresh)
+            if error is None:
+                self._rehydrated.pop(cache_key, None)
+        finally:
+            with self._refresh_lock:
+                self._refreshing.discard(cache_key)
+
+    def _fetch_upstream(self, url, cache_key, parse, archive=False, on_refresh=None):
+        """
+        Fetch and parse an upstream feed, caching and storing the result
+
+        Args:
+            url (str): Upstream URL
+            cache_key (str): Cache key
+            parse (callable): Converts the raw payload into the result
+            archive (bool): Record the snapshot in the historical archive
+            on_refresh (callable): Called with (cache_key, result) after the fetch
+
+        Returns:
+            tuple: (result, None) or (None, error dict)
+        """
+        try:
+            start = time.perf_counter()
+            with timer.phase('fetch'):
+                response = requests.get(url)
+            upstream_duration.observe(time.perf_counter() - start, cache_key)
+
+            if response.status_code != 200:
+                upstream_errors.inc(cache_key, f"http_{response.status_code}")
+                return None, {"error": f"HTTP error: {response.status_code}"}
+
+            fetched_at = time.time()
+            upstream_bytes.inc(cache_key, amount=len(response.content))
+            start = time.perf_counter()
+            with timer.phase('parse'):
+                result = parse(response.content)
+            parse_duration.observe(time.perf_counter() - start, cache_key)
+
+            # Cache result, and the raw payload for protobuf passthrough
+            cache.set(cache_key, result)
+            cache.set(f"raw_{cache_key}", response.content)
+            if self.feed_store and not (isinstance(result, dict) and "error" in result):
+                self.feed_store.save(cache_key, response.content, result)
+            if archive and self.archive:
+                self.archive.record(cache_key, response.content, fetched_at)
+
+        except Exception as e:
+            upstream_errors.inc(cache_key, type(e).__name__)
+            return None, {"error": str(e)}
+
+        # A failing consumer (analytics, subscriptions) is not an upstream failure
+        if on_refresh:
+            try:
+                on_refresh(cache_key, result)
+            except Exception as e:
+                print(f"Refresh handler for {cache_key} failed: {str(e)}")
+        return result, None
+
     def get_cache_timeout(self, category, item_id):
         """
         Get cache timeout for a specific item
@@ -73,6 +302,9 @@ class DataService:
         """
         Parse GTFS-RT data
 
+        Large payloads are parsed in the worker process pool, so the
+        conversion does not hold the GIL of the request threads.
+
         Args:
             content (bytes): GTFS-RT binary content
             feed_id (str): Feed ID
@@ -80,183 +312,7 @@ class DataService:
         Returns:
             dict: Parsed data
         """
-        try:
-            # Parse GTFS-RT data
-            feed = gtfs_realtime_pb2.FeedMessage()
-            feed.ParseFromString(content)
-
-            # Convert to JSON-serializable format
-            result = {
-                "header": {
-                    "timestamp": feed.header.timestamp,
-                    "human_time": datetime.datetime.fromtimestamp(feed.header.timestamp).strftime('%Y-%m-%d %H:%M:%S'),
-                    "feed_id": feed_id
-                },
-                "entities": []
-            }
-
-            # Process each entity (vehicle, trip update, alert)
-            for entity in feed.entity:
-                entity_data = {"id": entity.id}
-
-                # Process vehicle positions
-                if entity.HasField('vehicle'):
-                    vehicle = entity.vehicle
-                    vehicle_data = {
-                        "trip": {
-                            "trip_id": vehicle.trip.trip_id,
-                            "route_id": vehicle.trip.route_id
-                        },
-                        "timestamp": vehicle.timestamp
-                    }
-
-                    if vehicle.timestamp:
-                        vehicle_data["human_time"] = datetime.datetime.fromtimestamp(vehicle.timestamp).strftime(
-                            '%Y-%m-%d %H:%M:%S')
-
-                    if vehicle.HasField('position'):
-                        vehicle_data["position"] = {
-                            "latitude": vehicle.position.latitude,
-                            "longitude": vehicle.position.longitude
-                        }
-
-                        if vehicle.position.HasField('bearing'):
-                            vehicle_data["position"]["bearing"] = vehicle.position.bearing
-
-                        if vehicle.position.HasField('speed'):
-                            vehicle_data["position"]["speed"] = vehicle.position.speed
-
-                    if vehicle.HasField('current_status'):
-                        status_mapping = {
-                            0: "INCOMING_AT",
-                            1: "STOPPED_AT",
-                            2: "IN_TRANSIT_TO"
-                        }
-                        vehicle_data["current_status"] = status_mapping.get(vehicle.current_status, "UNKNOWN")
-
-                    if vehicle.HasField('stop_id'):
-                        vehicle_data["stop_id"] = vehicle.stop_id
-
-                    entity_data["vehicle"] = vehicle_data
-
-                # Process trip updates
-                if entity.HasField('trip_update'):
-                    trip_update = entity.trip_update
-                    update_data = {
-                        "trip": {
-                            "trip_id": trip_update.trip.trip_id,
-                            "route_id": trip_update.trip.route_id
-                        },
-                        "stop_time_updates": []
-                    }
-
-                    if trip_update.HasField('timestamp'):
-                        update_data["timestamp"] = trip_update.timestamp
-                        update_data["human_time"] = datetime.datetime.fromtimestamp(trip_update.timestamp).strftime(
-                            '%Y-%m-%d %H:%M:%S')
-
-                    for stop_time in trip_update.stop_time_update:
-                        stop_data = {"stop_id": stop_time.stop_id}
-
-                        if stop_time.HasField('arrival'):
-                            arrival_data = {"time": stop_time.arrival.time}
-
-                            if stop_time.arrival.time:
-                                arrival_data["human_time"] = datetime.datetime.fromtimestamp(
-                                    stop_time.arrival.time).strftime('%Y-%m-%d %H:%M:%S')
-
-                            if stop_time.arrival.HasField('delay'):
-                                arrival_data["delay"] = stop_time.arrival.delay
-
-                            stop_data["arrival"] = arrival_data
-
-                        if stop_time.HasField('departure'):
-                            departure_data = {"time": stop_time.departure.time}
-
-                            if stop_time.departure.time:
-                                departure_data["human_time"] = datetime.datetime.fromtimestamp(
-                                    stop_time.departure.time).strftime('%Y-%m-%d %H:%M:%S')
-
-                            if stop_time.departure.HasField('delay'):
-                                departure_data["delay"] = stop_time.departure.delay
-
-                            stop_data["departure"] = departure_data
-
-                        update_data["stop_time_updates"].append(stop_data)
-
-                    entity_data["trip_update"] = update_data
-
-                # Process alerts
-                if entity.HasField('alert'):
-                    alert = entity.alert
-                    alert_data = {
-                        "active_period": [],
-                        "informed_entity": []
-                    }
-
-                    # Add basic info
-                    if alert.HasField('cause'):
-                        alert_data["cause"] = alert.cause
-
-                    if alert.HasField('effect'):
-                        alert_data["effect"] = alert.effect
-
-                    # Process URL
-                    if alert.HasField('url') and alert.url.translation:
-                        alert_data["url"] = alert.url.translation[0].text
-
-                    # Process title and description
-                    if alert.HasField('header_text') and alert.header_text.translation:
-                        alert_data["header_text"] = alert.header_text.translation[0].text
-
-                    if alert.HasField('description_text') and alert.description_text.translation:
-                        alert_data["description_text"] = alert.description_text.translation[0].text
-
-                    # Process active periods
-                    for period in alert.active_period:
-                        period_data = {}
-
-                        if period.HasField('start'):
-                            period_data["start"] = {
-                                "timestamp": period.start,
-                                "human_time": datetime.datetime.fromtimestamp(period.start).strftime(
-                                    '%Y-%m-%d %H:%M:%S')
-                            }
-
-                        if period.HasField('end'):
-                            period_data["end"] = {
-                                "timestamp": period.end,
-                                "human_time": datetime.datetime.fromtimestamp(period.end).strftime('%Y-%m-%d %H:%M:%S')
-                            }
-
-                        alert_data["active_period"].append(period_data)
-
-                    # Process affected entities
-                    for entity in alert.informed_entity:
-                        entity_info = {}
-
-                        if entity.HasField('agency_id'):
-                            entity_info["agency_id"] = entity.agency_id
-
-                        if entity.HasField('route_id'):
-                            entity_info["route_id"] = entity.route_id
-
-                        if entity.HasField('route_type'):
-                            entity_info["route_type"] = entity.route_type
-
-                        if entity.HasField('stop_id'):
-                            entity_info["stop_id"] = entity.stop_id
-
-                        alert_data["informed_entity"].append(entity_info)
-
-                    entity_data["alert"] = alert_data
-
-                result["entities"].append(entity_data)
-
-            return result
-
-        except Exception as e:
-            return {"error": f"Error parsing GTFS-RT data: {str(e)}"}
+        return parse_pool.parse(content, feed_id)
 
     def get_subway_feed(self, feed_id):
         """
@@ -272,28 +328,67 @@ class DataService:
         if feed_id not in SUBWAY_FEEDS:
             return {"error": f"Invalid subway feed: {feed_id}"}
 
-        # Check cache
-        cache_key = f"subway_{feed_id}"
-        cached_data = cache.get(cache_key, self.get_cache_timeout('subway', feed_id))
-        if cached_data:
-            return cached_data
+        return self._fetch_realtime(
+            'subway', feed_id, SUBWAY_FEEDS[feed_id], f"subway_{feed_id}",
+            lambda content: self.parse_gtfs_rt(content, feed_id), archive=True,
+            on_refresh=self._ingest_trips
+        )
 
-        # Fetch data
-        try:
-            response = requests.get(SUBWAY_FEEDS[feed_id])
+    def get_subway_predictions(self, feed_id, trip_id=None):
+        """
+        Get full per-trip ETA vectors for a subway feed
 
-            if response.status_code == 200:
-                # Parse GTFS-RT data
-                result = self.parse_gtfs_rt(response.content, feed_id)
+        Args:
+            feed_id (str): Subway line group ID
+            trip_id (str): Optional realtime trip ID to return a single trip
 
-                # Cache result
-                cache.set(cache_key, result)
-                return result
-            else:
-                return {"error": f"HTTP error: {response.status_code}"}
+        Returns:
+            dict: Feed header and trip predictions, or error
+        """
+        feed = self.get_subway_feed(feed_id)
+        if "error" in feed:
+            return feed
+
+        # Predictions only change when the feed is refreshed: one entry per feed,
+        # reused while the snapshot it was built from is current
+        cache_key = f"predictions_subway_{feed_id}"
+        entry = cache.get(cache_key, self.get_cache_timeout('subway', feed_id))
+        if entry is not None and entry[0] is feed:
+            result = entry[1]
+        else:
+            try:
+                result = self.predictions.predict_feed(feed)
+            except Exception as e:
+                return {"error": f"Failed to build predictions: {str(e)}"}
+            cache.set(cache_key, (feed, result))
+
+        if trip_id is None:
+            return result
+
+        for trip in result["trips"]:
+            if trip["trip_id"] == trip_id:
+                return trip
+        return {"error": f"Trip not found in feed {feed_id}: {trip_id}"}
+
+    def get_subway_positions(self, feed_id, timestamp=None):
+        """
+        Get interpolated train positions for a subway feed
+
+        Args:
+            feed_id (str): Subway line group ID
+            timestamp (float): Unix time to interpolate at (default: now)
+
+        Returns:
+            dict: Feed header and vehicle positions, or error
+        """
+        predictions = self.get_subway_predictions(feed_id)
+        if "error" in predictions:
+            return predictions
 
+        try:
+            return self.positions.locate_feed(predictions, time.time() if timestamp is None else timestamp)
         except Exception as e:
-            return {"error": str(e)}
+            return {"error": f"Failed to interpolate positions: {str(e)}"}
 
     def get_lirr_feed(self, feed_id):
         """
@@ -309,28 +404,11 @@ class DataService:
         if feed_id not in LIRR_FEEDS:
             return {"error": f"Invalid LIRR feed: {feed_id}"}
 
-        # Check cache
-        cache_key = f"lirr_{feed_id}"
-        cached_data = cache.get(cache_key, self.get_cache_timeout('lirr', feed_id))
-        if cached_data:
-            return cached_data
-
-        # Fetch data
-        try:
-            response = requests.get(LIRR_FEEDS[feed_id])
-
-            if response.status_code == 200:
-                # Parse GTFS-RT data
-                result = self.parse_gtfs_rt(response.content, feed_id)
-
-                # Cache result
-                cache.set(cache_key, result)
-                return result
-            else:
-                return {"error": f"HTTP error: {response.status_code}"}
-
-        except Exception as e:
-            return {"error": str(e)}
+        return self._fetch_realtime(
+            'lirr', feed_id, LIRR_FEEDS[feed_id], f"lirr_{feed_id}",
+            lambda content: self.parse_gtfs_rt(content, feed_id), archive=True,
+            on_refresh=self._ingest_trips
+        )
 
     def get_mnr_feed(self, feed_id):
         """
@@ -346,28 +424,131 @@ class DataService:
         if feed_id not in MNR_FEEDS:
             return {"error": f"Invalid MNR feed: {feed_id}"}
 
-        # Check cache
-        cache_key = f"mnr_{feed_id}"
-        cached_data = cache.get(cache_key, self.get_cache_timeout('mnr', feed_id))
-        if cached_data:
-            return cached_data
+        return self._fetch_realtime(
+            'mnr', feed_id, MNR_FEEDS[feed_id], f"mnr_{feed_id}",
+            lambda content: self.parse_gtfs_rt(content, feed_id), archive=True,
+            on_refresh=self._ingest_trips
+        )
 
-        # Fetch data
-        try:
-            response = requests.get(MNR_FEEDS[feed_id])
+    def get_replay_feed(self, category, feed_id, timestamp):
+        """
+        Replay an archived realtime feed as it was at a given time
 
-            if response.status_code == 200:
-                # Parse GTFS-RT data
-                result = self.parse_gtfs_rt(response.content, feed_id)
+        Args:
+            category (str): Feed category ('subway', 'lirr', 'mnr')
+            feed_id (str): Feed ID
+            timestamp (float): Unix timestamp to replay
 
-                # Cache result
-                cache.set(cache_key, result)
+        Returns:
+            dict: Parsed feed in the live format, or error
+        """
+        feeds = {"subway": SUBWAY_FEEDS, "lirr": LIRR_FEEDS, "mnr": MNR_FEEDS}.get(category)
+        if feeds is None:
+            return {"error": f"Invalid replay category: {category}"}
+        if feed_id not in feeds:
+            return {"error": f"Invalid {category} feed: {feed_id}"}
+        if not self.archive:
+            return {"error": "Feed archive is not enabled"}
+
+        snapshot = self.archive.snapshot_at(f"{category}_{feed_id}", timestamp)
+        if snapshot is None:
+            return {"error": f"No archived data for {category} feed {feed_id} at {timestamp}"}
+
+        fetched_at, raw = snapshot
+
+        # Snapshots are immutable; the last replayed one per feed is kept, so
+        # clients stepping through nearby times reuse it
+        cache_key = f"replay_{category}_{feed_id}"
+        timer.set_feed(cache_key)
+        entry = cache.get(cache_key, self.get_cache_timeout(category, feed_id))
+        if entry is not None and entry[0] == fetched_at:
+            result = entry[1]
+        else:
+            with timer.phase('parse'):
+                result = self.parse_gtfs_rt(raw, feed_id)
+            if "error" in result:
                 return result
-            else:
-                return {"error": f"HTTP error: {response.status_code}"}
+            cache.set(cache_key, (fetched_at, result))
 
-        except Exception as e:
-            return {"error": str(e)}
+        return dict(result, replay={"requested_at": timestamp, "fetched_at": fetched_at})
+
+    def get_feed_bytes(self, category, feed_id, fmt, route_ids=None, entity_types=None):
+        """
+        Get a realtime feed as protobuf or MessagePack bytes
+
+        The raw upstream protobuf is passed through as-is; filtered protobuf
+        and MessagePack encodings are cached per feed snapshot, so neither
+        goes through JSON. Protobuf filtered by a route that is not in any
+        static feed is encoded per request rather than cached.
+
+        Args:
+            category (str): Feed category ('subway', 'lirr', 'mnr', 'alerts')
+            feed_id (str): Feed ID
+            fmt (str): 'protobuf' or 'msgpack'
+            route_ids (set): Keep only entities for these routes (protobuf only)
+            entity_types (set): Keep only 'trip_update', 'vehicle' and/or 'alert' entities (protobuf only)
+
+        Returns:
+            tuple: (bytes, None) or (None, error dict)
+        """
+        sources = {
+            "subway": (self.get_subway_feed, "subway"),
+            "lirr": (self.get_lirr_feed, "lirr"),
+            "mnr": (self.get_mnr_feed, "mnr"),
+            "alerts": (self.get_service_alerts, "alert")
+        }
+        if category not in sources:
+            return None, {"error": f"Invalid feed category: {category}"}
+        invalid = sorted(set(entity_types or ()) - set(ENTITY_KINDS))
+        if invalid:
+            return None, {"error": f"Invalid entity type: {', '.join(invalid)}"}
+
+        # Refreshes the cached feed (and its raw payload) when expired
+        get_feed, prefix = sources[category]
+        result = get_feed(feed_id)
+        if isinstance(result, dict) and "error" in result:
+            return None, result
+
+        cache_key = f"{prefix}_{feed_id}"
+        timeout = self.get_cache_timeout(category, feed_id)
+
+        if fmt == 'msgpack':
+            if msgpack is None:
+                return None, {"error": "MessagePack output requires the msgpack package"}
+            source = result
+            encode = lambda: msgpack.packb(result, use_bin_type=True)
+            route_ids = entity_types = None
+        elif fmt == 'protobuf':
+            raw = cache.get(f"raw_{cache_key}", timeout)
+            if raw is None and self.feed_store:
+                entry = self.feed_store.load(cache_key)
+                raw = entry["raw"] if entry else None
+            if raw is None:
+                return None, {"error": f"No protobuf payload available for {category} feed {feed_id}"}
+            if not route_ids and not entity_types:
+                return raw, None
+            source = raw
+            encode = lambda: filter_feed(raw, route_ids, entity_types)
+        else:
+            return None, {"error": f"Invalid format: {fmt}"}
+
+        if route_ids and not all(
+            any(route_id in feed.routes for feed in self.static_feeds.feeds.values()) for route_id in route_ids
+        ):
+            # Unknown routes would give every client-chosen filter its own cache entry
+            with timer.phase('serialize'):
+                return encode(), None
+
+        # Encodings are reused while the snapshot they were built from is current
+        encoded_key = f"encoded_{cache_key}_{fmt}_{','.join(sorted(route_ids or ()))}_{','.join(sorted(entity_types or ()))}"
+        entry = cache.get(encoded_key, timeout)
+        if entry is not None and entry[0] is source:
+            return entry[1], None
+
+        with timer.phase('serialize'):
+            data = encode()
+        cache.set(encoded_key, (source, data))
+        return data, None
 
     def get_service_alerts(self, alert_type):
         """
@@ -383,27 +564,11 @@ class DataService:
         if alert_type not in SERVICE_ALERT_FEEDS:
             return {"error": f"Invalid alert type: {alert_type}"}
 
-        # Check cache
-        cache_key = f"alert_{alert_type}"
-        cached_data = cache.get(cache_key, self.get_cache_timeout('alerts', alert_type))
-        if cached_data:
-            return cached_data
-
-        try:
-            response = requests.get(SERVICE_ALERT_FEEDS[alert_type])
-
-            if response.status_code == 200:
-                # Parse GTFS-RT data
-                result = self.parse_gtfs_rt(response.content, alert_type)
-
-                # Cache result
-                cache.set(cache_key, result)
-                return result
-            else:
-                return {"error": f"HTTP error: {response.status_code}"}
-
-        except Exception as e:
-            return {"error": str(e)}
+        return self._fetch_realtime(
+            'alerts', alert_type, SERVICE_ALERT_FEEDS[alert_type], f"alert_{alert_type}",
+            lambda content: self.parse_gtfs_rt(content, alert_type),
+            on_refresh=self.subscriptions.process_alerts
+        )
 
     def get_accessibility_data(self, data_type):
         """
@@ -419,26 +584,10 @@ class DataService:
         if data_type not in ELEVATOR_ESCALATOR_FEEDS:
             return {"error": f"Invalid accessibility data type: {data_type}"}
 
-        # Check cache
-        cache_key = f"accessibility_{data_type}"
-        cached_data = cache.get(cache_key, self.get_cache_timeout('accessibility', data_type))
-        if cached_data:
-            return cached_data
-
-        # Fetch data
-        try:
-            response = requests.get(ELEVATOR_ESCALATOR_FEEDS[data_type])
-
-            if response.status_code == 200:
-                data = response.json()
-                # Cache result
-                cache.set(cache_key, data)
-                return data
-            else:
-                return {"error": f"HTTP error: {response.status_code}"}
-
-        except Exception as e:
-            return {"error": str(e)}
+        return self._fetch_realtime(
+            'accessibility', data_type, ELEVATOR_ESCALATOR_FEEDS[data_type], f"accessibility_{data_type}",
+            lambda content: json.loads(content)
+        )
 
     def get_station_accessibility(self, station_id):
         """
@@ -474,38 +623,89 @@ class DataService:
             "equipment": station_equipment
         }
 
-    def get_stations(self):
+    def get_static_feed(self, agency):
+        """
+        Get an agency's static feed
+
+        Args:
+            agency (str): Agency key
+
+        Returns:
+            tuple: (StaticFeed, None) or (None, error dict)
+        """
+        if agency not in STATIC_FEEDS:
+            return None, {"error": f"Invalid agency: {agency}"}
+
+        feed = self.static_feeds.get(agency)
+        if feed is None:
+            return None, {"error": f"No static data loaded for agency: {agency}"}
+
+        return feed, None
+
+    def get_service_calendar(self, agency=DEFAULT_AGENCY, date=None):
+        """
+        Get the services running on a date
+
+        Args:
+            agency (str): Agency key
+            date (datetime.date): Service date (default: today)
+
+        Returns:
+            dict: Active service_ids and the feed's service period
+        """
+        feed, error = self.get_static_feed(agency)
+        if error:
+            return error
+
+        date = date or feed.today()
+        first, last = feed.service_calendar.date_range()
+
+        return {
+            "agency": agency,
+            "service_date": date.strftime('%Y%m%d'),
+            "schedule_date": feed.schedule_date(date).strftime('%Y%m%d'),
+            "active_services": sorted(feed.services_on(date)),
+            "service_period": {
+                "start": first.strftime('%Y%m%d') if first else None,
+                "end": last.strftime('%Y%m%d') if last else None
+            }
+        }
+
+    def get_stations(self, agency=DEFAULT_AGENCY):
         """
         Get all stations data from GTFS stops.txt file
 
+        Args:
+            agency (str): Agency key
+
         Returns:
             list: List of station objects
         """
+        feed, error = self.get_static_feed(agency)
+        if error:
+            return error
+
         # Check cache
-        cache_key = "stations"
+        cache_key = f"stations_{agency}"
         cached_data = cache.get(cache_key, self.get_cache_timeout('stations', 'stations'))
         if cached_data:
             return cached_data
 
         try:
-            # Load station data from stops.txt
-            stops_file = os.path.join('data', 'gtfs_subway', 'stops.txt')
-
+            complexes = feed.station_complexes
             stations = []
-
-            with open(stops_file, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    # Only get stations, not entrances, platforms, etc.
-                    # In GTFS, location_type=0 or unspecified means a stop or station
-                    if row.get('location_type', '0') == '0' or not row.get('location_type'):
-                        station = {
-                            "id": row['stop_id'],
-                            "name": row['stop_name'],
-                            "lat": float(row['stop_lat']),
-                            "lng": float(row['stop_lon'])
-                        }
-                        stations.append(station)
+            for row in feed.stops.values():
+                # Only get stations, not entrances, platforms, etc.
+                # In GTFS, location_type=0 or unspecified means a stop or station
+                if row.get('location_type', '0') == '0' or not row.get('location_type'):
+                    station = {
+                        "id": row['stop_id'],
+                        "name": row['stop_name'],
+                        "lat": float(row['stop_lat']),
+                        "lng": float(row['stop_lon']),
+                        "complex_id": complexes.complex_id(row['stop_id'])
+                    }
+                    stations.append(station)
 
             # Cache results
             cache.set(cache_key, stations)
@@ -514,106 +714,247 @@ class DataService:
         except Exception as e:
             return {"error": f"Failed to load stations data: {str(e)}"}
 
-    def get_routes(self):
+    def search_stations(self, query, limit=10, agency=None):
         """
-        Get all routes (subway lines) data
+        Search stations of every agency by name
+
+        Args:
+            query (str): Search text (prefixes, any word order, typos tolerated)
+            limit (int): Maximum results
+            agency (str): Only return stations of this agency
 
         Returns:
-            list: List of route objects
+            list: Ranked stations with their platforms, or error
         """
-        # Check cache
-        cache_key = "routes"
-        cached_data = cache.get(cache_key, self.get_cache_timeout('routes', 'routes'))
-        if cached_data:
-            return cached_data
+        if agency is not None and agency not in STATIC_FEEDS:
+            return {"error": f"Invalid agency: {agency}"}
+
+        if self.station_index is None:
+            try:
+                self.station_index = StationIndex(self.static_feeds.feeds)
+            except Exception as e:
+                return {"error": f"Failed to build station index: {str(e)}"}
+
+        return self.station_index.search(query, limit, agency)
+
+    def get_complexes(self, agency=DEFAULT_AGENCY):
+        """
+        Get all station complexes
+
+        Args:
+            agency (str): Agency key
+
+        Returns:
+            list: Complexes with their member stops, or error
+        """
+        feed, error = self.get_static_feed(agency)
+        if error:
+            return error
+
+        try:
+            complexes = feed.station_complexes
+            return [
+                {
+                    "id": complex_id,
+                    "name": feed.stops[complex_id]['stop_name'],
+                    "stops": complexes.members(complex_id)
+                }
+                for complex_id in complexes.complex_ids
+            ]
+        except Exception as e:
+            return {"error": f"Failed to load station complexes: {str(e)}"}
+
+    def get_complex(self, complex_id, agency=DEFAULT_AGENCY):
+        """
+        Get a station complex with its stations, routes and transfers
+
+        Args:
+            complex_id (str): Complex ID, or the ID of any stop in it
+            agency (str): Agency key
+
+        Returns:
+            dict: Complex, or error
+        """
+        feed, error = self.get_static_feed(agency)
+        if error:
+            return error
 
         try:
-            # Load routes data from routes.txt
-            routes_file = os.path.join('data', 'gtfs_subway', 'routes.txt')
+            complexes = feed.station_complexes
+            resolved = complexes.complex_id(complex_id)
+            if resolved is None:
+                return {"error": f"Unknown stop or complex: {complex_id}"}
+            return complexes.describe(resolved)
+        except Exception as e:
+            return {"error": f"Failed to load station complex: {str(e)}"}
+
+    def get_complex_routes(self, complex_id, agency=DEFAULT_AGENCY):
+        """
+        Get the routes serving a station complex
+
+        Args:
+            complex_id (str): Complex ID, or the ID of any stop in it
+            agency (str): Agency key
+
+        Returns:
+            dict: Complex ID and route objects, or error
+        """
+        feed, error = self.get_static_feed(agency)
+        if error:
+            return error
+
+        try:
+            complexes = feed.station_complexes
+            resolved = complexes.complex_id(complex_id)
+            if resolved is None:
+                return {"error": f"Unknown stop or complex: {complex_id}"}
+            # Routes are derived from the stops their trips call at
+            if not feed.has_table('stop_times'):
+                return {"error": "GTFS stop_times data not found"}
 
             routes = []
+            for route_id in complexes.routes(resolved):
+                row = feed.routes.get(route_id, {})
+                routes.append({
+                    "id": route_id,
+                    "short_name": row.get('route_short_name', ''),
+                    "long_name": row.get('route_long_name', ''),
+                    "color": row.get('route_color', ''),
+                    "text_color": row.get('route_text_color', '')
+                })
+
+            return {"complex_id": resolved, "routes": routes}
+        except Exception as e:
+            return {"error": f"Failed to load complex routes: {str(e)}"}
 
-            with open(routes_file, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    route = {
-                        "id": row['route_id'],
-                        "short_name": row['route_short_name'],
-                        "long_name": row['route_long_name'],
-                        "color": row.get('route_color', ''),
-                        "text_color": row.get('route_text_color', '')
-                    }
-                    routes.append(route)
+    def get_isochrone(self, stop_id, minutes=30, departure=None, agency=DEFAULT_AGENCY, date=None):
+        """
+        Get the stations reachable from a station within a travel time budget
 
-            # Cache results
-            cache.set(cache_key, routes)
-            return routes
+        The search starts at the departure time rounded up to the minute
+        and covers ISOCHRONE_MAX_MINUTES; smaller budgets filter it.
+        Searches are cached per (origin, ISOCHRONE_BUCKET of departure
+        times, service day), each entry holding the bucket's minutes.
+
+        Args:
+            stop_id (str): Origin station or platform ID
+            minutes (int): Travel time budget
+            departure (int): Departure time in seconds after midnight (default: now)
+            agency (str): Agency key
+            date (datetime.date): Service date (default: today)
 
+        Returns:
+            dict: Origin, departure and reachable stations with earliest arrivals, or error
+        """
+        feed, error = self.get_static_feed(agency)
+        if error:
+            return error
+
+        if not 0 < minutes <= ISOCHRONE_MAX_MINUTES:
+            return {"error": f"minutes must be between 1 and {ISOCHRONE_MAX_MINUTES}"}
+
+        try:
+            timetable = feed.timetable
         except Exception as e:
-            return {"error": f"Failed to load routes data: {str(e)}"}
+            return {"error": f"Failed to compile timetable: {str(e)}"}
+
+        origin = timetable.station_codes.get(stop_id)
+        if origin is None:
+            return {"error": f"Unknown stop: {stop_id}"}
+
+        now = datetime.datetime.now(ZoneInfo(feed.agency_timezone))
+        if departure is None:
+            departure = now.hour * 3600 + now.minute * 60 + now.second
+        date = date or now.date()
+        # Round up to the minute, so no train leaving before the requested time is boarded
+        departure += -departure % 60
+
+        # Check cache: one entry per departure bucket, holding the searches of its minutes
+        origin_id = timetable.station_ids[origin]
+        bucket = departure - departure % ISOCHRONE_BUCKET
+        cache_key = f"isochrone_{agency}_{origin_id}_{bucket}_{date:%Y%m%d}"
+        searches = cache.get(cache_key, self.get_cache_timeout('isochrone', 'isochrone')) or {}
+        arrivals = searches.get(departure)
+        if arrivals is None:
+            with admission.slot('search'):
+                searches = cache.get(cache_key, self.get_cache_timeout('isochrone', 'isochrone')) or {}
+                arrivals = searches.get(departure)
+                if arrivals is None:
+                    try:
+                        reached = timetable.earliest_arrivals(origin, departure, ISOCHRONE_MAX_MINUTES * 60, date)
+                        arrivals = sorted((seconds, code) for code, seconds in reached.items())
+                    except Exception as e:
+                        return {"error": f"Failed to compute isochrone: {str(e)}"}
+                    cache.set(cache_key, {**searches, departure: arrivals})
+
+        deadline = departure + minutes * 60
+        stations = []
+        for seconds, code in arrivals:
+            if seconds > deadline:
+                break
+            stop = feed.stops[timetable.station_ids[code]]
+            stations.append({
+                "id": stop['stop_id'],
+                "name": stop['stop_name'],
+                "lat": float(stop['stop_lat']),
+                "lng": float(stop['stop_lon']),
+                "arrival": format_gtfs_time(seconds),
+                "minutes": round((seconds - departure) / 60, 1)
+            })
 
-    def get_line_shape(self, route_id):
+        return {
+            "origin": origin_id,
+            "service_date": date.strftime('%Y%m%d'),
+            "schedule_date": feed.schedule_date(date).strftime('%Y%m%d'),
+            "departure": format_gtfs_time(departure),
+            "minutes": minutes,
+            "stations": stations
+        }
+
+    def _station_stop_ids(self, feed, stop_id):
+        """Get a stop and its child platforms"""
+        return {stop_id} | {child for child, row in feed.stops.items() if row.get('parent_station') == stop_id}
+
+    def get_frequencies(self, route_id, agency=DEFAULT_AGENCY, stop_id=None, date=None, service_id=None,
+                        direction=None):
         """
-        Get shape coordinates for a specific route
+        Get a route's scheduled trips and headways per direction, stop, service and hour
 
         Args:
             route_id (str): Route ID
+            agency (str): Agency key
+            stop_id (str): Only this stop, or a station and its platforms
+            date (datetime.date): Only the services running on this date
+            service_id (str): Only this service
+            direction (int): Only this direction_id
 
         Returns:
-            list: List of coordinate points along the route
+            dict: Frequency rows, or error
         """
+        feed, error = self.get_static_feed(agency)
+        if error:
+            return error
+
+        if route_id not in feed.route_trips:
+            return {"error": f"No trips found for route: {route_id}"}
+
         # Check cache
-        cache_key = f"line_shape_{route_id}"
-        cached_data = cache.get(cache_key, self.get_cache_timeout('lines', route_id))
+        cache_key = f"frequencies_{agency}_{route_id}_{stop_id}_{date and f'{date:%Y%m%d}'}_{service_id}_{direction}"
+        cached_data = cache.get(cache_key, self.get_cache_timeout('frequencies', route_id))
         if cached_data:
             return cached_data
 
         try:
-            # Process steps:
-            # 1. Get trips for this route from trips.txt
-            # 2. Extract shape_ids from trips
-            # 3. Get coordinates for these shapes from shapes.txt
-
-            trips_file = os.path.join('data', 'gtfs_subway', 'trips.txt')
-            shapes_file = os.path.join('data', 'gtfs_subway', 'shapes.txt')
-
-            # Get shape_ids for this route_id
-            shape_ids = set()
-            with open(trips_file, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    if row['route_id'] == route_id:
-                        shape_ids.add(row['shape_id'])
-
-            if not shape_ids:
-                return {"error": f"No shapes found for route: {route_id}"}
-
-            # Get coordinates for each shape
-            shapes = {}
-            for shape_id in shape_ids:
-                shapes[shape_id] = []
-
-            with open(shapes_file, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    if row['shape_id'] in shape_ids:
-                        shapes[row['shape_id']].append({
-                            "lat": float(row['shape_pt_lat']),
-                            "lng": float(row['shape_pt_lon']),
-                            "sequence": int(row['shape_pt_sequence'])
-                        })
-
-            # Sort each shape by sequence
-            for shape_id in shapes:
-                shapes[shape_id].sort(key=lambda x: x['sequence'])
-
-            # Return list of coordinates for all shapes (remove sequence)
+            service_ids = {service_id} if service_id else None
+            if date is not None:
+                active = feed.services_on(date)
+                service_ids = service_ids & active if service_ids else active
+
+            stop_ids = self._station_stop_ids(feed, stop_id) if stop_id else None
             result = {
                 "route_id": route_id,
-                "shapes": [{
-                    "shape_id": shape_id,
-                    "coordinates": [{"lat": pt["lat"], "lng": pt["lng"]} for pt in shapes[shape_id]]
-                } for shape_id in shapes]
+                "service_date": date.strftime('%Y%m%d') if date else None,
+                "frequencies": feed.frequencies.rows(route_id, stop_ids, service_ids, direction)
             }
 
             # Cache results
@@ -621,205 +962,433 @@ class DataService:
             return result
 
         except Exception as e:
-            return {"error": f"Failed to load shape data: {str(e)}"}
+            return {"error": f"Failed to load frequencies: {str(e)}"}
 
-    def get_line(self, line_id):
+    def get_headway_comparison(self, route_id):
         """
-        Get geographic coordinates for a specific line
+        Compare a route's realtime headways with the scheduled ones for the current hour
+
+        After midnight the previous service day's trips past 24:00 are still
+        running, so its services are counted too (as in Timetable.connections_on).
 
         Args:
-            line_id (str or int): Line ID
+            route_id (str): Subway route ID
 
         Returns:
-            list: List of coordinate points along the line
+            dict: Observed vs scheduled headway per stop, or error
+        """
+        observed = self.analytics.get_route(route_id, 'subway')
+        if "error" in observed:
+            return observed
+
+        feed = self.static_feed
+        try:
+            now = datetime.datetime.now(ZoneInfo(feed.agency_timezone))
+            services = feed.services_on(now.date())
+            previous = feed.services_on(now.date() - datetime.timedelta(days=1))
+            frequencies = feed.frequencies
+        except Exception as e:
+            return {"error": f"Failed to load frequencies: {str(e)}"}
+
+        stops = {}
+        ratios = []
+        for stop_id, summary in observed["stops"].items():
+            trips, scheduled = frequencies.scheduled_headway(
+                route_id, {stop_id}, services, now.hour, previous_service_ids=previous)
+            actual = summary["avg_headway"]
+            ratio = actual / scheduled if actual is not None and scheduled else None
+            if ratio is not None:
+                ratios.append(ratio)
+            stops[stop_id] = {
+                "observed_headway": actual,
+                "scheduled_headway": scheduled,
+                "scheduled_trips": trips,
+                "headway_ratio": ratio
+            }
+
+        return {
+            "route_id": route_id,
+            "hour": now.hour,
+            "schedule_date": feed.schedule_date(now.date()).strftime('%Y%m%d'),
+            "service_ids": sorted(services),
+            "previous_service_ids": sorted(previous),
+            "observed_headway": observed["summary"]["avg_headway"],
+            "median_headway_ratio": sorted(ratios)[len(ratios) // 2] if ratios else None,
+            "stops": stops
+        }
+
+    def get_routes(self, agency=DEFAULT_AGENCY):
         """
+        Get all routes (subway lines) data
+
+        Args:
+            agency (str): Agency key
+
+        Returns:
+            list: List of route objects
+        """
+        feed, error = self.get_static_feed(agency)
+        if error:
+            return error
+
         # Check cache
-        cache_key = f"line_{line_id}"
-        cached_data = cache.get(cache_key, self.get_cache_timeout('lines', line_id))
+        cache_key = f"routes_{agency}"
+        cached_data = cache.get(cache_key, self.get_cache_timeout('routes', 'routes'))
         if cached_data:
             return cached_data
 
         try:
-            # Initialize empty result list
-            coordinates = []
-
-            # Path to GTFS files
-            trips_file = os.path.join('data', 'gtfs_subway', 'trips.txt')
-            shapes_file = os.path.join('data', 'gtfs_subway', 'shapes.txt')
-            stops_file = os.path.join('data', 'gtfs_subway', 'stops.txt')
-            stop_times_file = os.path.join('data', 'gtfs_subway', 'stop_times.txt')
-
-            # Check if files exist
-            if not os.path.exists(trips_file) or not os.path.exists(shapes_file):
-                print(
-                    f"Missing required files: trips={os.path.exists(trips_file)}, shapes={os.path.exists(shapes_file)}")
-                return {"error": "GTFS data files not found"}
-
-            # Step 1: Find a shape_id for this route from trips.txt
-            shape_ids = set()
-            with open(trips_file, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    if row['route_id'] == line_id and 'shape_id' in row:
-                        shape_ids.add(row['shape_id'])
-
-            # Step 2: If we found a shape_id, get coordinates from shapes.txt
-            if shape_ids:
-                print(f"Found {len(shape_ids)} shape_ids for route {line_id}")
-
-                # Get the first shape_id (could get multiple or pick longest)
-                primary_shape_id = list(shape_ids)[0]
-
-                # Get all points for this shape
-                shape_points = []
-                with open(shapes_file, 'r', encoding='utf-8') as f:
-                    reader = csv.DictReader(f)
-                    for row in reader:
-                        if row['shape_id'] == primary_shape_id:
-                            shape_points.append({
-                                'lat': float(row['shape_pt_lat']),
-                                'lng': float(row['shape_pt_lon']),
-                                'sequence': int(row['shape_pt_sequence'])
-                            })
-
-                # Sort by sequence
-                shape_points.sort(key=lambda p: p['sequence'])
-
-                # Create coordinates list (without sequence)
-                coordinates = [{'lat': p['lat'], 'lng': p['lng']} for p in shape_points]
-
-                print(f"Found {len(coordinates)} points for shape {primary_shape_id}")
-
-            # Step 3: If no shape data, use stops
-            if not coordinates:
-                print(f"No shape data for route {line_id}, using stops")
-
-                # Get trip_ids for this route
-                trip_ids = set()
-                with open(trips_file, 'r', encoding='utf-8') as f:
-                    reader = csv.DictReader(f)
-                    for row in reader:
-                        if row['route_id'] == line_id:
-                            trip_ids.add(row['trip_id'])
-
-                # If we have trips, get stops for them
-                if trip_ids:
-                    # Get the first trip_id to use (could pick something more representative)
-                    primary_trip_id = list(trip_ids)[0]
-
-                    # Get stop_ids for this trip
-                    stop_sequence = []
-                    with open(stop_times_file, 'r', encoding='utf-8') as f:
-                        reader = csv.DictReader(f)
-                        for row in reader:
-                            if row['trip_id'] == primary_trip_id:
-                                stop_sequence.append({
-                                    'stop_id': row['stop_id'],
-                                    'sequence': int(row['stop_sequence'])
-                                })
+            routes = []
+            for row in feed.routes.values():
+                route = {
+                    "id": row['route_id'],
+                    "short_name": row.get('route_short_name', ''),
+                    "long_name": row.get('route_long_name', ''),
+                    "color": row.get('route_color', ''),
+                    "text_color": row.get('route_text_color', '')
+                }
+                routes.append(route)
 
-                    # Sort by sequence
-                    stop_sequence.sort(key=lambda s: s['sequence'])
-
-                    # Get coordinates for these stops
-                    stop_dict = {}
-                    with open(stops_file, 'r', encoding='utf-8') as f:
-                        reader = csv.DictReader(f)
-                        for row in reader:
-                            stop_dict[row['stop_id']] = {
-                                'lat': float(row['stop_lat']),
-                                'lng': float(row['stop_lon'])
-                            }
-
-                    # Create coordinates list from stops
-                    for stop in stop_sequence:
-                        if stop['stop_id'] in stop_dict:
-                            coordinates.append(stop_dict[stop['stop_id']])
-
-                    print(f"Created line from {len(coordinates)} stops")
-
-            # Cache and return results
-            if coordinates:
-                cache.set(cache_key, coordinates)
-                return coordinates
-            else:
-                return {"error": f"No data found for line {line_id}"}
+            # Cache results
+            cache.set(cache_key, routes)
+            return routes
 
         except Exception as e:
-            import traceback
-            print(f"Error in get_line: {str(e)}")
-            print(traceback.format_exc())
-            return {"error": f"Failed to load line data: {str(e)}"}
+            return {"error": f"Failed to load routes data: {str(e)}"}
+
+    def _cached_build(self, cache_key, timeout, cost_class, builder, cacheable=None):
+        """
+        Get a result from the cache, or build it under admission control
+
+        The cache is checked again once a slot is held, since another
+        request may have built the result while this one queued.
+
+        Args:
+            cache_key (str): Cache key
+            timeout (int): Cache timeout
+            cost_class (str): Admission cost class of the build
+            builder (callable): Builds the result
+            cacheable (callable): Whether a built result may be cached (default: unless it is an error)
+
+        Returns:
+            any: The result
+
+        Raises:
+            Overloaded: No slot could be had in time
+        """
+        cached_data = cache.get(cache_key, timeout)
+        if cached_data:
+            return cached_data
+
+        with admission.slot(cost_class):
+            cached_data = cache.get(cache_key, timeout)
+            if cached_data:
+                return cached_data
+
+            result = builder()
+            if cacheable(result) if cacheable else not (isinstance(result, dict) and "error" in result):
+                cache.set(cache_key, result)
+            return result
+
+    def get_line_shape(self, route_id, agency=DEFAULT_AGENCY, date=None):
+        """
+        Get shape coordinates for a specific route
+
+        Args:
+            route_id (str): Route ID
+            agency (str): Agency key
+            date (datetime.date): Service date (default: today)
+
+        Returns:
+            list: List of coordinate points along the route
+        """
+        feed, error = self.get_static_feed(agency)
+        if error:
+            return error
+
+        date = date or feed.today()
+
+        def build():
+            try:
+                return self._line_shape_result(feed, route_id, date)
+            except Exception as e:
+                return {"error": f"Failed to load shape data: {str(e)}"}
+
+        cache_key = f"line_shape_{agency}_{route_id}_{date:%Y%m%d}"
+        return self._cached_build(cache_key, self.get_cache_timeout('lines', route_id), 'static', build)
+
+    def _line_shape_result(self, feed, route_id, date):
+        if not feed.has_table('shapes'):
+            return {"error": "GTFS shapes data not found"}
+
+        # Shapes of the trips running on the date, most frequent first
+        shape_counts = feed.route_shapes_on(route_id, date)
+        if not shape_counts:
+            return {"error": f"No shapes found for route: {route_id}"}
+
+        shapes = feed.shapes
+
+        # Return list of coordinates for all shapes
+        return {
+            "route_id": route_id,
+            "service_date": date.strftime('%Y%m%d'),
+            "shapes": [{
+                "shape_id": shape_id,
+                "trip_count": trip_count,
+                "coordinates": [{"lat": lat, "lng": lon} for lat, lon in shapes.get(shape_id, [])]
+            } for shape_id, trip_count in shape_counts]
+        }
+
+    def get_line(self, line_id, agency=DEFAULT_AGENCY, date=None):
+        """
+        Get geographic coordinates for a specific line
+
+        Args:
+            line_id (str or int): Line ID
+            agency (str): Agency key
+            date (datetime.date): Service date (default: today)
+
+        Returns:
+            list: List of coordinate points along the line
+        """
+        feed, error = self.get_static_feed(agency)
+        if error:
+            return error
+
+        date = date or feed.today()
+
+        def build():
+            try:
+                # Initialize empty result list
+                coordinates = []
+
+                # Check if files exist
+                if not feed.has_table('trips') or not feed.has_table('shapes'):
+                    print(
+                        f"Missing required files: trips={feed.has_table('trips')}, shapes={feed.has_table('shapes')}")
+                    return {"error": "GTFS data files not found"}
+
+                # Step 1: Find the shapes running on the date, most frequent first
+                shape_counts = feed.route_shapes_on(line_id, date)
+
+                # Step 2: If we found a shape_id, get the representative one's coordinates
+                if shape_counts:
+                    print(f"Found {len(shape_counts)} shape_ids for route {line_id}")
+
+                    primary_shape_id = shape_counts[0][0]
+                    coordinates = [{'lat': lat, 'lng': lon} for lat, lon in feed.shapes.get(primary_shape_id, [])]
+
+                    print(f"Found {len(coordinates)} points for shape {primary_shape_id}")
+
+                # Step 3: If no shape data, use the stops of one trip
+                if not coordinates:
+                    print(f"No shape data for route {line_id}, using stops")
+
+                    services = feed.services_on(date)
+                    trip_ids = feed.route_trips.get(line_id, [])
+                    trip_ids = [t for t in trip_ids if feed.trips[t]['service_id'] in services] or trip_ids
+                    if trip_ids:
+                        stops = feed.stops
+                        for _, stop_id, _, _ in feed.stop_times.for_trip(trip_ids[0]):
+                            if stop_id in stops:
+                                coordinates.append({
+                                    'lat': float(stops[stop_id]['stop_lat']),
+                                    'lng': float(stops[stop_id]['stop_lon'])
+                                })
+
+                        print(f"Created line from {len(coordinates)} stops")
+
+                # Return results; _cached_build caches them
+                if coordinates:
+                    return coordinates
+                else:
+                    return {"error": f"No data found for line {line_id}"}
 
+            except Exception as e:
+                import traceback
+                print(f"Error in get_line: {str(e)}")
+                print(traceback.format_exc())
+                return {"error": f"Failed to load line data: {str(e)}"}
 
-    def get_stops_for_route(self, route_id):
+        cache_key = f"line_{agency}_{line_id}_{date:%Y%m%d}"
+        return self._cached_build(cache_key, self.get_cache_timeout('lines', line_id), 'static', build)
+
+    def get_stops_for_route(self, route_id, agency=DEFAULT_AGENCY, date=None):
         """
         Get all stops for a specific route
 
         Args:
             route_id (str): Route ID
+            agency (str): Agency key
+            date (datetime.date): Service date (default: today)
 
         Returns:
             list: List of stops for the route
         """
-        # Check cache
-        cache_key = f"route_stops_{route_id}"
-        cached_data = cache.get(cache_key, self.get_cache_timeout('route_stops', route_id))
-        if cached_data:
-            return cached_data
+        feed, error = self.get_static_feed(agency)
+        if error:
+            return error
 
-        try:
-            # Process steps:
-            # 1. Get trips for this route from trips.txt
-            # 2. Extract trip_ids from trips
-            # 3. Get stops for each trip from stop_times.txt
-            # 4. Get stop details from stops.txt
-
-            trips_file = os.path.join('data', 'gtfs_subway', 'trips.txt')
-            stop_times_file = os.path.join('data', 'gtfs_subway', 'stop_times.txt')
-            stops_file = os.path.join('data', 'gtfs_subway', 'stops.txt')
-
-            # Get trip_ids for this route_id
-            trip_ids = set()
-            with open(trips_file, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    if row['route_id'] == route_id:
-                        trip_ids.add(row['trip_id'])
-
-            if not trip_ids:
-                return {"error": f"No trips found for route: {route_id}"}
-
-            # Get stops for each trip
-            stop_ids = set()
-            with open(stop_times_file, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    if row['trip_id'] in trip_ids:
-                        stop_ids.add(row['stop_id'])
-
-            # Get stop details
-            stops = []
-            with open(stops_file, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    if row['stop_id'] in stop_ids:
-                        stop = {
-                            "id": row['stop_id'],
-                            "name": row['stop_name'],
-                            "lat": float(row['stop_lat']),
-                            "lng": float(row['stop_lon'])
-                        }
-                        stops.append(stop)
+        date = date or feed.today()
 
-            result = {
-                "route_id": route_id,
-                "stops": stops
-            }
+        def build():
+            try:
+                return self._route_stops_results(feed, [route_id], date)[route_id]
+            except Exception as e:
+                return {"error": f"Failed to load stops for route: {str(e)}"}
 
-            # Cache results
-            cache.set(cache_key, result)
-            return result
+        cache_key = f"route_stops_{agency}_{route_id}_{date:%Y%m%d}"
+        return self._cached_build(cache_key, self.get_cache_timeout('route_stops', route_id), 'static', build)
 
-        except Exception as e:
-            return {"error": f"Failed to load stops for route: {str(e)}"}
\ No newline at end of file
+    def _route_stops_results(self, feed, route_ids, date):
+        """
+        Build the stop lists of several routes in one pass over stops.txt
+
+        Args:
+            feed (StaticFeed): Static feed
+            route_ids (list): Route IDs
+            date (datetime.date): Service date
+
+        Returns:
+            dict: route_id -> stops result or error
+        """
+        if not feed.has_table('stop_times'):
+            return {route_id: {"error": "GTFS stop_times data not found"} for route_id in route_ids}
+
+        results = {}
+        served = {}
+        for route_id in route_ids:
+            if route_id not in feed.route_trips:
+                results[route_id] = {"error": f"No trips found for route: {route_id}"}
+            else:
+                served[route_id] = feed.route_stops_on(route_id, date)
+                results[route_id] = {"route_id": route_id, "service_date": date.strftime('%Y%m%d'), "stops": []}
+
+        # Get details of the stops served on the date, in stops.txt order
+        for stop_id, row in feed.stops.items():
+            stop = None
+            for route_id, stop_ids in served.items():
+                if stop_id in stop_ids:
+                    stop = stop or {
+                        "id": row['stop_id'],
+                        "name": row['stop_name'],
+                        "lat": float(row['stop_lat']),
+                        "lng": float(row['stop_lon'])
+                    }
+                    results[route_id]["stops"].append(stop)
+
+        return results
+
+    def get_routes_batch(self, route_ids=None, kinds=None, agency=DEFAULT_AGENCY, date=None):
+        """
+        Get the shapes and/or stops of many routes at once
+
+        Per-route results are served from the cache where possible; the
+        misses are built together (stops in a single pass over stops.txt)
+        and cached individually as well as in the combined response. Routes
+        not in the feed get an error per kind, and a combined response
+        containing any error is not cached.
+
+        Args:
+            route_ids (list): Route IDs (default: every route)
+            kinds (set): Resources to include: 'shape', 'stops' (default: both)
+            agency (str): Agency key
+            date (datetime.date): Service date (default: today)
+
+        Returns:
+            dict: Service date and route_id -> {kind: result}, or error
+        """
+        feed, error = self.get_static_feed(agency)
+        if error:
+            return error
+
+        kinds = set(kinds or ROUTE_BATCH_KINDS)
+        if kinds - set(ROUTE_BATCH_KINDS):
+            return {"error": f"Invalid kinds: {', '.join(sorted(kinds - set(ROUTE_BATCH_KINDS)))}"}
+
+        date = date or feed.today()
+        route_ids = sorted(set(route_ids)) if route_ids else list(feed.routes)
+        unknown = {route_id for route_id in route_ids if route_id not in feed.routes}
+
+        def build():
+            try:
+                routes = {route_id: {} for route_id in route_ids}
+                keys = {
+                    'shape': (f"line_shape_{agency}_{{}}_{date:%Y%m%d}", 'lines'),
+                    'stops': (f"route_stops_{agency}_{{}}_{date:%Y%m%d}", 'route_stops')
+                }
+                misses = {kind: [] for kind in kinds}
+                for kind in kinds:
+                    key, category = keys[kind]
+                    for route_id in route_ids:
+                        if route_id in unknown:
+                            routes[route_id][kind] = {"error": f"Route not found: {route_id}"}
+                            continue
+                        cached_item = cache.get(key.format(route_id), self.get_cache_timeout(category, route_id))
+                        if cached_item:
+                            routes[route_id][kind] = cached_item
+                        else:
+                            misses[kind].append(route_id)
+
+                built = {}
+                if misses.get('stops'):
+                    built['stops'] = self._route_stops_results(feed, misses['stops'], date)
+                if misses.get('shape'):
+                    built['shape'] = {route_id: self._line_shape_result(feed, route_id, date) for route_id in misses['shape']}
+
+                for kind, results in built.items():
+                    for route_id, item in results.items():
+                        routes[route_id][kind] = item
+                        if "error" not in item:
+                            cache.set(keys[kind][0].format(route_id), item)
+
+                return {"service_date": date.strftime('%Y%m%d'), "routes": routes}
+
+            except Exception as e:
+                return {"error": f"Failed to load route batch: {str(e)}"}
+
+        # Cache results, unless any route failed (its error may be transient or client-chosen)
+        def cacheable(result):
+            return "routes" in result and not any(
+                "error" in item for items in result["routes"].values() for item in items.values())
+
+        cache_key = f"routes_batch_{agency}_{date:%Y%m%d}_{','.join(sorted(kinds))}_{','.join(route_ids)}"
+        return self._cached_build(
+            cache_key, self.get_cache_timeout('routes_batch', 'routes_batch'), 'static', build, cacheable)
+
+    def _tile_service(self, feed, agency):
+        """
+        Get an agency's tile generator, created on first use (imports shapely)
+
+        Args:
+            feed (StaticFeed): Agency's static feed
+            agency (str): Agency key
+
+        Returns:
+            TileService: Tile generator
+        """
+        tiles = self.tiles.get(agency)
+        if tiles is None:
+            from services.tile_service import TileService
+
+            tiles = self.tiles.setdefault(agency, TileService(feed, agency))
+        return tiles
+
+    def get_tile(self, z, x, y, agency=DEFAULT_AGENCY):
+        """
+        Get a Mapbox Vector Tile of stations and route shapes
+
+        Args:
+            z (int): Zoom
+            x (int): Tile column
+            y (int): Tile row
+            agency (str): Agency key
+
+        Returns:
+            bytes: Encoded tile, or error dict
+        """
+        feed, error = self.get_static_feed(agency)
+        if error:
+            return error
+
+        return self._tile_service(feed, agency).get_tile(z, x, y, self.get_cache_timeout('tiles', 'tiles'))
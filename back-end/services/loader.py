@@ -0,0 +1,67 @@
+import importlib
+import threading
+import time
+
+
+class ServiceLoader:
+    """
+    Creates a service on first use, or in a background thread
+
+    Attribute access is forwarded to the service, building it (or waiting
+    for the background build) if needed, so it can stand in for the service
+    object itself.
+    """
+
+    def __init__(self, module, name):
+        """
+        Args:
+            module (str): Module that defines the service, imported on load
+            name (str): Service class name
+        """
+        self._module = module
+        self._name = name
+        self._service = None
+        self._lock = threading.Lock()
+        self.state = "pending"  # pending, loading, ready, failed
+        self.error = None
+        self.load_seconds = None
+
+    def get(self):
+        """
+        Get the service, building it on first call
+
+        Returns:
+            object: The service
+        """
+        if self._service is None:
+            with self._lock:
+                if self._service is None:
+                    self.state = "loading"
+                    start = time.perf_counter()
+                    try:
+                        self._service = getattr(importlib.import_module(self._module), self._name)()
+                    except Exception as e:
+                        self.state = "failed"
+                        self.error = str(e)
+                        raise
+                    self.load_seconds = time.perf_counter() - start
+                    self.state = "ready"
+                    self.error = None
+        return self._service
+
+    def start_background(self):
+        """Build the service in a daemon thread"""
+        def load():
+            try:
+                self.get()
+            except Exception as e:
+                print(f"Background load of {self._name} failed: {str(e)}")
+
+        threading.Thread(target=load, name=f"load-{self._name}", daemon=True).start()
+
+    @property
+    def loaded(self):
+        return self._service is not None
+
+    def __getattr__(self, attribute):
+        return getattr(self.get(), attribute)
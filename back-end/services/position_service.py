@@ -0,0 +1,205 @@
+import bisect
+import threading
+import pyproj
+from shapely.geometry import LineString, Point
+from shapely.ops import transform
+
+# Projected CRS for linear referencing (NAD83 / New York Long Island, feet)
+PROJECTED_CRS = 'EPSG:2263'
+
+
+class ShapeGeometry:
+    """
+    Projected shape line with memoized stop positions along it
+    """
+
+    def __init__(self, line):
+        self.line = line
+        self.stop_distances = {}  # stop_id -> distance along the line
+
+
+class PositionService:
+    """
+    Interpolates train positions along shape geometry between feed refreshes
+
+    Each shape is projected once, and each stop's distance along a shape is
+    computed once with linear referencing and reused for every request.
+    """
+
+    def __init__(self, static_feed, predictions):
+        self.static = static_feed
+        self.predictions = predictions
+        self._lock = threading.Lock()
+        self._geometries = {}
+        self._to_projected = pyproj.Transformer.from_crs('EPSG:4326', PROJECTED_CRS, always_xy=True).transform
+        self._to_wgs84 = pyproj.Transformer.from_crs(PROJECTED_CRS, 'EPSG:4326', always_xy=True).transform
+
+    def _geometry(self, shape_id):
+        """
+        Get the projected geometry of a shape
+
+        Args:
+            shape_id (str): Shape ID
+
+        Returns:
+            ShapeGeometry: Projected shape, or None if unknown
+        """
+        geometry = self._geometries.get(shape_id)
+        if geometry is None:
+            points = self.static.shapes.get(shape_id)
+            if not points or len(points) < 2:
+                return None
+
+            line = transform(self._to_projected, LineString([(lon, lat) for lat, lon in points]))
+            with self._lock:
+                geometry = self._geometries.setdefault(shape_id, ShapeGeometry(line))
+
+        return geometry
+
+    def _stop_distance(self, geometry, stop_id):
+        """
+        Get a stop's distance along a shape, projecting it on first use
+
+        Args:
+            geometry (ShapeGeometry): Projected shape
+            stop_id (str): Stop ID
+
+        Returns:
+            float: Distance along the shape, or None if the stop is unknown
+        """
+        distance = geometry.stop_distances.get(stop_id)
+        if distance is None:
+            stop = self.static.stops.get(stop_id)
+            if stop is None:
+                return None
+
+            x, y = self._to_projected(float(stop['stop_lon']), float(stop['stop_lat']))
+            distance = geometry.line.project(Point(x, y))
+            geometry.stop_distances[stop_id] = distance
+
+        return distance
+
+    def _shape_id(self, prediction):
+        """
+        Get the shape a predicted trip runs on
+
+        Args:
+            prediction (dict): Trip prediction
+
+        Returns:
+            str: Shape ID or None
+        """
+        static_trip = self.static.trips.get(prediction["static_trip_id"] or '')
+        if static_trip and static_trip.get('shape_id'):
+            return static_trip['shape_id']
+
+        # NYCT trip ids end with the shape pattern (e.g. '000600_1..S03R')
+        pattern = prediction["trip_id"].rsplit('_', 1)[-1]
+        return pattern if pattern in self.static.shapes else None
+
+    def _timeline(self, prediction):
+        """
+        Get the (time, stop_id) points a trip is known to pass
+
+        Args:
+            prediction (dict): Trip prediction
+
+        Returns:
+            list: (time, stop_id) pairs in stop order
+        """
+        delay = prediction["delay"] or 0
+        timeline = []
+        for stop in prediction["stops"]:
+            if stop["eta"] is not None:
+                stop_time = stop["eta"]
+            elif stop["scheduled"] is not None:
+                stop_time = stop["scheduled"] + delay
+            else:
+                continue
+
+            if not timeline or stop_time >= timeline[-1][0]:
+                timeline.append((stop_time, stop["stop_id"]))
+
+        return timeline
+
+    def locate(self, prediction, timestamp):
+        """
+        Interpolate a trip's position at a time
+
+        Args:
+            prediction (dict): Trip prediction
+            timestamp (float): Unix time
+
+        Returns:
+            dict: Position, or None if the trip has no usable stop times
+        """
+        timeline = self._timeline(prediction)
+        if not timeline:
+            return None
+
+        # Bracketing stops and progress between them
+        times = [t for t, _ in timeline]
+        i = bisect.bisect_right(times, timestamp) - 1
+        if i < 0:
+            from_index, to_index, progress = 0, 0, 0.0
+        elif i >= len(timeline) - 1:
+            from_index, to_index, progress = len(timeline) - 1, len(timeline) - 1, 0.0
+        else:
+            from_index, to_index = i, i + 1
+            span = times[to_index] - times[from_index]
+            progress = (timestamp - times[from_index]) / span if span > 0 else 0.0
+
+        from_stop, to_stop = timeline[from_index][1], timeline[to_index][1]
+        shape_id = self._shape_id(prediction)
+        geometry = self._geometry(shape_id) if shape_id else None
+
+        lat = lng = None
+        if geometry is not None:
+            start = self._stop_distance(geometry, from_stop)
+            end = self._stop_distance(geometry, to_stop)
+            if start is not None and end is not None:
+                point = geometry.line.interpolate(start + (end - start) * progress)
+                lng, lat = self._to_wgs84(point.x, point.y)
+
+        if lat is None:
+            # No shape: straight line between the two stops
+            stops = self.static.stops
+            if from_stop not in stops or to_stop not in stops:
+                return None
+            a, b = stops[from_stop], stops[to_stop]
+            lat = float(a['stop_lat']) + (float(b['stop_lat']) - float(a['stop_lat'])) * progress
+            lng = float(a['stop_lon']) + (float(b['stop_lon']) - float(a['stop_lon'])) * progress
+
+        return {
+            "trip_id": prediction["trip_id"],
+            "route_id": prediction["route_id"],
+            "shape_id": shape_id,
+            "lat": lat,
+            "lng": lng,
+            "from_stop": from_stop,
+            "to_stop": to_stop,
+            "progress": progress
+        }
+
+    def locate_feed(self, predictions, timestamp):
+        """
+        Interpolate every trip of a feed's predictions
+
+        Args:
+            predictions (dict): Feed predictions from PredictionService
+            timestamp (float): Unix time
+
+        Returns:
+            dict: Feed header, requested time and vehicle positions
+        """
+        vehicles = []
+        for prediction in predictions["trips"]:
+            position = self.locate(prediction, timestamp)
+            if position is not None:
+                vehicles.append(position)
+
+        return {
+            "header": predictions["header"],
+            "timestamp": timestamp,
+            "vehicles": vehicles
+        }
@@ -0,0 +1,189 @@
+import datetime
+import threading
+from zoneinfo import ZoneInfo
+
+
+class PredictionService:
+    """
+    Realtime arrival prediction engine
+
+    Joins realtime trip updates to static trip patterns and propagates the
+    latest observed delay to downstream stops the update does not cover.
+    """
+
+    def __init__(self, static_feed):
+        self.static = static_feed
+        self._lock = threading.Lock()
+        self._index = None
+
+    @staticmethod
+    def trip_key(trip_id):
+        """
+        Get the schedule-independent key of an NYCT trip_id
+
+        Static ids look like 'AFA24GEN-1038-Sunday-00_000600_1..S03R' and
+        realtime ids like '000600_1..S03R' or '000600_1..S'; both reduce to
+        (origin time, route, direction).
+
+        Args:
+            trip_id (str): Static or realtime trip ID
+
+        Returns:
+            tuple: (origin, route, direction) or None if not in NYCT format
+        """
+        parts = trip_id.rsplit('-', 1)[-1].split('_')
+        if len(parts) < 2:
+            return None
+
+        origin, pattern = parts[-2], parts[-1]
+        route, _, rest = pattern.partition('.')
+        direction = rest.lstrip('.')[:1]
+        if not origin.isdigit() or not route or not direction:
+            return None
+
+        return origin, route, direction
+
+    @property
+    def index(self):
+        """dict: Trip key -> list of static trip_ids sharing it"""
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    index = {}
+                    for trip_id in self.static.trips:
+                        key = self.trip_key(trip_id)
+                        if key is not None:
+                            index.setdefault(key, []).append(trip_id)
+                    self._index = index
+        return self._index
+
+    def match_trip(self, trip_id, service_date):
+        """
+        Find the static trip a realtime trip runs
+
+        Args:
+            trip_id (str): Realtime trip ID
+            service_date (datetime.date): Service date
+
+        Returns:
+            str: Static trip ID or None if no match
+        """
+        trips = self.static.trips
+        if trip_id in trips:
+            return trip_id
+
+        candidates = self.index.get(self.trip_key(trip_id) or ())
+        if not candidates:
+            return None
+
+        active = self.static.services_on(service_date)
+        pattern = trip_id.rsplit('_', 1)[-1]
+        matches = [c for c in candidates if trips[c]['service_id'] in active] or candidates
+
+        # Prefer the trip whose pattern (including shape suffix) matches exactly
+        for candidate in matches:
+            if candidate.endswith(pattern):
+                return candidate
+        return matches[0]
+
+    def service_date(self, trip, feed_time):
+        """
+        Get the service date of a realtime trip
+
+        Args:
+            trip (dict): Parsed trip descriptor
+            feed_time (int): Feed header timestamp
+
+        Returns:
+            datetime.date: Service date
+        """
+        if trip.get("start_date"):
+            return datetime.datetime.strptime(trip["start_date"], '%Y%m%d').date()
+        return datetime.datetime.fromtimestamp(feed_time, tz=ZoneInfo(self.static.agency_timezone)).date()
+
+    def predict_trip(self, update, feed_time):
+        """
+        Build the full ETA vector of a trip
+
+        Args:
+            update (dict): Parsed trip update
+            feed_time (int): Feed header timestamp
+
+        Returns:
+            dict: Trip prediction
+        """
+        trip = update["trip"]
+        service_date = self.service_date(trip, feed_time)
+        static_trip_id = self.match_trip(trip["trip_id"], service_date)
+
+        realtime = {}
+        for stop in update["stop_time_updates"]:
+            event = stop.get("arrival") or stop.get("departure") or {}
+            if event.get("time"):
+                realtime[stop["stop_id"]] = event["time"]
+
+        pattern = self.static.stop_times.for_trip(static_trip_id) if static_trip_id else []
+
+        stops = []
+        delay = None
+        if pattern:
+            day_start = self.static.service_day_start(service_date)
+            for sequence, stop_id, arrival, departure in pattern:
+                offset = arrival if arrival >= 0 else departure
+                scheduled = day_start + offset if offset >= 0 else None
+
+                if stop_id in realtime:
+                    eta = realtime[stop_id]
+                    if scheduled is not None:
+                        delay = eta - scheduled
+                    source = "realtime"
+                elif delay is not None and scheduled is not None:
+                    eta = scheduled + delay
+                    source = "propagated"
+                else:
+                    eta = None
+                    source = "passed"
+
+                stops.append({
+                    "stop_id": stop_id,
+                    "stop_sequence": sequence,
+                    "scheduled": scheduled,
+                    "eta": eta,
+                    "source": source
+                })
+        else:
+            # No static pattern: the realtime stops are all we know
+            stops = [
+                {"stop_id": stop_id, "stop_sequence": None, "scheduled": None, "eta": eta, "source": "realtime"}
+                for stop_id, eta in realtime.items()
+            ]
+
+        return {
+            "trip_id": trip["trip_id"],
+            "static_trip_id": static_trip_id,
+            "route_id": trip["route_id"],
+            "service_date": service_date.strftime('%Y%m%d'),
+            "delay": delay,
+            "stops": stops
+        }
+
+    def predict_feed(self, feed):
+        """
+        Build ETA vectors for every trip update in a parsed feed
+
+        Args:
+            feed (dict): Parsed GTFS-RT feed
+
+        Returns:
+            dict: Feed header and per-trip predictions
+        """
+        feed_time = feed["header"]["timestamp"]
+        trips = [
+            self.predict_trip(entity["trip_update"], feed_time)
+            for entity in feed["entities"] if "trip_update" in entity
+        ]
+
+        return {
+            "header": feed["header"],
+            "trips": trips
+        }
@@ -0,0 +1,689 @@
+import bisect
+import collections
+import ipaddress
+import itertools
+import queue
+import socket
+import threading
+import time
+import urllib.parse
+import requests
+from config import (
+    SUBSCRIPTION_MAX, SUBSCRIPTION_QUEUE_SIZE, SUBSCRIPTION_DISPATCH_WORKERS,
+    SUBSCRIPTION_WEBHOOK_TIMEOUT, SUBSCRIPTION_OUTBOX_SIZE, SUBSCRIPTION_POLL_INTERVAL,
+    SUBSCRIPTION_MAX_PER_CLIENT, SUBSCRIPTION_CREATE_LIMIT, SUBSCRIPTION_WEBHOOK_HOSTS,
+    FEED_CATEGORIES, ALERT_AGENCY_CATEGORIES
+)
+from utils.metrics import metrics
+
+notifications_total = metrics.counter(
+    'subscription_notifications_total', 'Subscription notifications by channel and result', ('channel', 'result'))
+match_duration = metrics.histogram(
+    'subscription_match_duration_seconds', 'Time to match one feed refresh against subscriptions', ('kind',))
+
+
+def webhook_error(url, allowed_hosts=SUBSCRIPTION_WEBHOOK_HOSTS):
+    """
+    Check that a webhook URL may be posted to
+
+    With an allowlist only its hosts are accepted; otherwise the host must
+    resolve exclusively to public addresses, so webhooks cannot reach
+    loopback, private networks or link-local metadata services.
+
+    Args:
+        url (str): Webhook URL
+        allowed_hosts (set): Allowed host names (empty: any public host)
+
+    Returns:
+        str: Why the URL is rejected, or None if it is acceptable
+    """
+    try:
+        parsed = urllib.parse.urlsplit(url)
+        port = parsed.port or (443 if parsed.scheme == 'https' else 80)
+    except ValueError:
+        return "malformed URL"
+    if parsed.scheme not in ('http', 'https') or not parsed.hostname:
+        return "expected an http(s) URL"
+    if parsed.username or parsed.password:
+        return "credentials are not allowed in the URL"
+
+    host = parsed.hostname.lower()
+    if allowed_hosts:
+        return None if host in allowed_hosts else f"host not allowed: {host}"
+
+    try:
+        addresses = {info[4][0] for info in socket.getaddrinfo(host, port, proto=socket.IPPROTO_TCP)}
+    except (socket.gaierror, UnicodeError):
+        return f"host does not resolve: {host}"
+    for address in addresses:
+        ip = ipaddress.ip_address(address.split('%')[0])
+        if not ip.is_global or ip.is_multicast:
+            return f"host resolves to a non-public address: {host}"
+    return None
+
+
+class ThresholdIndex:
+    """
+    Subscriptions of one route or stop sorted by delay threshold
+
+    A delay that rises from old to new crosses exactly the thresholds in
+    (old, new], found with two binary searches.
+    """
+
+    def __init__(self):
+        self.thresholds = []
+        self.ids = []
+
+    def add(self, threshold, subscription_id):
+        i = bisect.bisect_right(self.thresholds, threshold)
+        self.thresholds.insert(i, threshold)
+        self.ids.insert(i, subscription_id)
+
+    def remove(self, threshold, subscription_id):
+        i = bisect.bisect_left(self.thresholds, threshold)
+        while self.ids[i] != subscription_id:
+            i += 1
+        del self.thresholds[i]
+        del self.ids[i]
+
+    def crossed(self, old, new):
+        """
+        Get the subscriptions whose threshold a delay change crossed
+
+        Args:
+            old (int): Previous delay in seconds
+            new (int): Current delay in seconds
+
+        Returns:
+            list: Subscription IDs
+        """
+        if new <= old:
+            return []
+        return self.ids[bisect.bisect_right(self.thresholds, old):bisect.bisect_right(self.thresholds, new)]
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class NotificationDispatcher:
+    """
+    Delivers notifications from a bounded queue on background threads
+
+    Matching never waits on delivery: a notification and all of the
+    subscriptions it matched are queued as one batch, and once maxsize
+    deliveries are pending new ones are dropped and counted. Subscriptions
+    with a webhook get a JSON POST; the others collect notifications in a
+    bounded outbox that clients poll.
+    """
+
+    def __init__(self, maxsize=SUBSCRIPTION_QUEUE_SIZE, workers=SUBSCRIPTION_DISPATCH_WORKERS,
+                 timeout=SUBSCRIPTION_WEBHOOK_TIMEOUT, outbox_size=SUBSCRIPTION_OUTBOX_SIZE,
+                 allowed_hosts=SUBSCRIPTION_WEBHOOK_HOSTS):
+        self.queue = queue.Queue()  # (subscriptions, notification) batches
+        self.allowed_hosts = allowed_hosts
+        self.maxsize = maxsize
+        self.pending = 0  # Queued deliveries
+        self.workers = workers
+        self.timeout = timeout
+        self.outbox_size = outbox_size
+        self.outboxes = {}  # subscription ID -> deque of notifications
+        self._started = False
+        self._lock = threading.Lock()
+
+    def submit(self, subscriptions, notification):
+        """
+        Queue a notification for several subscriptions without blocking
+
+        Args:
+            subscriptions (list): Matched subscriptions
+            notification (dict): Notification payload, shared by every matched subscription
+
+        Returns:
+            int: Deliveries queued; the rest were dropped because the queue was full
+        """
+        if not subscriptions:
+            return 0
+        if not self._started:
+            self._start()
+
+        with self._lock:
+            accepted = subscriptions[:max(0, self.maxsize - self.pending)]
+            self.pending += len(accepted)
+        for subscription in subscriptions[len(accepted):]:
+            notifications_total.inc(self._channel(subscription), 'dropped')
+        if accepted:
+            self.queue.put((accepted, notification))
+        return len(accepted)
+
+    def _start(self):
+        with self._lock:
+            for i in range(0 if self._started else self.workers):
+                threading.Thread(target=self._run, name=f"notify-{i}", daemon=True).start()
+            self._started = True
+
+    @staticmethod
+    def _channel(subscription):
+        return 'webhook' if subscription.get("webhook_url") else 'poll'
+
+    def _run(self):
+        while True:
+            subscriptions, notification = self.queue.get()
+            for subscription in subscriptions:
+                try:
+                    self.deliver(subscription, notification)
+                finally:
+                    with self._lock:
+                        self.pending -= 1
+
+    def clear(self):
+        """Drop every queued delivery"""
+        with self._lock:
+            self.queue.queue.clear()
+            self.pending = 0
+
+    def deliver(self, subscription, notification):
+        """
+        Deliver one notification
+
+        Args:
+            subscription (dict): Subscription
+            notification (dict): Notification payload
+        """
+        channel = self._channel(subscription)
+        notification = dict(notification, subscription_id=subscription["id"])
+        if channel == 'webhook':
+            # Checked again on delivery: the host's DNS may have changed since it subscribed
+            if webhook_error(subscription["webhook_url"], self.allowed_hosts):
+                result = 'rejected'
+            else:
+                try:
+                    response = requests.post(subscription["webhook_url"], json=notification,
+                                             timeout=self.timeout, allow_redirects=False)
+                    result = 'delivered' if response.status_code < 400 else 'failed'
+                except requests.RequestException:
+                    result = 'failed'
+        else:
+            with self._lock:
+                outbox = self.outboxes.get(subscription["id"])
+                if outbox is None:
+                    outbox = self.outboxes[subscription["id"]] = collections.deque(maxlen=self.outbox_size)
+                outbox.append(notification)
+            result = 'delivered'
+        notifications_total.inc(channel, result)
+
+    def drain(self, subscription_id):
+        """
+        Take the pending notifications of a polled subscription
+
+        Args:
+            subscription_id (str): Subscription ID
+
+        Returns:
+            list: Notifications, oldest first
+        """
+        with self._lock:
+            outbox = self.outboxes.get(subscription_id)
+            if not outbox:
+                return []
+            notifications = list(outbox)
+            outbox.clear()
+            return notifications
+
+    def discard(self, subscription_id):
+        with self._lock:
+            self.outboxes.pop(subscription_id, None)
+
+
+class SubscriptionService:
+    """
+    Matches feed refreshes against route, stop and delay subscriptions
+
+    Subscriptions are indexed by feed category and route_id or stop_id (a
+    subscription with both is indexed by stop and checked against the
+    route), since LIRR and Metro-North reuse subway route and stop IDs; delay
+    subscriptions by threshold within each key. Each refresh is diffed
+    against the previous snapshot of the same feed, so only trips whose
+    delays changed and alerts that are new or edited are matched; the cost
+    of a refresh depends on what changed, not on the number of
+    subscriptions.
+    """
+
+    def __init__(self, station_of=None, dispatcher=None, max_subscriptions=SUBSCRIPTION_MAX,
+                 max_per_client=SUBSCRIPTION_MAX_PER_CLIENT, create_limit=SUBSCRIPTION_CREATE_LIMIT):
+        """
+        Args:
+            station_of (callable): Maps a feed category and platform stop_id to its
+                parent station, so subscriptions to a station match its platforms
+            dispatcher (NotificationDispatcher): Notification delivery
+            max_subscriptions (int): Subscription limit
+            max_per_client (int): Subscriptions one client may hold
+            create_limit (tuple): (subscriptions, seconds) one client may create per window
+        """
+        self.station_of = station_of or (lambda category, stop_id: None)
+        self.dispatcher = dispatcher or NotificationDispatcher()
+        self.max_subscriptions = max_subscriptions
+        self.max_per_client = max_per_client
+        self.create_limit = create_limit
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._subscriptions = {}
+        self._owners = {}  # subscription ID -> client
+        self._held = collections.Counter()  # client -> subscriptions held
+        self._created = {}  # client -> deque of recent creation times
+        self._alert_routes = collections.defaultdict(set)
+        self._alert_stops = collections.defaultdict(set)
+        self._delay_routes = collections.defaultdict(ThresholdIndex)
+        self._delay_stops = collections.defaultdict(ThresholdIndex)
+        self._trips = {}  # feed key -> {trip_id: (signature, route_id, {stop_id: delay}, {stop_id: first prediction})}
+        self._alerts = {}  # feed key -> {alert entity ID: signature}
+
+    def subscribe(self, route_id=None, stop_id=None, min_delay=None, alerts=True, webhook_url=None, client=None,
+                  category='subway'):
+        """
+        Add a subscription
+
+        Args:
+            route_id (str): Route to watch
+            stop_id (str): Station or platform to watch
+            min_delay (int): Notify when a trip's delay rises to at least this many seconds (> 0)
+            alerts (bool): Notify about new or changed service alerts
+            webhook_url (str): POST notifications here instead of keeping them for polling
+            client (str): Client address for the per-client limits (None for trusted internal callers)
+            category (str): Feed category the route and stop belong to (subway, lirr or mnr)
+
+        Returns:
+            dict: The subscription, or error
+        """
+        if category not in FEED_CATEGORIES:
+            return {"error": f"Invalid feed category: {category}"}
+        if not route_id and not stop_id:
+            return {"error": "A subscription needs a route_id or a stop_id"}
+        if min_delay is None and not alerts:
+            return {"error": "A subscription needs min_delay or alerts"}
+        if min_delay is not None and (isinstance(min_delay, bool) or not isinstance(min_delay, int) or min_delay <= 0):
+            return {"error": f"Invalid min_delay: {min_delay} (expected a positive number of seconds)"}
+        if webhook_url is not None:
+            if not isinstance(webhook_url, str):
+                return {"error": "Invalid webhook_url"}
+            reason = webhook_error(webhook_url, self.dispatcher.allowed_hosts)
+            if reason:
+                return {"error": f"Invalid webhook_url: {reason}"}
+
+        with self._lock:
+            if len(self._subscriptions) >= self.max_subscriptions:
+                return {"error": "Subscription limit reached"}
+            error = self._admit(client) if client is not None else None
+            if error:
+                return error
+
+            subscription = {
+                "id": str(next(self._ids)),
+                "category": category,
+                "route_id": route_id,
+                "stop_id": stop_id,
+                "min_delay": min_delay,
+                "alerts": bool(alerts),
+                "webhook_url": webhook_url,
+                "created": int(time.time())
+            }
+            self._subscriptions[subscription["id"]] = subscription
+            if client is not None:
+                self._owners[subscription["id"]] = client
+                self._held[client] += 1
+            self._index(subscription, add=True)
+
+        return subscription
+
+    def _admit(self, client):
+        """
+        Apply the per-client limits to a new subscription (lock held)
+
+        Args:
+            client (str): Client address
+
+        Returns:
+            dict: Error, or None if the client may subscribe
+        """
+        if self._held[client] >= self.max_per_client:
+            return {"error": f"At most {self.max_per_client} subscriptions per client"}
+
+        limit, window = self.create_limit
+        now = time.monotonic()
+        if len(self._created) > 4096:
+            # Forget clients that have not subscribed within the window
+            for other in [c for c, times in self._created.items() if times[-1] <= now - window]:
+                del self._created[other]
+        created = self._created.setdefault(client, collections.deque())
+        while created and created[0] <= now - window:
+            created.popleft()
+        if len(created) >= limit:
+            return {"error": f"At most {limit} subscriptions per {window} seconds"}
+        created.append(now)
+        return None
+
+    def unsubscribe(self, subscription_id):
+        """
+        Remove a subscription
+
+        Args:
+            subscription_id (str): Subscription ID
+
+        Returns:
+            bool: Whether it existed
+        """
+        with self._lock:
+            subscription = self._subscriptions.pop(subscription_id, None)
+            if subscription is None:
+                return False
+            client = self._owners.pop(subscription_id, None)
+            if client is not None:
+                self._held[client] -= 1
+                if not self._held[client]:
+                    del self._held[client]
+            self._index(subscription, add=False)
+        self.dispatcher.discard(subscription_id)
+        return True
+
+    def _index(self, subscription, add):
+        subscription_id = subscription["id"]
+        if subscription["stop_id"]:
+            alert_index, delay_index = self._alert_stops, self._delay_stops
+            key = (subscription["category"], subscription["stop_id"])
+        else:
+            alert_index, delay_index = self._alert_routes, self._delay_routes
+            key = (subscription["category"], subscription["route_id"])
+
+        if subscription["alerts"]:
+            if add:
+                alert_index[key].add(subscription_id)
+            else:
+                alert_index[key].discard(subscription_id)
+                if not alert_index[key]:
+                    del alert_index[key]
+
+        if subscription["min_delay"] is not None:
+            if add:
+                delay_index[key].add(subscription["min_delay"], subscription_id)
+            else:
+                delay_index[key].remove(subscription["min_delay"], subscription_id)
+                if not delay_index[key]:
+                    del delay_index[key]
+
+    def wants_trips(self):
+        """Whether any subscription watches delays"""
+        return bool(self._delay_routes or self._delay_stops)
+
+    def wants_alerts(self):
+        """Whether any subscription watches service alerts"""
+        return bool(self._alert_routes or self._alert_stops)
+
+    def get(self, subscription_id):
+        """
+        Get a subscription
+
+        Args:
+            subscription_id (str): Subscription ID
+
+        Returns:
+            dict: Subscription, or None
+        """
+        return self._subscriptions.get(subscription_id)
+
+    def notifications(self, subscription_id):
+        """
+        Take the pending notifications of a subscription without a webhook
+
+        Args:
+            subscription_id (str): Subscription ID
+
+        Returns:
+            list: Notifications, or None for unknown subscriptions
+        """
+        if subscription_id not in self._subscriptions:
+            return None
+        return self.dispatcher.drain(subscription_id)
+
+    def _notify(self, subscription_ids, notification, route_ids=None):
+        """
+        Queue a notification for matched subscriptions
+
+        Args:
+            subscription_ids (iterable): Matched subscription IDs
+            notification (dict): Payload; the subscription ID is added on delivery
+            route_ids (set): (category, route_id) of the event, checked for stop subscriptions that also name a route
+
+        Returns:
+            int: Notifications queued
+        """
+        subscriptions = []
+        for subscription_id in subscription_ids:
+            subscription = self._subscriptions.get(subscription_id)
+            if subscription is None:
+                continue
+            if subscription["stop_id"] and subscription["route_id"] and route_ids is not None \
+                    and (subscription["category"], subscription["route_id"]) not in route_ids:
+                continue
+            subscriptions.append(subscription)
+        return self.dispatcher.submit(subscriptions, notification)
+
+    def _stop_keys(self, category, stop_id):
+        station = self.station_of(category, stop_id)
+        if station and station != stop_id:
+            return (category, stop_id), (category, station)
+        return ((category, stop_id),)
+
+    def process_trips(self, feed_key, result):
+        """
+        Match the trip updates of a refreshed feed against delay subscriptions
+
+        A trip's delay at a stop is the reported delay, or else how far its
+        predicted arrival has slipped since the trip was first seen (MTA
+        subway feeds carry predicted times only). Subscriptions are notified
+        when a delay rises past their threshold, once per crossing.
+
+        Args:
+            feed_key (str): Feed key (e.g. 'subway_ace')
+            result (dict): Parsed GTFS-RT feed
+
+        Returns:
+            int: Notifications queued
+        """
+        if not isinstance(result, dict) or "entities" not in result:
+            return 0
+
+        start = time.perf_counter()
+        category = feed_key.split('_', 1)[0]
+        timestamp = result["header"]["timestamp"]
+        previous = self._trips.get(feed_key, {})
+        current = {}
+        queued = 0
+
+        for entity in result["entities"]:
+            update = entity.get("trip_update")
+            if not update:
+                continue
+
+            trip_id = update["trip"]["trip_id"]
+            route_id = update["trip"].get("route_id")
+            old = previous.get(trip_id)
+            stops = update["stop_time_updates"]
+            signature = tuple(
+                (stop["stop_id"], (stop.get("arrival") or stop.get("departure") or {}).get("time")) for stop in stops
+            )
+            if old is not None and old[0] == signature:
+                current[trip_id] = old
+                continue
+
+            old_delays, baselines = (old[2], dict(old[3])) if old is not None else ({}, {})
+            delays = {}
+            for stop in stops:
+                event = stop.get("arrival") or stop.get("departure") or {}
+                predicted = event.get("time")
+                if event.get("delay") is not None:
+                    delays[stop["stop_id"]] = event["delay"]
+                elif predicted:
+                    delays[stop["stop_id"]] = predicted - baselines.setdefault(stop["stop_id"], predicted)
+            current[trip_id] = (signature, route_id, delays, baselines)
+
+            if not delays:
+                continue
+
+            notification = {
+                "type": "delay", "feed": feed_key, "category": category, "route_id": route_id, "trip_id": trip_id,
+                "timestamp": timestamp
+            }
+
+            # Stop subscriptions: per stop, for thresholds crossed since the last snapshot
+            for stop_id, delay in delays.items():
+                old_delay = old_delays.get(stop_id, -1)
+                for key in self._stop_keys(category, stop_id):
+                    index = self._delay_stops.get(key)
+                    if index is not None:
+                        queued += self._notify(index.crossed(old_delay, delay),
+                                               dict(notification, stop_id=stop_id, delay=delay), {(category, route_id)})
+
+            # Route subscriptions: once per trip, on its largest delay
+            index = self._delay_routes.get((category, route_id))
+            if index is not None:
+                delay = max(delays.values())
+                old_delay = max(old_delays.values()) if old_delays else -1
+                queued += self._notify(index.crossed(old_delay, delay), dict(notification, delay=delay))
+
+        self._trips[feed_key] = current
+        match_duration.observe(time.perf_counter() - start, 'trips')
+        return queued
+
+    def process_alerts(self, feed_key, result):
+        """
+        Match new or changed service alerts against alert subscriptions
+
+        An informed entity belongs to the category of its agency_id, or else
+        to that of a single-agency alert feed; entities of other agencies
+        (e.g. buses) match no subscription.
+
+        Args:
+            feed_key (str): Feed key (e.g. 'alert_subway_alerts')
+            result (dict): Parsed GTFS-RT feed
+
+        Returns:
+            int: Notifications queued
+        """
+        if not isinstance(result, dict) or "entities" not in result:
+            return 0
+
+        start = time.perf_counter()
+        feed_category = feed_key[len('alert_'):].split('_', 1)[0]
+        previous = self._alerts.get(feed_key, {})
+        current = {}
+        queued = 0
+
+        for entity in result["entities"]:
+            alert = entity.get("alert")
+            if not alert:
+                continue
+
+            informed = alert.get("informed_entity", [])
+            signature = (
+                alert.get("header_text"), alert.get("description_text"), alert.get("effect"),
+                tuple((item.get("agency_id"), item.get("route_id"), item.get("stop_id")) for item in informed)
+            )
+            current[entity["id"]] = signature
+            if previous.get(entity["id"]) == signature:
+                continue
+
+            route_keys = set()
+            matched = set()
+            stop_matches = set()
+            for item in informed:
+                category = ALERT_AGENCY_CATEGORIES.get(item["agency_id"]) if item.get("agency_id") else feed_category
+                if category not in FEED_CATEGORIES:
+                    continue
+                if item.get("route_id"):
+                    route_keys.add((category, item["route_id"]))
+                    matched |= self._alert_routes.get((category, item["route_id"]), set())
+                if item.get("stop_id"):
+                    for key in self._stop_keys(category, item["stop_id"]):
+                        stop_matches |= self._alert_stops.get(key, set())
+
+            notification = {
+                "type": "alert",
+                "feed": feed_key,
+                "alert_id": entity["id"],
+                "route_ids": sorted({item["route_id"] for item in informed if item.get("route_id")}),
+                "header_text": alert.get("header_text"),
+                "description_text": alert.get("description_text"),
+                "timestamp": result["header"]["timestamp"]
+            }
+            queued += self._notify(matched, notification)
+            queued += self._notify(stop_matches - matched, notification, route_keys or None)
+
+        self._alerts[feed_key] = current
+        match_duration.observe(time.perf_counter() - start, 'alerts')
+        return queued
+
+    def get_stats(self):
+        """
+        Get subscription and dispatch statistics
+
+        Returns:
+            dict: Subscription counts, index sizes and queue depth
+        """
+        with self._lock:
+            subscriptions = list(self._subscriptions.values())
+        return {
+            "subscriptions": len(subscriptions),
+            "delay_subscriptions": sum(1 for s in subscriptions if s["min_delay"] is not None),
+            "alert_subscriptions": sum(1 for s in subscriptions if s["alerts"]),
+            "webhooks": sum(1 for s in subscriptions if s["webhook_url"]),
+            "indexed_routes": len(set(self._alert_routes) | set(self._delay_routes)),
+            "indexed_stops": len(set(self._alert_stops) | set(self._delay_stops)),
+            "tracked_trips": sum(len(trips) for trips in self._trips.values()),
+            "queue_depth": self.dispatcher.pending,
+            "queue_capacity": self.dispatcher.maxsize
+        }
+
+
+class FeedPoller:
+    """
+    Refreshes the feeds that subscriptions depend on in the background
+
+    Matching runs whenever a feed is refreshed. Without a poller that only
+    happens while some client requests the feed, so subscribers would miss
+    changes nobody else looked at. The refresh functions read through the
+    cache, so a feed is fetched only once its cache window has expired.
+    """
+
+    def __init__(self, service, refresh_trips, refresh_alerts, interval=SUBSCRIPTION_POLL_INTERVAL):
+        """
+        Args:
+            service (SubscriptionService): Subscriptions deciding which feeds are polled
+            refresh_trips (callable): Refreshes every trip update feed
+            refresh_alerts (callable): Refreshes the service alert feed
+            interval (float): Seconds between polls (0 disables the poller)
+        """
+        self.service = service
+        self.refresh_trips = refresh_trips
+        self.refresh_alerts = refresh_alerts
+        self.interval = interval
+        self._thread = None
+
+    def start(self):
+        """Start polling on a daemon thread"""
+        if self.interval > 0 and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='subscription-poller', daemon=True)
+            self._thread.start()
+
+    def poll(self):
+        """Refresh the feeds current subscriptions need"""
+        if self.service.wants_trips():
+            self.refresh_trips()
+        if self.service.wants_alerts():
+            self.refresh_alerts()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"Subscription feed poll failed: {str(e)}")
@@ -0,0 +1,301 @@
+import math
+import os
+import tempfile
+import threading
+from shapely import STRtree, clip_by_rect
+from shapely.geometry import LineString, box
+from config import TILE_EXTENT, TILE_BUFFER, TILE_STATION_MIN_ZOOM, TILE_CACHE_DIR, TILE_NYC_BOUNDS, TILE_BOUNDS
+from utils.admission import admission
+from utils.cache import cache
+from utils.mvt import GEOM_POINT, GEOM_LINESTRING, encode_layer, encode_tile
+
+EARTH_RADIUS = 6378137.0
+WORLD_SIZE = 2 * math.pi * EARTH_RADIUS
+ORIGIN_SHIFT = math.pi * EARTH_RADIUS
+
+# Served for every tile outside an agency's extent, which is most of the world
+EMPTY_TILE = encode_tile([])
+
+
+def to_mercator(lon, lat):
+    """
+    Project WGS84 coordinates to Web Mercator meters
+
+    Args:
+        lon (float): Longitude
+        lat (float): Latitude
+
+    Returns:
+        tuple: (x, y) in meters
+    """
+    x = math.radians(lon) * EARTH_RADIUS
+    y = math.log(math.tan(math.pi / 4 + math.radians(lat) / 2)) * EARTH_RADIUS
+    return x, y
+
+
+def tile_bounds(z, x, y):
+    """
+    Get the Web Mercator bounds of a tile
+
+    Args:
+        z (int): Zoom
+        x (int): Tile column
+        y (int): Tile row (XYZ scheme, origin top-left)
+
+    Returns:
+        tuple: (minx, miny, maxx, maxy) in meters
+    """
+    size = WORLD_SIZE / (1 << z)
+    minx = x * size - ORIGIN_SHIFT
+    maxy = ORIGIN_SHIFT - y * size
+    return minx, maxy - size, minx + size, maxy
+
+
+def lonlat_to_tile(lon, lat, z):
+    """
+    Get the tile containing a coordinate
+
+    Args:
+        lon (float): Longitude
+        lat (float): Latitude
+        z (int): Zoom
+
+    Returns:
+        tuple: (x, y) tile indexes
+    """
+    mx, my = to_mercator(lon, lat)
+    size = WORLD_SIZE / (1 << z)
+    return int((mx + ORIGIN_SHIFT) // size), int((ORIGIN_SHIFT - my) // size)
+
+
+class TileService:
+    """
+    Mapbox Vector Tile generator for stations and route shapes
+
+    Geometry is projected once, simplified once per zoom, and each tile is
+    clipped from an STRtree query. Encoded tiles are cached in memory and,
+    if TILE_CACHE_DIR is set, on disk under the static feed's version, so a
+    new feed never serves tiles of the old one. Tiles outside the agency's
+    extent are the shared empty tile and are not stored.
+    """
+
+    def __init__(self, static_feed, agency='subway'):
+        self.static = static_feed
+        self.agency = agency
+        self.bounds = TILE_BOUNDS.get(agency, TILE_NYC_BOUNDS)
+        self.version = static_feed.version
+        min_x, min_y = to_mercator(self.bounds[0], self.bounds[1])
+        max_x, max_y = to_mercator(self.bounds[2], self.bounds[3])
+        self._extent = (min_x, min_y, max_x, max_y)
+        self._lock = threading.Lock()
+        self._prepared = None
+        self._zoom_lines = {}  # zoom -> (STRtree, simplified geometries)
+
+    def _prepare(self):
+        """
+        Project stations and shapes to Web Mercator
+
+        Returns:
+            dict: Station points and route lines with their properties
+        """
+        if self._prepared is None:
+            with self._lock:
+                if self._prepared is None:
+                    routes = self.static.routes
+
+                    shape_routes = {}
+                    for trip in self.static.trips.values():
+                        if trip.get('shape_id'):
+                            shape_routes.setdefault(trip['shape_id'], trip['route_id'])
+
+                    lines, line_properties = [], []
+                    for shape_id, points in self.static.shapes.items():
+                        if len(points) < 2:
+                            continue
+                        route_id = shape_routes.get(shape_id, '')
+                        route = routes.get(route_id, {})
+                        lines.append(LineString([to_mercator(lon, lat) for lat, lon in points]))
+                        line_properties.append({
+                            "shape_id": shape_id,
+                            "route_id": route_id,
+                            "color": f"#{route['route_color']}" if route.get('route_color') else None
+                        })
+
+                    stations, station_properties = [], []
+                    for stop_id, stop in self.static.stops.items():
+                        # Parent stations only; platforms share their coordinates
+                        if stop.get('location_type') == '1' or (not stop.get('parent_station') and not stop.get('location_type')):
+                            stations.append(to_mercator(float(stop['stop_lon']), float(stop['stop_lat'])))
+                            station_properties.append({"id": stop_id, "name": stop['stop_name']})
+
+                    self._prepared = {
+                        "lines": lines,
+                        "line_properties": line_properties,
+                        "stations": stations,
+                        "station_properties": station_properties
+                    }
+
+        return self._prepared
+
+    def _lines_for_zoom(self, z):
+        """
+        Get route lines simplified for a zoom level
+
+        Args:
+            z (int): Zoom
+
+        Returns:
+            tuple: (STRtree, list of simplified lines)
+        """
+        entry = self._zoom_lines.get(z)
+        if entry is None:
+            prepared = self._prepare()
+
+            # Half a tile-pixel of tolerance keeps simplification invisible
+            tolerance = WORLD_SIZE / (1 << z) / TILE_EXTENT / 2
+            lines = [line.simplify(tolerance, preserve_topology=False) for line in prepared["lines"]]
+            entry = (STRtree(lines), lines)
+            with self._lock:
+                self._zoom_lines[z] = entry
+
+        return entry
+
+    def render(self, z, x, y):
+        """
+        Encode a tile
+
+        Args:
+            z (int): Zoom
+            x (int): Tile column
+            y (int): Tile row
+
+        Returns:
+            bytes: Encoded tile
+        """
+        prepared = self._prepare()
+        minx, miny, maxx, maxy = tile_bounds(z, x, y)
+        size = maxx - minx
+        scale = TILE_EXTENT / size
+        pad = size * TILE_BUFFER / TILE_EXTENT
+
+        def to_tile(px, py):
+            return round((px - minx) * scale), round((maxy - py) * scale)
+
+        # Route lines, clipped to the buffered tile
+        tree, lines = self._lines_for_zoom(z)
+        line_features = []
+        for i in tree.query(box(minx - pad, miny - pad, maxx + pad, maxy + pad)):
+            clipped = clip_by_rect(lines[i], minx - pad, miny - pad, maxx + pad, maxy + pad)
+            if clipped.is_empty:
+                continue
+
+            parts = []
+            for part in getattr(clipped, 'geoms', [clipped]):
+                coords = []
+                for px, py in part.coords:
+                    point = to_tile(px, py)
+                    if not coords or coords[-1] != point:
+                        coords.append(point)
+                if len(coords) >= 2:
+                    parts.append(coords)
+
+            if parts:
+                line_features.append((GEOM_LINESTRING, parts, prepared["line_properties"][i]))
+
+        # Stations, once zoomed in far enough to be legible
+        station_features = []
+        if z >= TILE_STATION_MIN_ZOOM:
+            for (px, py), properties in zip(prepared["stations"], prepared["station_properties"]):
+                if minx <= px < maxx and miny < py <= maxy:
+                    station_features.append((GEOM_POINT, [[to_tile(px, py)]], properties))
+
+        layers = []
+        if line_features:
+            layers.append(encode_layer('routes', line_features, TILE_EXTENT))
+        if station_features:
+            layers.append(encode_layer('stations', station_features, TILE_EXTENT))
+
+        return encode_tile(layers)
+
+    def _disk_path(self, z, x, y):
+        if not TILE_CACHE_DIR:
+            return None
+        return os.path.join(TILE_CACHE_DIR, self.agency, self.version, str(z), str(x), f"{y}.mvt")
+
+    def _in_extent(self, z, x, y):
+        minx, miny, maxx, maxy = tile_bounds(z, x, y)
+        ext_minx, ext_miny, ext_maxx, ext_maxy = self._extent
+        return minx <= ext_maxx and maxx >= ext_minx and miny <= ext_maxy and maxy >= ext_miny
+
+    @staticmethod
+    def _write(path, data):
+        # Write to a temporary file and rename it, so concurrent readers never see a partial tile
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def get_tile(self, z, x, y, timeout):
+        """
+        Get a tile from the memory cache, the disk cache, or by rendering it
+
+        Args:
+            z (int): Zoom
+            x (int): Tile column
+            y (int): Tile row
+            timeout (int): Memory cache timeout
+
+        Returns:
+            bytes: Encoded tile
+
+        Raises:
+            Overloaded: No rendering slot could be had in time
+        """
+        if not self._in_extent(z, x, y):
+            return EMPTY_TILE
+
+        cache_key = f"tile_{self.agency}_{self.version}_{z}_{x}_{y}"
+        cached_data = cache.get(cache_key, timeout)
+        if cached_data is not None:
+            return cached_data
+
+        path = self._disk_path(z, x, y)
+        if path and os.path.exists(path):
+            with open(path, 'rb') as f:
+                data = f.read()
+        else:
+            with admission.slot('static'):
+                data = self.render(z, x, y)
+            if path:
+                self._write(path, data)
+
+        cache.set(cache_key, data)
+        return data
+
+    def pregenerate(self, zooms, timeout, bounds=None):
+        """
+        Render every tile covering an extent ahead of time
+
+        Args:
+            zooms (iterable): Zoom levels
+            timeout (int): Memory cache timeout
+            bounds (tuple): (min lon, min lat, max lon, max lat); defaults to the agency's extent
+
+        Returns:
+            int: Number of tiles generated
+        """
+        bounds = bounds or self.bounds
+        count = 0
+        for z in zooms:
+            min_x, min_y = lonlat_to_tile(bounds[0], bounds[3], z)
+            max_x, max_y = lonlat_to_tile(bounds[2], bounds[1], z)
+            for x in range(min_x, max_x + 1):
+                for y in range(min_y, max_y + 1):
+                    self.get_tile(z, x, y, timeout)
+                    count += 1
+        return count
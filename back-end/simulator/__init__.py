@@ -0,0 +1 @@
+"""Local stand-in for the MTA realtime feed API"""
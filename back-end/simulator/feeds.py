@@ -0,0 +1,132 @@
+import json
+import random
+import time
+from google.transit import gtfs_realtime_pb2
+from config import SUBWAY_FEEDS, LIRR_FEEDS, MNR_FEEDS, SERVICE_ALERT_FEEDS, ELEVATOR_ESCALATOR_FEEDS
+
+# Feed groups by category; the category decides the synthetic payload shape
+FEED_GROUPS = {
+    'subway': SUBWAY_FEEDS,
+    'lirr': LIRR_FEEDS,
+    'mnr': MNR_FEEDS,
+    'alerts': SERVICE_ALERT_FEEDS,
+    'accessibility': ELEVATOR_ESCALATOR_FEEDS,
+}
+
+# Approximate number of trips in each upstream feed
+TRIP_COUNTS = {'ace': 250, 'bdfm': 220, 'g': 40, 'jz': 60, 'nqrw': 220, 'l': 40, 'num_s': 320, 'sir': 20,
+               'lirr': 120, 'mnr': 120}
+
+STOP_SPACING = 90  # Seconds between consecutive stops
+LAYOVER = 600  # Seconds a trip is in the feed before its first departure
+
+
+def synthetic_feed(category, feed_id, timestamp=None, scale=1.0):
+    """
+    Build a GTFS-RT payload shaped like an upstream feed
+
+    Each trip slot runs a trip through its stops and is then replaced by
+    the next one, so consecutive snapshots evolve like the real feed:
+    passed stops drop off, trips finish and new trips appear. The payload
+    is a pure function of its arguments.
+
+    Args:
+        category (str): 'subway', 'lirr', 'mnr' or 'alerts'
+        feed_id (str): Feed ID
+        timestamp (int): Feed header time (default: now)
+        scale (float): Multiplier on the number of trips or alerts
+
+    Returns:
+        bytes: Serialized FeedMessage
+    """
+    timestamp = int(timestamp or time.time())
+
+    feed = gtfs_realtime_pb2.FeedMessage()
+    feed.header.gtfs_realtime_version = '1.0'
+    feed.header.timestamp = timestamp
+
+    if category == 'alerts':
+        # Alerts change every hour
+        rng = random.Random(f"{feed_id}-{timestamp // 3600}")
+        for i in range(int(80 * scale)):
+            entity = feed.entity.add()
+            entity.id = f"alert:{i}"
+            alert = entity.alert
+            period = alert.active_period.add()
+            period.start = timestamp - rng.randint(0, 86400)
+            period.end = timestamp + rng.randint(3600, 86400)
+            alert.informed_entity.add(route_id=rng.choice('1234567ACEBDFMGJZNQRWL'), agency_id='MTASBWY')
+            alert.header_text.translation.add(text=f"Delays on route {i % 20}", language='en')
+            alert.description_text.translation.add(text='Trains are running with delays. ' * 4, language='en')
+        return feed.SerializeToString()
+
+    routes = [feed_id.upper()[0]] if category == 'subway' else [feed_id.upper()]
+    for i in range(int(TRIP_COUNTS.get(feed_id, 100) * scale)):
+        slot = random.Random(f"{feed_id}-{i}")
+        stops = slot.randint(5, 35)
+        lifetime = LAYOVER + stops * STOP_SPACING
+        generation, age = divmod(timestamp + slot.randint(0, lifetime), lifetime)
+
+        rng = random.Random(f"{feed_id}-{i}-{generation}")
+        route = rng.choice(routes)
+        direction = rng.choice('NS')
+        trip_id = f"{rng.randint(0, 144000):06d}_{route}..{direction}"
+        first = timestamp - age + LAYOVER + rng.randint(-60, 60)
+        # Some trips fall behind as they run; predictions slip without a delay field, as upstream
+        slip = rng.choice((0, 0, 0, 60, 180, 420)) * age // lifetime
+
+        remaining = [j for j in range(stops) if first + j * STOP_SPACING + 30 >= timestamp]
+        if not remaining:
+            continue
+
+        entity = feed.entity.add()
+        entity.id = f"{i:06d}"
+        update = entity.trip_update
+        update.trip.trip_id = trip_id
+        update.trip.route_id = route
+        update.trip.start_date = time.strftime('%Y%m%d', time.localtime(first))
+        for j in remaining:
+            stop = update.stop_time_update.add()
+            stop.stop_id = f"{100 + (i + j) % 400}{direction}"
+            stop.arrival.time = first + j * STOP_SPACING + slip
+            stop.departure.time = first + j * STOP_SPACING + slip + 30
+
+        entity = feed.entity.add()
+        entity.id = f"{i:06d}v"
+        vehicle = entity.vehicle
+        vehicle.trip.trip_id = trip_id
+        vehicle.trip.route_id = route
+        vehicle.timestamp = timestamp
+        vehicle.current_status = 1 if first + remaining[0] * STOP_SPACING <= timestamp else 2
+        vehicle.stop_id = f"{100 + (i + remaining[0]) % 400}{direction}"
+
+    return feed.SerializeToString()
+
+
+def synthetic_accessibility(data_type, timestamp=None, scale=1.0):
+    """
+    Build an elevator/escalator JSON payload
+
+    Args:
+        data_type (str): 'current', 'upcoming' or 'equipment'
+        timestamp (int): Snapshot time (default: now); outages change every 10 minutes
+        scale (float): Multiplier on the number of entries
+
+    Returns:
+        bytes: JSON payload
+    """
+    timestamp = int(timestamp or time.time())
+    rng = random.Random(f"{data_type}-{timestamp // 600}")
+    items = [
+        {
+            "station": f"Station {i}",
+            "station_id": str(100 + i % 400),
+            "equipment": f"EL{i:03d}",
+            "equipmenttype": rng.choice(['EL', 'ES']),
+            "serving": "Street to mezzanine",
+            "reason": "Repair",
+            "outagedate": "01/01/2025 08:00:00 AM"
+        }
+        for i in range(int((300 if data_type == 'equipment' else 60) * scale))
+    ]
+    return json.dumps(items).encode('utf-8')
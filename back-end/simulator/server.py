@@ -0,0 +1,116 @@
+"""
+MTA feed simulator
+
+Serves synthetic, evolving GTFS-RT and accessibility feeds at the same
+paths as api-endpoint.mta.info. Start it and point the back-end at it:
+
+    python -m simulator --port 8001 --latency 80 --error-rate 0.02
+    MTA_FEED_BASE_URL=http://localhost:8001 python app.py
+"""
+import argparse
+import random
+import threading
+import time
+from urllib.parse import unquote, urlsplit
+from flask import Flask, Response, abort, jsonify, request
+from simulator.feeds import FEED_GROUPS, synthetic_feed, synthetic_accessibility
+
+
+def feed_paths():
+    """
+    Map upstream URL paths to feeds
+
+    Returns:
+        dict: Decoded URL path -> (category, feed_id)
+    """
+    return {
+        unquote(urlsplit(url.strip()).path): (category, feed_id)
+        for category, feeds in FEED_GROUPS.items()
+        for feed_id, url in feeds.items()
+    }
+
+
+def create_app(latency=0, jitter=0, error_rate=0.0, scale=1.0, refresh=15):
+    """
+    Create the simulator application
+
+    Args:
+        latency (float): Mean response delay in milliseconds
+        jitter (float): Standard deviation of the delay in milliseconds
+        error_rate (float): Fraction of requests answered with HTTP 503
+        scale (float): Multiplier on feed size
+        refresh (int): Seconds between feed updates
+
+    Returns:
+        Flask: Application
+    """
+    app = Flask(__name__)
+    paths = feed_paths()
+    snapshots = {}  # path -> (refresh bucket, payload)
+    lock = threading.Lock()
+    stats = {"requests": 0, "errors": 0, "bytes": 0}
+
+    def payload(path):
+        category, feed_id = paths[path]
+        bucket = int(time.time()) // refresh
+        with lock:
+            snapshot = snapshots.get(path)
+        if snapshot and snapshot[0] == bucket:
+            return snapshot[1]
+
+        timestamp = bucket * refresh
+        if category == 'accessibility':
+            data = synthetic_accessibility(feed_id, timestamp, scale)
+        else:
+            data = synthetic_feed(category, feed_id, timestamp, scale)
+        with lock:
+            snapshots[path] = (bucket, data)
+        return data
+
+    @app.route('/stats')
+    def get_stats():
+        return jsonify(stats)
+
+    @app.route('/<path:path>')
+    def get_feed(path):
+        path = unquote(request.path)
+        if path not in paths:
+            abort(404)
+
+        delay = random.gauss(latency, jitter) if jitter else latency
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+        with lock:
+            stats["requests"] += 1
+            if random.random() < error_rate:
+                stats["errors"] += 1
+                return Response('Service Unavailable', status=503)
+
+        data = payload(path)
+        with lock:
+            stats["bytes"] += len(data)
+
+        mimetype = 'application/json' if path.endswith('.json') else 'application/x-protobuf'
+        return Response(data, mimetype=mimetype)
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve synthetic MTA realtime feeds')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--latency', type=float, default=0, help='Mean response delay (ms)')
+    parser.add_argument('--jitter', type=float, default=0, help='Standard deviation of the delay (ms)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests that fail with 503')
+    parser.add_argument('--scale', type=float, default=1.0, help='Multiplier on trips, alerts and outages per feed')
+    parser.add_argument('--refresh', type=int, default=15, help='Seconds between feed updates')
+    args = parser.parse_args()
+
+    app = create_app(args.latency, args.jitter, args.error_rate, args.scale, args.refresh)
+    app.run(host=args.host, port=args.port, threaded=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+import datetime
+from zoneinfo import ZoneInfo
+import numpy as np
+from utils.gtfs_static import StopTimes
+from utils.station_complexes import StationComplexes
+
+
+def hms(value):
+    """Seconds of a GTFS 'HH:MM' or 'HH:MM:SS' time (hours may run past 24)"""
+    hours, minutes, seconds = (value.split(':') + ['0'])[:3]
+    return int(hours) * 3600 + int(minutes) * 60 + int(seconds)
+
+
+def weekday_services(date):
+    """'Weekday' on weekdays, 'Sunday' on Sundays, nothing on Saturdays"""
+    return {'Weekday'} if date.weekday() < 5 else {'Sunday'} if date.weekday() == 6 else set()
+
+
+class FakeFeed:
+    """
+    Just enough of StaticFeed for the timetable, frequency and prediction tests
+
+    The stop_times table is the real columnar StopTimes, built from short
+    per-trip lists.
+    """
+
+    agency_timezone = 'America/New_York'
+
+    def __init__(self, trips, stop_times, stops=None, transfers=(), services_on=weekday_services):
+        """
+        Args:
+            trips (dict): trip_id -> trips.txt row (service_id, and route_id/direction_id where needed)
+            stop_times (dict): trip_id -> [(stop_id, time)] in stop order; times are 'HH:MM' strings or seconds
+            stops (dict): stop_id -> stops.txt row
+            transfers (iterable): transfers.txt rows
+            services_on (callable): Service date -> active service IDs
+        """
+        self.trips = trips
+        self.stops = stops or {}
+        self.services_on = services_on
+        self.route_trips = {}
+        for trip_id, trip in trips.items():
+            if trip.get('route_id'):
+                self.route_trips.setdefault(trip['route_id'], []).append(trip_id)
+
+        trip_ids = list(trips)
+        stop_ids = sorted({stop_id for rows in stop_times.values() for stop_id, _ in rows})
+        columns = [[] for _ in range(5)]
+        for trip_id, rows in stop_times.items():
+            for sequence, (stop_id, time) in enumerate(rows, 1):
+                seconds = hms(time) if isinstance(time, str) else time
+                for column, value in zip(columns, (trip_ids.index(trip_id), stop_ids.index(stop_id), sequence,
+                                                   seconds, seconds)):
+                    column.append(value)
+        self.stop_times = StopTimes(trip_ids, stop_ids, *(np.array(column, dtype=np.int32) for column in columns))
+        self.station_complexes = StationComplexes(self.stops, transfers, lambda: {})
+
+    def service_day_start(self, date):
+        noon = datetime.datetime(date.year, date.month, date.day, 12, tzinfo=ZoneInfo(self.agency_timezone))
+        return int(noon.timestamp()) - 12 * 3600
@@ -0,0 +1,57 @@
+import threading
+import pytest
+from flask import Flask
+from utils import admission as admission_module
+from utils.admission import AdmissionController, Overloaded
+
+
+@pytest.fixture
+def controller():
+    return AdmissionController({'static': {'concurrency': 1, 'queue': 1, 'timeout': 0.2}}, enabled=True)
+
+
+def test_full_class_answers_503_with_retry_after(controller):
+    app = Flask(__name__)
+    admission_module.init_app(app)
+
+    @app.route('/build')
+    def build():
+        with controller.slot('static'):
+            return 'built'
+
+    client = app.test_client()
+    assert client.get('/build').data == b'built'
+
+    controller.classes['static'].acquire()
+    response = client.get('/build')
+    assert response.status_code == 503
+    assert int(response.headers['Retry-After']) >= 1
+    assert response.get_json()["cost_class"] == 'static'
+
+    controller.classes['static'].release(0.01)
+    assert client.get('/build').status_code == 200
+
+
+def test_queued_request_takes_the_released_slot(controller):
+    limiter = controller.classes['static']
+    limiter.acquire()
+    admitted = threading.Event()
+
+    def wait_for_slot():
+        with controller.slot('static'):
+            admitted.set()
+
+    thread = threading.Thread(target=wait_for_slot)
+    thread.start()
+    assert not admitted.wait(0.05)
+
+    # The queue holds one waiter; the next caller is shed at once
+    with pytest.raises(Overloaded) as e:
+        with controller.slot('static'):
+            pass
+    assert e.value.reason == 'queue_full'
+
+    limiter.release(0.01)
+    thread.join(1)
+    assert admitted.is_set()
+    assert controller.get_stats()["classes"]["static"]["shed"] == 1
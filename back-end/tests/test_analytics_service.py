@@ -0,0 +1,129 @@
+from services.analytics_service import AnalyticsService, RollingStats
+
+
+def snapshot(timestamp, trips):
+    """Parsed feed with trip_id -> (route_id, [(stop_id, time, delay)])"""
+    return {
+        "header": {"timestamp": timestamp},
+        "entities": [
+            {"id": trip_id, "trip_update": {
+                "trip": {"trip_id": trip_id, "route_id": route_id},
+                "stop_time_updates": [
+                    {"stop_id": stop_id, "arrival": {"time": time, "delay": delay}} for stop_id, time, delay in stops
+                ]
+            }}
+            for trip_id, (route_id, stops) in trips.items()
+        ]
+    }
+
+
+def test_rolling_stats_expire_old_events():
+    stats = RollingStats(600)
+    stats.add(1000, 30, None)
+    stats.add(1300, 90, 300)
+    stats.add(1400, None, 100)
+
+    summary = stats.summary()
+    assert summary["arrivals"] == 3
+    assert summary["avg_delay"] == 60
+    assert summary["avg_headway"] == 200
+    assert summary["bunched"] == 1 and summary["bunching_ratio"] == 0.5
+
+    # The first arrival leaves the window, the second only once it is over 600 s old
+    assert stats.summary(1601)["arrivals"] == 2
+    assert stats.summary(1601)["avg_delay"] == 90
+    summary = stats.summary(1901)
+    assert summary["arrivals"] == 1
+    assert summary["avg_delay"] is None
+    assert summary["avg_headway"] == 100
+    assert sum(item["count"] for item in summary["headway_histogram"]) == 1
+    assert stats.summary(2001)["bunching_ratio"] is None
+
+
+def test_histogram_bins():
+    stats = RollingStats(3600)
+    for headway in (60, 120, 300, 5000):
+        stats.add(1000, None, headway)
+
+    counts = {(item["min"], item["max"]): item["count"] for item in stats.summary()["headway_histogram"]}
+    assert counts[(0, 120)] == 1
+    assert counts[(120, 240)] == 1
+    assert counts[(240, 360)] == 1
+    assert counts[(1200, None)] == 1
+
+
+def test_departed_stops_count_as_arrivals():
+    analytics = AnalyticsService(window=3600)
+    analytics.ingest('subway_ace', snapshot(1000, {
+        'T1': ('A', [('A01', 1060, 0), ('A02', 1200, 0)]),
+        'T2': ('A', [('A01', 1100, 60), ('A02', 1260, 60)]),
+    }))
+    assert analytics.get_route('A') == {"error": "No analytics for subway route: A"}
+
+    # T1 left A01, T2 left the feed
+    analytics.ingest('subway_ace', snapshot(1150, {
+        'T1': ('A', [('A02', 1200, 0)]),
+    }))
+    route = analytics.get_route('A')
+    assert route["summary"]["arrivals"] == 2
+    assert route["summary"]["avg_delay"] == 30
+    assert route["stops"]["A01"]["avg_headway"] == 40
+    assert route["stops"]["A01"]["bunched"] == 1
+    assert analytics.get_station('A01')["routes"]["A"]["arrivals"] == 2
+    assert analytics.get_feeds() == {'subway_ace': 1150}
+
+
+def test_changes_after_the_first_stop_are_not_missed():
+    analytics = AnalyticsService(window=3600)
+    analytics.ingest('subway_ace', snapshot(1000, {
+        'T1': ('A', [('A01', 1060, 0), ('A02', 1200, 0), ('A03', 1300, 0)]),
+    }))
+    # Only a later stop changed; the first stop and the stop count are the same
+    analytics.ingest('subway_ace', snapshot(1030, {
+        'T1': ('A', [('A01', 1060, 0), ('A02', 1200, 0), ('A03', 1320, 20)]),
+    }))
+    analytics.ingest('subway_ace', snapshot(1100, {
+        'T1': ('A', [('A02', 1200, 0), ('A03', 1320, 20)]),
+    }))
+    # The trip left the feed after its last stops
+    analytics.ingest('subway_ace', snapshot(1400, {}))
+
+    # A03 is recorded with its last delay
+    assert analytics.get_station('A03')["summary"]["avg_delay"] == 20
+    assert analytics.get_route('A')["summary"]["arrivals"] == 3
+
+
+def test_stops_dropped_before_their_time_are_not_arrivals():
+    analytics = AnalyticsService(window=3600)
+    analytics.ingest('subway_ace', snapshot(1000, {
+        'T1': ('A', [('A01', 1060, 0), ('A02', 1200, 0), ('A03', 1300, 0)]),
+    }))
+    # Rerouted: A03 is no longer served
+    analytics.ingest('subway_ace', snapshot(1030, {
+        'T1': ('A', [('A01', 1060, 0), ('A02', 1200, 0)]),
+    }))
+    assert "error" in analytics.get_route('A')
+
+    analytics.ingest('subway_ace', snapshot(1100, {
+        'T1': ('A', [('A02', 1200, 0)]),
+    }))
+    route = analytics.get_route('A')
+    assert list(route["stops"]) == ['A01']
+    assert route["summary"]["arrivals"] == 1
+
+
+def test_categories_are_kept_apart():
+    analytics = AnalyticsService(window=3600)
+    analytics.ingest('subway_num_s', snapshot(1000, {'S1': ('1', [('101N', 1060, 0), ('103N', 1200, 0)])}))
+    analytics.ingest('lirr_lirr', snapshot(1000, {'L1': ('1', [('101N', 1010, 300), ('20', 1200, 0)])}))
+    analytics.ingest('subway_num_s', snapshot(1100, {'S1': ('1', [('103N', 1200, 0)])}))
+    analytics.ingest('lirr_lirr', snapshot(1100, {'L1': ('1', [('20', 1200, 0)])}))
+
+    subway = analytics.get_route('1')
+    assert subway["category"] == 'subway'
+    assert subway["summary"]["arrivals"] == 1 and subway["summary"]["avg_delay"] == 0
+    assert analytics.get_route('1', 'lirr')["summary"]["avg_delay"] == 300
+    assert analytics.get_station('101N', 'lirr')["routes"]["1"]["arrivals"] == 1
+    assert analytics.get_station('101N')["summary"]["headway_histogram"][0]["count"] == 0
+    assert set(analytics.get_route_summaries()["routes"]) == {'subway', 'lirr'}
+    assert "error" in analytics.get_route('1', 'bus')
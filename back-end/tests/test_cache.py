@@ -0,0 +1,15 @@
+import time
+from utils.cache import SimpleCache
+
+
+def test_entries_expire_from_their_timestamp():
+    cache = SimpleCache()
+    cache.set('subway_ace', 'fresh')
+    cache.set('subway_g', 'restored', time.time() - 50)
+
+    assert cache.get('subway_ace', 30) == 'fresh'
+    assert cache.get('subway_g', 60) == 'restored'
+    assert cache.get('subway_g', 30) is None
+    # Expired entries are evicted on read
+    assert 'subway_g' not in cache.cache
+    assert cache.counters['subway'] == [2, 1, 1]
@@ -0,0 +1,173 @@
+import datetime
+import threading
+import time
+import pytest
+from google.transit import gtfs_realtime_pb2
+from services import data_service
+from utils.admission import CostClass, Overloaded, admission
+from utils.cache import cache
+from utils.feed_store import FeedStore
+from utils.gtfs_static import StaticFeed
+
+
+class Upstream:
+    """requests.get stand-in that holds each fetch until released"""
+
+    def __init__(self):
+        self.calls = []
+        self.release = threading.Event()
+        self.content = None  # Payload to answer with once released; None fails the fetch
+
+    def get(self, url, *args, **kwargs):
+        self.calls.append(url)
+        self.release.wait(5)
+        if self.content is None:
+            raise ConnectionError("upstream unavailable")
+        return type('Response', (), {"status_code": 200, "content": self.content})()
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    upstream = Upstream()
+    monkeypatch.setattr(data_service.requests, 'get', upstream.get)
+    yield upstream
+    upstream.release.set()
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    monkeypatch.setattr(data_service, 'FEED_STORE_PATH', str(tmp_path / 'feed_store.sqlite3'))
+    monkeypatch.setattr(data_service, 'STATIC_PRELOAD', False)
+    cache.clear()
+    yield lambda: data_service.DataService()
+    cache.clear()
+
+
+def store_snapshot(monkeypatch, fetched_at):
+    store = FeedStore(data_service.FEED_STORE_PATH)
+    with monkeypatch.context() as m:
+        m.setattr(time, 'time', lambda: fetched_at)
+        store.save('subway_ace', b'raw', {"header": {"feed_id": "ace"}, "entities": []})
+    monkeypatch.setattr(data_service, 'FEED_STORE_MAX_AGE', None)
+
+
+def wait_for(condition, seconds=2):
+    deadline = time.time() + seconds
+    while not condition() and time.time() < deadline:
+        time.sleep(0.01)
+
+
+def test_rehydrated_feed_is_served_stale_past_its_ttl(service, upstream, monkeypatch):
+    store_snapshot(monkeypatch, 1741600800.0)
+
+    ds = service()
+    start = time.perf_counter()
+    first = ds.get_subway_feed('ace')
+    second = ds.get_subway_feed('ace')
+    assert time.perf_counter() - start < 1
+    assert first["stale"] and first["fetched_at"] == 1741600800.0
+    assert second is first
+
+    # One background refresh, which has not held up either request
+    wait_for(lambda: upstream.calls)
+    assert len(upstream.calls) == 1
+
+    # A failed refresh keeps serving the snapshot
+    upstream.release.set()
+    wait_for(lambda: not ds._refreshing)
+    assert ds.get_subway_feed('ace') is first
+
+
+def test_refresh_replaces_rehydrated_feed(service, upstream, monkeypatch):
+    store_snapshot(monkeypatch, 1741600800.0)
+    feed = gtfs_realtime_pb2.FeedMessage()
+    feed.header.gtfs_realtime_version = '2.0'
+    feed.header.timestamp = 1741690800
+    upstream.content = feed.SerializeToString()
+    upstream.release.set()
+
+    ds = service()
+    assert ds.get_subway_feed('ace')["stale"]
+    wait_for(lambda: 'subway_ace' not in ds._rehydrated)
+
+    fresh = ds.get_subway_feed('ace')
+    assert "stale" not in fresh and fresh["header"]["timestamp"] == 1741690800
+    assert len(upstream.calls) == 1
+
+
+def test_failing_refresh_handler_is_not_an_upstream_error(service, upstream, monkeypatch):
+    feed = gtfs_realtime_pb2.FeedMessage()
+    feed.header.gtfs_realtime_version = '2.0'
+    feed.header.timestamp = 1741690800
+    upstream.content = feed.SerializeToString()
+    upstream.release.set()
+
+    ds = service()
+    monkeypatch.setattr(ds, '_ingest_trips', lambda cache_key, result: 1 / 0)
+    errors = dict(data_service.upstream_errors._values)
+
+    result = ds.get_subway_feed('ace')
+    assert "error" not in result and result["header"]["timestamp"] == 1741690800
+    assert data_service.upstream_errors._values == errors
+
+
+def test_cached_builds_need_no_admission_slot(service, monkeypatch):
+    limiter = CostClass('static', concurrency=1, queue=0, timeout=0.1)
+    monkeypatch.setitem(admission.classes, 'static', limiter)
+    monkeypatch.setattr(admission, 'enabled', True)
+    ds = service()
+    builds = []
+
+    def build():
+        builds.append(1)
+        return {"built": len(builds)}
+
+    assert ds._cached_build('built', 60, 'static', build) == {"built": 1}
+    limiter.acquire()
+    assert ds._cached_build('built', 60, 'static', build) == {"built": 1}
+    with pytest.raises(Overloaded):
+        ds._cached_build('other', 60, 'static', build)
+    limiter.release(0.01)
+
+    # Errors are rebuilt on the next request
+    assert ds._cached_build('failed', 60, 'static', lambda: {"error": "unavailable"}) == {"error": "unavailable"}
+    assert cache.get('failed', 60) is None
+    assert builds == [1]
+
+
+@pytest.fixture
+def static_feed(tmp_path):
+    """A two-route feed without a calendar, so every service runs every day"""
+    tables = {
+        'routes': 'route_id,route_short_name\nA,A\nC,C\n',
+        'stops': 'stop_id,stop_name,stop_lat,stop_lon\nA01,Inwood-207 St,40.868,-73.920\n'
+                 'A02,Dyckman St,40.865,-73.927\nA03,190 St,40.859,-73.934\n',
+        'trips': 'route_id,service_id,trip_id,shape_id\nA,Weekday,a1,s1\nC,Weekday,c1,s2\n',
+        'stop_times': 'trip_id,arrival_time,departure_time,stop_id,stop_sequence\n'
+                      'a1,08:00:00,08:00:00,A01,1\na1,08:02:00,08:02:00,A02,2\n'
+                      'c1,09:00:00,09:00:00,A02,1\nc1,09:03:00,09:03:00,A03,2\n',
+        'shapes': 'shape_id,shape_pt_lat,shape_pt_lon,shape_pt_sequence\n'
+                  's1,40.868,-73.920,1\ns1,40.865,-73.927,2\ns2,40.865,-73.927,1\ns2,40.859,-73.934,2\n',
+    }
+    for name, content in tables.items():
+        (tmp_path / f"{name}.txt").write_text(content)
+    return StaticFeed(str(tmp_path))
+
+
+def test_route_batch_matches_single_route_endpoints(service, static_feed, monkeypatch):
+    ds = service()
+    monkeypatch.setattr(ds, 'static_feeds', {'subway': static_feed})
+    date = datetime.date(2025, 3, 10)
+
+    batch = ds.get_routes_batch(['C', 'A', 'A'], None, 'subway', date)
+    assert list(batch["routes"]) == ['A', 'C']
+    assert [stop["id"] for stop in batch["routes"]["C"]["stops"]["stops"]] == ['A02', 'A03']
+    assert batch["routes"]["A"]["shape"]["shapes"][0]["shape_id"] == 's1'
+    # Routes are cached one by one, so single-route requests reuse the batch
+    assert ds.get_stops_for_route('A', 'subway', date) == batch["routes"]["A"]["stops"]
+    assert ds.get_line_shape('C', 'subway', date) == batch["routes"]["C"]["shape"]
+
+    partial = ds.get_routes_batch(['A', 'Z'], ['stops'], 'subway', date)
+    assert partial["routes"]["Z"] == {"stops": {"error": "Route not found: Z"}}
+    assert list(partial["routes"]["A"]) == ['stops']
+    assert ds.get_routes_batch(['A'], ['trips'], 'subway', date) == {"error": "Invalid kinds: trips"}
@@ -0,0 +1,38 @@
+import pytest
+from utils.feed_archive import FeedArchive
+
+HOUR = 1741600800  # 2025-03-10 10:00 UTC
+
+
+@pytest.fixture
+def archive(tmp_path):
+    return FeedArchive(str(tmp_path), lookback_hours=1, max_indexes=2)
+
+
+def test_snapshot_at_returns_latest_record_before_time(archive):
+    for offset, payload in ((10, b'a'), (1800, b'b'), (3700, b'c')):
+        archive.record('subway_ace', payload, HOUR + offset)
+
+    assert archive.snapshot_at('subway_ace', HOUR + 5) is None
+    assert archive.snapshot_at('subway_ace', HOUR + 1799) == (HOUR + 10, b'a')
+    assert archive.snapshot_at('subway_ace', HOUR + 3600) == (HOUR + 1800, b'b')
+    assert archive.snapshot_at('subway_ace', HOUR + 3700) == (HOUR + 3700, b'c')
+    # Beyond the lookback window
+    assert archive.snapshot_at('subway_ace', HOUR + 4 * 3600) is None
+    assert [timestamp for timestamp, _ in archive.snapshots('subway_ace', HOUR, HOUR + 3600)] == [HOUR + 10, HOUR + 1800]
+
+
+@pytest.mark.parametrize('timestamp', [float('nan'), float('inf'), -float('inf'), 1e20])
+def test_snapshot_at_rejects_unrepresentable_times(archive, timestamp):
+    assert archive.snapshot_at('subway_ace', timestamp) is None
+
+
+def test_partition_indexes_are_bounded(archive):
+    for hour in range(4):
+        archive.record('subway_ace', b'x', HOUR + hour * 3600)
+        archive.snapshot_at('subway_ace', HOUR + hour * 3600)
+    assert len(archive._indexes) == 2
+
+    # Indexes are refreshed when the partition grows
+    archive.record('subway_ace', b'y', HOUR + 3 * 3600 + 60)
+    assert archive.snapshot_at('subway_ace', HOUR + 3 * 3600 + 60) == (HOUR + 3 * 3600 + 60, b'y')
@@ -0,0 +1,75 @@
+import pytest
+from tests.conftest import FakeFeed
+from utils.frequency import FrequencyTable
+
+
+def feed(trips, stop_times):
+    """trips maps trip_id -> (route_id, direction_id, service_id)"""
+    return FakeFeed({
+        trip_id: {'route_id': route_id, 'direction_id': direction, 'service_id': service_id}
+        for trip_id, (route_id, direction, service_id) in trips.items()
+    }, stop_times)
+
+
+@pytest.fixture
+def table():
+    departures = {
+        # Every 10 minutes on weekdays, with two extra trips in between
+        ('A', '0', 'Weekday'): ['08:00', '08:10', '08:20', '08:30', '09:10', '24:30'],
+        ('A', '0', 'Extra'): ['08:05', '08:25'],
+        ('A', '1', 'Weekday'): ['08:03'],
+        ('C', '0', 'Weekday'): ['08:02'],
+    }
+    trips, stop_times = {}, {}
+    for (route_id, direction, service_id), times in departures.items():
+        for time in times:
+            trip_id = f"{route_id}{direction}{service_id}{time}"
+            trips[trip_id] = (route_id, direction, service_id)
+            stop = 'S1N' if direction == '0' else 'S1S'
+            stop_times[trip_id] = [(stop, time), ('S2' + stop[-1], f"{int(time[:2]):02d}:{int(time[3:]) + 2:02d}")]
+    return FrequencyTable(feed(trips, stop_times))
+
+
+def test_rows_group_departures_by_hour(table):
+    rows = table.rows('A', {'S1N'}, {'Weekday'})
+    assert [(row["hour"], row["trips"], row["headways"]) for row in rows] == [(8, 4, 3), (9, 1, 1), (24, 1, 1)]
+    assert rows[0]["headway_mean"] == 600.0
+    assert rows[0]["headway_min"] == rows[0]["headway_max"] == 600
+    # The headway into a departure counts in the hour of that departure
+    assert rows[1]["headway_mean"] == 2400.0
+    assert rows[0]["direction_id"] == 0 and rows[0]["service_id"] == 'Weekday'
+
+    first = table.rows('A', {'S1N'}, {'Extra'})[0]
+    assert (first["trips"], first["headway_mean"], first["headway_min"]) == (2, 1200.0, 1200)
+
+    assert {row["stop_id"] for row in table.rows('A', direction=1)} == {'S1S', 'S2S'}
+    assert table.rows('A', {'S9N'}) == []
+    assert table.rows('Z') == []
+    assert len(table) == sum(len(table.rows(route_id)) for route_id in ('A', 'C'))
+
+
+def test_scheduled_headway_merges_services(table):
+    assert table.scheduled_headway('A', {'S1N'}, {'Weekday'}, 8) == (4, 600.0)
+    # 08:00 08:05 08:10 08:20 08:25 08:30, not the mean of the two services' headways
+    assert table.scheduled_headway('A', {'S1N'}, {'Weekday', 'Extra'}, 8) == (6, 360.0)
+    assert table.scheduled_headway('A', {'S1N'}, {'Weekday', 'Extra'}, 9) == (1, 2400.0)
+    # Both platforms of the station: trains in opposite directions do not follow each other
+    assert table.scheduled_headway('A', {'S1N', 'S1S'}, {'Weekday'}, 8) == (5, 600.0)
+    assert table.scheduled_headway('A', {'S1N', 'S1S'}, {'Weekday'}, 8, direction=1) == (1, None)
+    assert table.scheduled_headway('A', {'S1N', 'S1S'}, {'Weekday'}, 8, direction=0) == (4, 600.0)
+    assert table.scheduled_headway('A', {'S1N'}, {'Weekday'}, 7) == (0, None)
+    assert table.scheduled_headway('A', {'S1N'}, {'Sunday'}, 8) == (0, None)
+    assert table.scheduled_headway('C', {'S1N'}, {'Weekday'}, 8) == (1, None)
+    assert table.scheduled_headway('Z', {'S1N'}, {'Weekday'}, 8) == (0, None)
+
+
+def test_scheduled_headway_after_midnight():
+    departures = {'Weekday': ['23:40', '23:55', '24:10', '24:25'], 'Saturday': ['00:40', '08:00']}
+    trips = {f"{service_id}{time}": ('A', '0', service_id) for service_id, times in departures.items() for time in times}
+    stop_times = {trip_id: [('S1N', trip_id[-5:])] for trip_id in trips}
+    table = FrequencyTable(feed(trips, stop_times))
+
+    # Saturday 00:xx: Friday's trips past 24:00 run then, after Friday's 23:55
+    assert table.scheduled_headway('A', {'S1N'}, {'Saturday'}, 0) == (1, None)
+    assert table.scheduled_headway('A', {'S1N'}, {'Saturday'}, 0, previous_service_ids={'Weekday'}) == (3, 900.0)
+    assert table.scheduled_headway('A', {'S1N'}, set(), 24, previous_service_ids={'Weekday'}) == (0, None)
@@ -0,0 +1,57 @@
+import pytest
+from google.transit import gtfs_realtime_pb2
+from utils.gtfs_parser import parse_feed, filter_feed
+
+
+def make_feed():
+    feed = gtfs_realtime_pb2.FeedMessage()
+    feed.header.gtfs_realtime_version = '2.0'
+    feed.header.timestamp = 1741600800
+
+    entity = feed.entity.add(id='1')
+    entity.trip_update.trip.trip_id = 'T1'
+    entity.trip_update.trip.route_id = 'A'
+    update = entity.trip_update.stop_time_update.add(stop_id='A27N')
+    update.arrival.time = 1741600860
+    update.arrival.delay = 60
+
+    entity = feed.entity.add(id='2')
+    entity.vehicle.trip.trip_id = 'T2'
+    entity.vehicle.trip.route_id = 'C'
+    entity.vehicle.position.latitude = 40.75
+    entity.vehicle.position.longitude = -73.99
+
+    entity = feed.entity.add(id='3')
+    entity.alert.informed_entity.add(route_id='A')
+    entity.alert.header_text.translation.add(text='Delays')
+    return feed.SerializeToString()
+
+
+def test_parse_feed_omits_absent_fields():
+    result = parse_feed(make_feed(), 'ace')
+    assert result["header"]["feed_id"] == 'ace'
+    trip_update, vehicle, alert = result["entities"]
+
+    arrival = trip_update["trip_update"]["stop_time_updates"][0]["arrival"]
+    assert arrival["time"] == 1741600860 and arrival["delay"] == 60
+    assert "departure" not in trip_update["trip_update"]["stop_time_updates"][0]
+    assert "timestamp" not in trip_update["trip_update"]
+
+    assert vehicle["vehicle"]["position"] == {"latitude": 40.75, "longitude": pytest.approx(-73.99)}
+    assert "stop_id" not in vehicle["vehicle"]
+
+    assert alert["alert"]["header_text"] == 'Delays'
+    assert "cause" not in alert["alert"] and "url" not in alert["alert"]
+
+
+def test_parse_feed_reports_invalid_payload():
+    assert "error" in parse_feed(b'\xff\xff', 'ace')
+
+
+def test_filter_feed():
+    def ids(content):
+        return [entity.id for entity in gtfs_realtime_pb2.FeedMessage.FromString(content).entity]
+
+    assert ids(filter_feed(make_feed(), route_ids={'A'})) == ['1', '3']
+    assert ids(filter_feed(make_feed(), entity_types={'vehicle', 'alert'})) == ['2', '3']
+    assert ids(filter_feed(make_feed(), {'A'}, {'trip_update'})) == ['1']
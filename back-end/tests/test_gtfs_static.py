@@ -0,0 +1,52 @@
+import zipfile
+import numpy as np
+import pytest
+from utils.gtfs_static import StaticFeed, parse_shapes, parse_stop_times
+
+TABLES = {
+    'stops': 'stop_id,stop_name,stop_lat,stop_lon\nA01,Inwood-207 St,40.868,-73.920\nA02,Dyckman St,40.865,-73.927\n',
+    'trips': 'route_id,service_id,trip_id,shape_id\nA,Weekday,t1,s1\nA,Weekday,t2,s1\n',
+    'stop_times': 'trip_id,arrival_time,departure_time,stop_id,stop_sequence\n'
+                  't1,08:00:00,08:00:30,A01,1\nt1,08:02:00,08:02:00,A02,2\n'
+                  't2,24:10:00,24:10:00,A02,2\nt2,24:08:00,,A01,1\n',
+    'shapes': 'shape_id,shape_pt_lat,shape_pt_lon,shape_pt_sequence\ns1,40.865,-73.927,2\ns1,40.868,-73.920,1\n',
+}
+
+
+@pytest.fixture
+def sources(tmp_path):
+    """The same feed as a directory and as a .zip with a BOM and a nested folder"""
+    directory = tmp_path / 'gtfs'
+    directory.mkdir()
+    archive = tmp_path / 'gtfs.zip'
+    with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as f:
+        for name, content in TABLES.items():
+            (directory / f"{name}.txt").write_text(content)
+            f.writestr(f"google_transit/{name}.txt", '\ufeff' + content)
+    return str(directory), str(archive)
+
+
+def test_zip_tables_stream_like_a_directory(sources, tmp_path):
+    directory, archive = sources
+    expected = parse_stop_times(directory)
+    # A chunk per row exercises the chunked flushing
+    parsed = parse_stop_times(archive, chunk_rows=1)
+
+    assert parsed["trip_ids"] == expected["trip_ids"] == ['t1', 't2']
+    assert parsed["stop_ids"] == ['A01', 'A02']
+    for column in ('trip_idx', 'stop_idx', 'sequence', 'arrival', 'departure'):
+        assert np.array_equal(parsed[column], expected[column])
+    assert parsed["departure"].tolist() == [30 + 8 * 3600, 8 * 3600 + 120, 87000, -1]
+
+    assert parse_shapes(archive) == {'s1': [(40.868, -73.920), (40.865, -73.927)]}
+    # Nothing is extracted next to the archive
+    assert sorted(p.name for p in tmp_path.iterdir()) == ['gtfs', 'gtfs.zip']
+
+
+def test_static_feed_reads_a_zip(sources):
+    feed = StaticFeed(sources[1], chunk_rows=1).preload(processes=False)
+
+    assert feed.has_table('stop_times') and not feed.has_table('transfers')
+    assert feed.stops['A01']['stop_name'] == 'Inwood-207 St'
+    assert [stop_id for _, stop_id, _, _ in feed.stop_times.for_trip('t2')] == ['A01', 'A02']
+    assert feed.route_trips == {'A': ['t1', 't2']}
@@ -0,0 +1,73 @@
+import sys
+import threading
+import time
+import types
+import pytest
+from services.loader import ServiceLoader
+
+
+@pytest.fixture
+def module(monkeypatch):
+    """A service module whose constructor can be held and made to fail"""
+    module = types.ModuleType('fake_services')
+
+    class Service:
+        built = 0
+        release = threading.Event()
+        fail = False
+
+        def __init__(self):
+            Service.release.wait(2)
+            if Service.fail:
+                raise RuntimeError("feed missing")
+            Service.built += 1
+            self.name = 'service'
+
+    module.Service = Service
+    monkeypatch.setitem(sys.modules, 'fake_services', module)
+    return module
+
+
+def test_service_is_built_on_first_use(module):
+    module.Service.release.set()
+    loader = ServiceLoader('fake_services', 'Service')
+    assert (loader.state, loader.loaded, module.Service.built) == ('pending', False, 0)
+
+    assert loader.name == 'service'
+    assert loader.get() is loader.get()
+    assert (loader.state, loader.loaded, module.Service.built) == ('ready', True, 1)
+    assert loader.load_seconds >= 0
+
+
+def test_failed_build_is_reported_and_retried(module):
+    module.Service.release.set()
+    module.Service.fail = True
+    loader = ServiceLoader('fake_services', 'Service')
+
+    with pytest.raises(RuntimeError):
+        loader.get()
+    assert (loader.state, loader.error) == ('failed', 'feed missing')
+
+    module.Service.fail = False
+    assert loader.name == 'service'
+    assert (loader.state, loader.error) == ('ready', None)
+
+
+def test_requests_wait_for_the_background_build(module):
+    loader = ServiceLoader('fake_services', 'Service')
+    loader.start_background()
+    deadline = time.time() + 2
+    while loader.state == 'pending' and time.time() < deadline:
+        time.sleep(0.001)
+
+    names = []
+    requests = [threading.Thread(target=lambda: names.append(loader.name)) for _ in range(3)]
+    for thread in requests:
+        thread.start()
+    assert loader.state == 'loading' and not names
+
+    module.Service.release.set()
+    for thread in requests:
+        thread.join(2)
+    assert names == ['service'] * 3
+    assert module.Service.built == 1
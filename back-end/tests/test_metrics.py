@@ -0,0 +1,59 @@
+from flask import Flask
+import pytest
+from utils import metrics as metrics_module
+from utils.metrics import MetricsRegistry
+
+
+@pytest.fixture
+def registry():
+    return MetricsRegistry()
+
+
+def test_counter_and_histogram_exposition(registry):
+    errors = registry.counter('errors_total', 'Errors', ('feed', 'reason'))
+    errors.inc('ace', 'http_503')
+    errors.inc('ace', 'http_503', amount=2)
+    errors.inc('g', 'Timeout "read"')
+    duration = registry.histogram('duration_seconds', 'Duration', ('feed',), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5.0):
+        duration.observe(value, 'ace')
+
+    lines = registry.render().splitlines()
+    assert lines[:2] == ['# HELP errors_total Errors', '# TYPE errors_total counter']
+    assert 'errors_total{feed="ace",reason="http_503"} 3' in lines
+    assert 'errors_total{feed="g",reason="Timeout \\"read\\""} 1' in lines
+    # Buckets are cumulative and end with +Inf
+    assert [line for line in lines if line.startswith('duration_seconds')] == [
+        'duration_seconds_bucket{feed="ace",le="0.1"} 1',
+        'duration_seconds_bucket{feed="ace",le="1.0"} 2',
+        'duration_seconds_bucket{feed="ace",le="+Inf"} 3',
+        'duration_seconds_sum{feed="ace"} 5.55',
+        'duration_seconds_count{feed="ace"} 3',
+    ]
+
+
+def test_callback_metrics_are_read_at_scrape_time(registry):
+    entries = {('subway',): 1}
+    registry.callback('cache_entries', 'Entries', ('family',), lambda: dict(entries))
+    assert 'cache_entries{family="subway"} 1' in registry.render()
+    entries[('subway',)] = 4
+    assert 'cache_entries{family="subway"} 4' in registry.render()
+
+
+def test_requests_are_labelled_by_route_template():
+    app = Flask(__name__)
+    metrics_module.init_app(app)
+
+    @app.route('/test/line/<line_id>')
+    def line(line_id):
+        return line_id
+
+    client = app.test_client()
+    client.get('/test/line/A')
+    client.get('/test/line/C')
+
+    response = client.get('/metrics')
+    assert response.content_type == metrics_module.CONTENT_TYPE
+    body = response.get_data(as_text=True)
+    assert 'http_request_duration_seconds_count{endpoint="/test/line/<line_id>",method="GET",status="200"} 2' in body
+    assert '/test/line/A' not in body
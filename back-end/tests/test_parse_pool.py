@@ -0,0 +1,41 @@
+import concurrent.futures
+from concurrent.futures.process import BrokenProcessPool
+from tests.test_gtfs_parser import make_feed
+from utils.gtfs_parser import parse_feed
+from utils.parse_pool import ParsePool
+
+
+class StuckExecutor:
+    """Executor whose work never finishes"""
+
+    def __init__(self):
+        self.futures = []
+
+    def submit(self, fn, *args):
+        self.futures.append(concurrent.futures.Future())
+        return self.futures[-1]
+
+
+class BrokenExecutor:
+    def submit(self, fn, *args):
+        raise BrokenProcessPool("worker died")
+
+
+def test_stuck_worker_falls_back_to_inline_parsing(monkeypatch, capsys):
+    pool = ParsePool(workers=1, min_bytes=0, timeout=0.05)
+    executor = StuckExecutor()
+    monkeypatch.setattr(pool, '_executor', lambda: executor)
+
+    assert pool.parse(make_feed(), 'ace') == parse_feed(make_feed(), 'ace')
+    assert executor.futures[0].cancelled()
+    assert 'timed out after 0.05s' in capsys.readouterr().out
+
+
+def test_broken_pool_is_replaced(monkeypatch):
+    pool = ParsePool(workers=1, min_bytes=0)
+    monkeypatch.setattr(pool, '_executor', lambda: BrokenExecutor())
+    shutdowns = []
+    monkeypatch.setattr(pool, 'shutdown', lambda: shutdowns.append(1))
+
+    assert pool.parse(make_feed(), 'ace')["header"]["feed_id"] == 'ace'
+    assert shutdowns == [1]
@@ -0,0 +1,63 @@
+from types import SimpleNamespace
+import pytest
+from services.position_service import PositionService
+
+
+@pytest.fixture
+def service():
+    # An L-shaped line: north along -74.00, then east along 40.72
+    static = SimpleNamespace(
+        shapes={'A..N': [(40.70, -74.00), (40.72, -74.00), (40.72, -73.98)]},
+        stops={
+            'A01N': {'stop_lat': '40.70', 'stop_lon': '-74.00'},
+            'A02N': {'stop_lat': '40.72', 'stop_lon': '-73.98'},
+            'A03N': {'stop_lat': '40.74', 'stop_lon': '-73.98'}
+        },
+        trips={}
+    )
+    return PositionService(static, predictions=None)
+
+
+def prediction(trip_id, stops, delay=None):
+    return {
+        "trip_id": trip_id, "route_id": 'A', "static_trip_id": None, "delay": delay,
+        "stops": [{"stop_id": stop_id, "eta": eta, "scheduled": scheduled} for stop_id, eta, scheduled in stops]
+    }
+
+
+def test_position_follows_the_shape(service):
+    trip = prediction('036000_A..N', [('A01N', 1000, None), ('A02N', 2000, None)])
+    position = service.locate(trip, 1500)
+
+    assert (position["shape_id"], position["from_stop"], position["to_stop"]) == ('A..N', 'A01N', 'A02N')
+    assert position["progress"] == 0.5
+    # Halfway along the line is still on its northbound leg, not between the stops as the crow flies
+    assert position["lng"] == pytest.approx(-74.00, abs=1e-6)
+    assert 40.715 < position["lat"] < 40.72
+
+    assert service.locate(trip, 900)["lat"] == pytest.approx(40.70, abs=1e-6)
+    end = service.locate(trip, 2500)
+    assert (end["from_stop"], end["lat"], end["lng"]) == ('A02N', pytest.approx(40.72, abs=1e-6),
+                                                         pytest.approx(-73.98, abs=1e-6))
+
+
+def test_position_without_shape_uses_a_straight_line(service):
+    # Scheduled stops are shifted by the trip's delay
+    trip = prediction('036000_A..N99R', [('A02N', 1000, None), ('A03N', None, 1800)], delay=200)
+    position = service.locate(trip, 1500)
+
+    assert position["shape_id"] is None
+    assert position["progress"] == 0.5
+    assert (position["lat"], position["lng"]) == (pytest.approx(40.73), pytest.approx(-73.98))
+
+    assert service.locate(prediction('036000_A..N', [('A09N', None, None)]), 1500) is None
+
+
+def test_locate_feed_skips_unplaceable_trips(service):
+    predictions = {"header": {"timestamp": 1000}, "trips": [
+        prediction('036000_A..N', [('A01N', 1000, None), ('A02N', 2000, None)]),
+        prediction('036000_A..N', [])
+    ]}
+    result = service.locate_feed(predictions, 1500)
+    assert [vehicle["trip_id"] for vehicle in result["vehicles"]] == ['036000_A..N']
+    assert result["timestamp"] == 1500
@@ -0,0 +1,73 @@
+import datetime
+import pytest
+from services.prediction_service import PredictionService
+from tests.conftest import FakeFeed
+
+DAY_START = 1741579200  # 2025-03-10 00:00 America/New_York
+
+
+@pytest.fixture
+def static():
+    trips = {
+        'AFA24GEN-1038-Weekday-00_036000_A..S': {'service_id': 'Weekday'},
+        'AFA24GEN-1038-Sunday-00_036000_A..S': {'service_id': 'Sunday'},
+        'AFA24GEN-1038-Weekday-00_036000_A..S74R': {'service_id': 'Weekday'},
+    }
+    # Origin 036000 is 06:00 (hundredths of a minute); stops every 2 minutes
+    pattern = [(f"A0{i + 1}S", 21600 + i * 120) for i in range(5)]
+    return FakeFeed(trips, {trip_id: pattern for trip_id in trips})
+
+
+def test_trip_key():
+    assert PredictionService.trip_key('AFA24GEN-1038-Sunday-00_000600_1..S03R') == ('000600', '1', 'S')
+    assert PredictionService.trip_key('000600_1..S03R') == ('000600', '1', 'S')
+    assert PredictionService.trip_key('000600_1..S') == ('000600', '1', 'S')
+    assert PredictionService.trip_key('bogus') is None
+
+
+def test_match_trip_prefers_active_service_and_exact_pattern(static):
+    service = PredictionService(static)
+    monday, sunday = datetime.date(2025, 3, 10), datetime.date(2025, 3, 9)
+
+    assert service.match_trip('036000_A..S', monday) == 'AFA24GEN-1038-Weekday-00_036000_A..S'
+    assert service.match_trip('036000_A..S', sunday) == 'AFA24GEN-1038-Sunday-00_036000_A..S'
+    assert service.match_trip('036000_A..S74R', monday) == 'AFA24GEN-1038-Weekday-00_036000_A..S74R'
+    assert service.match_trip('036000_C..S', monday) is None
+    # Static IDs match themselves
+    assert service.match_trip('AFA24GEN-1038-Sunday-00_036000_A..S', monday) == 'AFA24GEN-1038-Sunday-00_036000_A..S'
+
+
+def test_predict_trip_propagates_latest_delay(static):
+    service = PredictionService(static)
+    update = {
+        "trip": {"trip_id": '036000_A..S', "route_id": 'A', "start_date": '20250310'},
+        "stop_time_updates": [
+            {"stop_id": 'A02S', "arrival": {"time": DAY_START + 21720 + 60}},
+            {"stop_id": 'A03S', "arrival": {"time": DAY_START + 21840 + 180}},
+        ]
+    }
+    prediction = service.predict_trip(update, DAY_START + 21700)
+
+    assert prediction["static_trip_id"] == 'AFA24GEN-1038-Weekday-00_036000_A..S'
+    assert prediction["service_date"] == '20250310'
+    assert prediction["delay"] == 180
+    assert [(stop["stop_id"], stop["source"]) for stop in prediction["stops"]] == [
+        ('A01S', 'passed'), ('A02S', 'realtime'), ('A03S', 'realtime'), ('A04S', 'propagated'), ('A05S', 'propagated')]
+    # Downstream stops carry the latest delay, not the first
+    assert [stop["eta"] - stop["scheduled"] for stop in prediction["stops"][3:]] == [180, 180]
+
+
+def test_predict_trip_without_static_pattern(static):
+    service = PredictionService(static)
+    update = {
+        "trip": {"trip_id": '036000_C..N', "route_id": 'C'},
+        "stop_time_updates": [{"stop_id": 'A05N', "departure": {"time": DAY_START + 30000}}]
+    }
+    prediction = service.predict_trip(update, DAY_START + 29000)
+
+    assert prediction["static_trip_id"] is None
+    assert prediction["delay"] is None
+    assert prediction["stops"] == [
+        {"stop_id": 'A05N', "stop_sequence": None, "scheduled": None, "eta": DAY_START + 30000, "source": "realtime"}]
+    # Without start_date the service date comes from the feed time in the agency timezone
+    assert prediction["service_date"] == '20250310'
@@ -0,0 +1,36 @@
+from flask import Flask
+from utils import profiler
+
+
+def make_client(admin_token):
+    app = Flask(__name__)
+
+    @app.route('/api/health')
+    def health():
+        return 'ok'
+
+    profiler.init_app(app, profiler.RequestProfiler(0.0, 0.001, 5), admin_token)
+    return app.test_client()
+
+
+def test_profiler_requires_an_admin_token(capsys):
+    client = make_client(None)
+    assert client.get('/api/health').status_code == 200
+    assert client.get('/admin/profiles').status_code == 404
+    assert "PROFILER_ADMIN_TOKEN" in capsys.readouterr().out
+
+
+def test_admin_routes_check_the_token():
+    client = make_client('secret')
+    client.get('/api/health')
+
+    assert client.get('/admin/profiles').status_code == 403
+    assert client.get('/admin/profiles', headers={'Authorization': 'Bearer wrong'}).status_code == 403
+    assert client.get('/admin/profiles', headers={'Authorization': 'Bearer café'}).status_code == 403
+    # Only the Authorization header is accepted
+    assert client.get('/admin/profiles?token=secret').status_code == 403
+    assert client.get('/admin/profiles', headers={'X-Admin-Token': 'secret'}).status_code == 403
+    assert client.get('/admin/profiles', headers={'Authorization': 'Basic secret'}).status_code == 403
+    response = client.get('/admin/profiles', headers={'Authorization': 'Bearer secret'})
+    assert response.status_code == 200
+    assert [profile["path"] for profile in response.get_json()] == ['/api/health']
@@ -0,0 +1,36 @@
+import pytest
+from flask import Flask
+from api.routes import negotiate_format, parse_timestamp, parse_departure_time
+
+
+def test_parse_timestamp():
+    assert parse_timestamp('1741600800') == 1741600800.0
+    assert parse_timestamp('2025-03-10T10:00:00+00:00') == 1741600800.0
+
+
+@pytest.mark.parametrize('value', ['nan', 'inf', '-inf', '1e20', '-1', 'yesterday', '9999-99-99'])
+def test_parse_timestamp_rejects_invalid(value):
+    assert parse_timestamp(value) is None
+
+
+def test_parse_departure_time():
+    assert parse_departure_time('08:04') == (29040, None)
+    assert parse_departure_time('25:00:30') == (90030, None)
+    assert parse_departure_time(None) == (None, None)
+    assert "error" in parse_departure_time('08:60')[1]
+
+
+@pytest.mark.parametrize('query, accept, expected', [
+    ('', None, 'json'),
+    ('', '*/*', 'json'),
+    ('', 'application/x-protobuf', 'protobuf'),
+    ('', 'application/x-protobuf;q=0.5, application/json;q=0.9', 'json'),
+    ('', 'application/json;q=0.1, application/msgpack', 'msgpack'),
+    ('', 'text/html', 'json'),
+    ('format=protobuf', 'application/json', 'protobuf'),
+    ('format=xml', None, None),
+])
+def test_negotiate_format(query, accept, expected):
+    headers = {'Accept': accept} if accept else {}
+    with Flask(__name__).test_request_context(f"/feed?{query}", headers=headers):
+        assert negotiate_format() == expected
@@ -0,0 +1,91 @@
+import datetime
+import pytest
+from utils.gtfs_static import StaticFeed
+from utils.service_calendar import ServiceCalendar
+
+WEEKDAY = {'service_id': 'Weekday', 'monday': '1', 'tuesday': '1', 'wednesday': '1', 'thursday': '1',
+           'friday': '1', 'saturday': '0', 'sunday': '0', 'start_date': '20250303', 'end_date': '20250316'}
+SUNDAY = {'service_id': 'Sunday', 'monday': '0', 'tuesday': '0', 'wednesday': '0', 'thursday': '0',
+          'friday': '0', 'saturday': '0', 'sunday': '1', 'start_date': '20250303', 'end_date': '20250316'}
+EXCEPTIONS = [
+    {'service_id': 'Weekday', 'date': '20250310', 'exception_type': '2'},  # Holiday: no weekday service...
+    {'service_id': 'Sunday', 'date': '20250310', 'exception_type': '1'},   # ...Sunday service instead
+    {'service_id': 'Special', 'date': '20250312', 'exception_type': '1'},  # Only in calendar_dates
+]
+
+
+@pytest.fixture
+def calendar():
+    return ServiceCalendar([WEEKDAY, SUNDAY], EXCEPTIONS)
+
+
+def test_weekly_patterns(calendar):
+    assert calendar.active(datetime.date(2025, 3, 4)) == {'Weekday'}
+    assert calendar.active(datetime.date(2025, 3, 8)) == set()
+    assert calendar.active(datetime.date(2025, 3, 9)) == {'Sunday'}
+    assert calendar.date_range() == (datetime.date(2025, 3, 3), datetime.date(2025, 3, 16))
+
+
+def test_calendar_date_exceptions(calendar):
+    assert calendar.active(datetime.date(2025, 3, 10)) == {'Sunday'}
+    assert calendar.active(datetime.date(2025, 3, 12)) == {'Weekday', 'Special'}
+    assert calendar.active(datetime.date(2025, 3, 13)) == {'Weekday'}
+    assert calendar.bit('Special') and not calendar.bit('Unknown')
+
+
+def test_effective_date(calendar):
+    # Inside the span, dates are kept even when nothing runs
+    assert calendar.effective_date(datetime.date(2025, 3, 8)) == datetime.date(2025, 3, 8)
+    # After the feed ends: same weekday of the last covered week
+    assert calendar.effective_date(datetime.date(2026, 10, 19)) == datetime.date(2025, 3, 10)
+    assert calendar.effective_date(datetime.date(2025, 3, 17)) == datetime.date(2025, 3, 10)
+    assert calendar.effective_date(datetime.date(2025, 3, 23)) == datetime.date(2025, 3, 16)
+    # Before it starts: same weekday of the first covered week
+    assert calendar.effective_date(datetime.date(2025, 3, 2)) == datetime.date(2025, 3, 9)
+    assert calendar.effective_date(datetime.date(2024, 12, 31)) == datetime.date(2025, 3, 4)
+
+
+def test_empty_calendar():
+    calendar = ServiceCalendar([])
+    assert calendar.date_range() == (None, None)
+    assert calendar.effective_date(datetime.date(2025, 3, 10)) == datetime.date(2025, 3, 10)
+    assert calendar.active(datetime.date(2025, 3, 10)) == set()
+
+
+def write_table(path, name, rows):
+    header = list(rows[0])
+    lines = [','.join(header)] + [','.join(row[key] for key in header) for row in rows]
+    (path / f"{name}.txt").write_text('\n'.join(lines) + '\n')
+
+
+@pytest.fixture
+def feed(tmp_path):
+    write_table(tmp_path, 'agency', [{'agency_id': 'MTA', 'agency_timezone': 'America/New_York'}])
+    write_table(tmp_path, 'routes', [{'route_id': 'A'}])
+    write_table(tmp_path, 'trips', [
+        {'route_id': 'A', 'service_id': 'Weekday', 'trip_id': 't1', 'shape_id': 's1'},
+        {'route_id': 'A', 'service_id': 'Sunday', 'trip_id': 't2', 'shape_id': 's2'},
+    ])
+    write_table(tmp_path, 'calendar', [WEEKDAY, SUNDAY])
+    write_table(tmp_path, 'calendar_dates', EXCEPTIONS)
+    return StaticFeed(str(tmp_path))
+
+
+def test_services_on_and_route_filters_agree(feed):
+    for date, services, shapes in [
+        (datetime.date(2025, 3, 4), {'Weekday'}, ['s1']),
+        (datetime.date(2025, 3, 10), {'Sunday'}, ['s2']),  # Holiday exception
+        (datetime.date(2025, 3, 8), set(), []),  # Covered, nothing runs
+        (datetime.date(2026, 10, 19), {'Sunday'}, ['s2']),  # Monday after expiry -> holiday Monday 20250310
+        (datetime.date(2026, 10, 20), {'Weekday'}, ['s1']),
+    ]:
+        assert feed.services_on(date) == services, date
+        assert [shape_id for shape_id, _ in feed.route_shapes_on('A', date)] == shapes, date
+
+
+def test_feed_without_calendar_runs_every_service(tmp_path, feed):
+    (tmp_path / 'calendar.txt').unlink()
+    (tmp_path / 'calendar_dates.txt').unlink()
+    feed = StaticFeed(str(tmp_path))
+    assert feed.services_on(datetime.date(2025, 3, 8)) == {'Weekday', 'Sunday'}
+    assert sorted(shape_id for shape_id, _ in feed.route_shapes_on('A', datetime.date(2025, 3, 8))) == ['s1', 's2']
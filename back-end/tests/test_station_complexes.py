@@ -0,0 +1,49 @@
+from utils.station_complexes import StationComplexes
+
+
+def station(name, parent=''):
+    return {'stop_name': name, 'parent_station': parent, 'location_type': '' if parent else '1'}
+
+
+def transfer(source, target, seconds='180', transfer_type='2'):
+    return {'from_stop_id': source, 'to_stop_id': target, 'transfer_type': transfer_type, 'min_transfer_time': seconds}
+
+
+def complexes():
+    stops = {
+        '127': station('Times Sq-42 St'), '127N': station('Times Sq-42 St', '127'),
+        '725': station('Times Sq-42 St'), '725S': station('Times Sq-42 St', '725'),
+        '902': station('Times Sq-42 St'),
+        'A27': station('42 St-Port Authority Bus Terminal'),
+        'D17': station('34 St-Herald Sq'), 'D17N': station('34 St-Herald Sq', 'D17'),
+    }
+    transfers = [
+        transfer('127', '725'), transfer('725', '127'),
+        transfer('127', '902', '300'),
+        transfer('127', 'A27', transfer_type='3'),  # Not possible, but still one complex
+        transfer('127', 'Z99'),  # Unknown stops are ignored
+    ]
+    return StationComplexes(stops, transfers, lambda: {'1': {'127N'}, '7': {'725S'}, 'D': {'D17N'}})
+
+
+def test_parents_and_transfers_merge_into_complexes():
+    graph = complexes()
+
+    assert len(graph) == 2
+    assert {graph.complex_id(stop_id) for stop_id in ('127N', '725S', '902', 'A27')} == {'127'}
+    assert graph.members('127') == ['127', '127N', '725', '725S', '902', 'A27']
+    assert graph.members('D17') == ['D17', 'D17N']
+    assert graph.complex_id('Z99') is None
+
+
+def test_routes_and_transfers_of_a_complex():
+    graph = complexes()
+
+    assert graph.routes('127') == ['1', '7'] and graph.routes('D17') == ['D']
+    assert graph.transfers_from('127') == [('725', 180), ('902', 300)]
+    assert graph.transfers_from('A27') == [] and graph.transfers_from('Z99') == []
+
+    described = graph.describe('127')
+    assert described["name"] == 'Times Sq-42 St'
+    assert [s["id"] for s in described["stations"]] == ['127', '725', '902', 'A27']
+    assert len(described["transfers"]) == 3
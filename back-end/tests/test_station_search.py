@@ -0,0 +1,51 @@
+from types import SimpleNamespace
+import pytest
+from utils.station_search import StationIndex, edit_distance, normalize_tokens
+
+
+def stop(name, parent='', location_type=''):
+    return {'stop_name': name, 'stop_lat': '40.75', 'stop_lon': '-73.98',
+            'parent_station': parent, 'location_type': location_type}
+
+
+@pytest.fixture
+def index():
+    subway = {
+        '127': stop('Times Sq-42 St', location_type='1'),
+        '127N': stop('Times Sq-42 St', '127'),
+        '127S': stop('Times Sq-42 St', '127'),
+        'A27': stop('42 St-Port Authority Bus Terminal', location_type='1'),
+        'D17': stop('34 St-Herald Sq', location_type='1'),
+        'S30': stop('Tompkinsville', location_type='1'),
+    }
+    lirr = {'237': stop('Penn Station'), '214': stop('Times Square Shuttle Test')}
+    return StationIndex({'subway': SimpleNamespace(stops=subway), 'lirr': SimpleNamespace(stops=lirr)})
+
+
+def test_normalize_tokens():
+    assert normalize_tokens('Times Square - 42nd Street') == ['times', 'sq', '42', 'st']
+    assert normalize_tokens("Prince's Bay Av") == ['princes', 'bay', 'av']
+    assert edit_distance('tims', 'times', 1) == 1
+    assert edit_distance('tiems', 'times', 1) == 1  # Transposition
+
+
+def test_misspelled_query_finds_the_station(index):
+    [first] = index.search('tims sq', limit=1)
+    assert (first["id"], first["name"], first["agency"]) == ('127', 'Times Sq-42 St', 'subway')
+    assert first["platforms"] == ['127N', '127S']
+
+
+def test_words_match_in_any_order(index):
+    [result] = index.search('42nd street times square')
+    assert result["id"] == '127'
+    # Names with fewer other words rank first
+    assert [station["id"] for station in index.search('times sq')] == ['127', '214']
+
+
+def test_prefixes_and_agency_filter(index):
+    assert {station["id"] for station in index.search('42')} == {'127', 'A27'}
+    assert [station["id"] for station in index.search('her')] == ['D17']
+    assert [station["id"] for station in index.search('times', agency='lirr')] == ['214']
+    # Platforms are folded into their station
+    assert all(station["id"] not in ('127N', '127S') for station in index.search('times sq 42'))
+    assert index.search('') == []
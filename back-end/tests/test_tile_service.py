@@ -0,0 +1,147 @@
+import os
+import struct
+from types import SimpleNamespace
+import pytest
+from services import tile_service
+from services.tile_service import EMPTY_TILE, TileService, lonlat_to_tile
+from utils.admission import CostClass, Overloaded, admission
+from utils.cache import cache
+
+
+def read_message(data):
+    """Decode protobuf fields: field number -> list of varints, bytes or fixed-width values"""
+    fields, pos = {}, 0
+
+    def varint():
+        nonlocal pos
+        value = shift = 0
+        while True:
+            byte = data[pos]
+            pos += 1
+            value |= (byte & 0x7F) << shift
+            shift += 7
+            if not byte & 0x80:
+                return value
+
+    while pos < len(data):
+        tag = varint()
+        wire_type = tag & 0x7
+        if wire_type == 0:
+            value = varint()
+        elif wire_type == 1:
+            value, pos = struct.unpack('<d', data[pos:pos + 8])[0], pos + 8
+        else:
+            length = varint()
+            value, pos = data[pos:pos + length], pos + length
+        fields.setdefault(tag >> 3, []).append(value)
+    return fields
+
+
+def packed(data):
+    values, pos = [], 0
+    while pos < len(data):
+        value = shift = 0
+        while True:
+            byte = data[pos]
+            pos += 1
+            value |= (byte & 0x7F) << shift
+            shift += 7
+            if not byte & 0x80:
+                break
+        values.append(value)
+    return values
+
+
+def decode_tile(data):
+    """Decode an MVT into {layer name: [(type, properties, first point)]}"""
+    layers = {}
+    for raw_layer in read_message(data).get(3, []):
+        layer = read_message(raw_layer)
+        keys = [key.decode() for key in layer.get(3, [])]
+        values = []
+        for raw_value in layer.get(4, []):
+            value = read_message(raw_value)
+            values.append(value[1][0].decode() if 1 in value else next(iter(value.values()))[0])
+
+        features = []
+        for raw_feature in layer.get(2, []):
+            feature = read_message(raw_feature)
+            tags = packed(feature[2][0])
+            geometry = packed(feature[4][0])
+            zigzag = [(n >> 1) ^ -(n & 1) for n in geometry[1:3]]
+            properties = {keys[tags[i]]: values[tags[i + 1]] for i in range(0, len(tags), 2)}
+            features.append((feature[3][0], properties, tuple(zigzag)))
+        layers[layer[1][0].decode()] = features
+    return layers
+
+
+@pytest.fixture
+def feed():
+    return SimpleNamespace(
+        version='v1',
+        routes={'A': {'route_id': 'A', 'route_color': '0039A6'}},
+        trips={'t1': {'route_id': 'A', 'shape_id': 'A..N'}},
+        shapes={'A..N': [(40.745, -73.995), (40.770, -73.975)]},
+        stops={
+            'A27': {'stop_name': 'Times Sq-42 St', 'stop_lat': '40.757', 'stop_lon': '-73.989', 'location_type': '1'},
+            'A27N': {'stop_name': 'Times Sq-42 St', 'stop_lat': '40.757', 'stop_lon': '-73.989',
+                     'parent_station': 'A27', 'location_type': ''}
+        }
+    )
+
+
+@pytest.fixture
+def tile_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(tile_service, 'TILE_CACHE_DIR', str(tmp_path))
+    cache.clear()
+    yield tmp_path
+    cache.clear()
+
+
+def test_rendered_tile_decodes(feed):
+    x, y = lonlat_to_tile(-73.989, 40.757, 14)
+    layers = decode_tile(TileService(feed).render(14, x, y))
+
+    assert [(kind, properties) for kind, properties, _ in layers['routes']] == [
+        (2, {"shape_id": 'A..N', "route_id": 'A', "color": '#0039A6'})]
+    [(kind, properties, point)] = layers['stations']
+    assert (kind, properties) == (1, {"id": 'A27', "name": 'Times Sq-42 St'})
+    assert all(0 <= coordinate < 4096 for coordinate in point)
+
+    # Stations are left out when zoomed out
+    x, y = lonlat_to_tile(-73.989, 40.757, 9)
+    assert 'stations' not in decode_tile(TileService(feed).render(9, x, y))
+
+
+def test_tiles_outside_the_extent_are_not_stored(feed, tile_dir):
+    tiles = TileService(feed)
+    x, y = lonlat_to_tile(2.35, 48.85, 14)  # Paris
+    assert tiles.get_tile(14, x, y, 60) is EMPTY_TILE
+    assert os.listdir(tile_dir) == []
+    assert not cache.cache
+
+
+def test_disk_cache_is_versioned(feed, tile_dir):
+    x, y = lonlat_to_tile(-73.989, 40.757, 14)
+    data = TileService(feed).get_tile(14, x, y, 60)
+    assert os.listdir(tile_dir / 'subway' / 'v1' / '14' / str(x)) == [f"{y}.mvt"]
+
+    # A new feed version renders afresh instead of reading the old tile
+    feed.version = 'v2'
+    feed.stops = {}
+    cache.clear()
+    assert TileService(feed).get_tile(14, x, y, 60) != data
+    assert (tile_dir / 'subway' / 'v2' / '14' / str(x) / f"{y}.mvt").exists()
+
+
+def test_rendering_takes_an_admission_slot(feed, tile_dir, monkeypatch):
+    limiter = CostClass('static', concurrency=1, queue=0, timeout=0.1)
+    monkeypatch.setitem(admission.classes, 'static', limiter)
+    monkeypatch.setattr(admission, 'enabled', True)
+    x, y = lonlat_to_tile(-73.989, 40.757, 14)
+
+    limiter.acquire()
+    with pytest.raises(Overloaded):
+        TileService(feed).get_tile(14, x, y, 60)
+    limiter.release(0.01)
+    assert TileService(feed).get_tile(14, x, y, 60)
@@ -0,0 +1,76 @@
+import datetime
+import pytest
+from tests.conftest import FakeFeed, hms
+from utils.timetable import Timetable
+
+MONDAY, TUESDAY = datetime.date(2025, 3, 10), datetime.date(2025, 3, 11)
+
+
+def station(stop_id, parent=''):
+    return {'stop_id': stop_id, 'parent_station': parent, 'location_type': '' if parent else '1'}
+
+
+@pytest.fixture
+def timetable():
+    stops = {stop_id: station(stop_id) for stop_id in ('S1', 'S2', 'S3', 'S4', 'S5')}
+    stops.update({f"{stop_id}N": station(f"{stop_id}N", stop_id) for stop_id in ('S1', 'S2', 'S3', 'S4', 'S5')})
+    stops['S2N_BA'] = station('S2N_BA', 'S2N')  # Boarding area below a platform
+    trips = {trip_id: {'service_id': service_id} for trip_id, service_id in (
+        ('T1', 'Weekday'), ('T2', 'Weekday'), ('T3', 'Weekday'), ('T4', 'Weekday'), ('T5', 'Sunday'))}
+    stop_times = {
+        'T1': [('S1N', '08:00'), ('S2N', '08:10'), ('S3N', '08:20')],
+        'T2': [('S2N', '08:11'), ('S4N', '08:20')],  # Leaves before the change time at S2 has passed
+        'T3': [('S2N', '08:15'), ('S4N', '08:25')],
+        'T4': [('S1N', '24:30'), ('S2N', '24:40')],  # Runs past midnight
+        'T5': [('S1N', '08:01'), ('S4N', '08:05')],  # Not running on weekdays
+    }
+    transfers = [
+        {'from_stop_id': 'S2', 'to_stop_id': 'S2', 'transfer_type': '2', 'min_transfer_time': '120'},
+        {'from_stop_id': 'S3', 'to_stop_id': 'S5', 'transfer_type': '2', 'min_transfer_time': '180'},
+    ]
+    return Timetable(FakeFeed(trips, stop_times, stops, transfers))
+
+
+def arrivals(timetable, origin, departure, horizon, date):
+    reached = timetable.earliest_arrivals(timetable.station_codes[origin], hms(departure), horizon * 60, date)
+    return {timetable.station_ids[code]: seconds for code, seconds in reached.items()}
+
+
+def test_platforms_and_boarding_areas_fold_into_stations(timetable):
+    assert timetable.station_codes['S2N'] == timetable.station_codes['S2']
+    assert timetable.station_codes['S2N_BA'] == timetable.station_codes['S2']
+    assert sorted(timetable.station_ids) == ['S1', 'S2', 'S3', 'S4', 'S5']
+
+
+def test_connection_scan(timetable):
+    reached = arrivals(timetable, 'S1', '08:00', 60, MONDAY)
+
+    # Staying on the boarded trip is not subject to the change time at S2
+    assert reached['S3'] == hms('08:20')
+    # The change at S2 (120 s) misses T2 at 08:11 and catches T3 at 08:15
+    assert reached['S4'] == hms('08:25')
+    # Walking transfer from S3
+    assert reached['S5'] == hms('08:23')
+    assert reached['S1'] == hms('08:00')
+
+
+def test_departure_and_horizon_bound_the_scan(timetable):
+    # T1 has left
+    assert arrivals(timetable, 'S1', '08:01', 60, MONDAY) == {'S1': hms('08:01')}
+    # Within 20 minutes only S2 and S3 are reached
+    assert set(arrivals(timetable, 'S1', '08:00', 20, MONDAY)) == {'S1', 'S2', 'S3'}
+
+
+def test_only_active_services_run(timetable):
+    # T5 (08:01) only runs on Sundays
+    assert arrivals(timetable, 'S1', '08:01', 30, MONDAY) == {'S1': hms('08:01')}
+    # On Sunday T5 runs and the weekday trips do not
+    assert arrivals(timetable, 'S1', '08:00', 60, datetime.date(2025, 3, 9)) == {'S1': hms('08:00'), 'S4': hms('08:05')}
+
+
+def test_overnight_trips_run_on_the_next_day(timetable):
+    # Monday's T4 departs at 24:30, i.e. 00:30 on Tuesday
+    reached = arrivals(timetable, 'S1', '00:20', 30, TUESDAY)
+    assert reached['S2'] == hms('00:40')
+    # Tuesday's own T4 has not run by then, and Monday's T4 did not run after Sunday
+    assert 'S2' not in arrivals(timetable, 'S1', '00:20', 30, MONDAY)
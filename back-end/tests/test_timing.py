@@ -0,0 +1,62 @@
+import re
+import time
+from flask import Flask, jsonify
+from utils import timing
+from utils.timing import PhaseStats, PhaseTimer, phase_stats, timer
+
+
+def test_phases_accumulate_per_request():
+    phases = PhaseTimer()
+    with phases.phase('fetch'):
+        pass
+    assert phases.end() is None  # Not recording outside a request
+
+    phases.begin()
+    phases.set_feed('subway_ace')
+    for _ in range(2):
+        with phases.phase('parse'):
+            time.sleep(0.005)
+    feed, recorded, total = phases.end()
+    assert feed == 'subway_ace' and list(recorded) == ['parse']
+    assert 0.01 <= recorded['parse'] <= total
+    assert phases.end() is None
+
+
+def test_server_timing_header(capsys):
+    app = Flask(__name__)
+    timing.init_app(app, log=True)
+
+    @app.route('/feed')
+    def feed():
+        timer.set_feed('test_feed')
+        with timer.phase('fetch'):
+            time.sleep(0.002)
+        return jsonify({"entities": []})
+
+    @app.route('/plain')
+    def plain():
+        return 'ok'
+
+    response = app.test_client().get('/feed')
+    header = response.headers['Server-Timing']
+    assert re.fullmatch(r'fetch;dur=[\d.]+, serialize;dur=[\d.]+, total;dur=[\d.]+', header)
+    assert float(header.split('dur=')[1].split(',')[0]) >= 2.0
+
+    # Requests serving a feed are aggregated and logged; others only get the header
+    assert phase_stats.summary()['test_feed']["requests"] >= 1
+    assert '"feed": "test_feed"' in capsys.readouterr().out
+    response = app.test_client().get('/plain')
+    assert re.fullmatch(r'total;dur=[\d.]+', response.headers['Server-Timing'])
+    assert capsys.readouterr().out == ''
+
+
+def test_phase_stats_name_the_dominant_phase():
+    stats = PhaseStats()
+    stats.record('subway_ace', {'fetch': 0.2, 'parse': 0.01}, 0.25)
+    stats.record('subway_ace', {'parse': 0.01, 'serialize': 0.02}, 0.04)
+
+    summary = stats.summary()['subway_ace']
+    assert summary["requests"] == 2
+    assert summary["dominant_phase"] == 'fetch'
+    assert summary["phases"]["parse"]["samples"] == 2
+    assert summary["phases"]["total"]["max_ms"] == 250.0
@@ -0,0 +1,195 @@
+"""Admission control for expensive cold computations"""
+import contextlib
+import math
+import threading
+import time
+from flask import jsonify
+from config import ADMISSION_ENABLED, ADMISSION_CLASSES
+from utils.metrics import metrics
+
+shed_total = metrics.counter(
+    'admission_shed_total', 'Requests rejected by admission control', ('cost_class', 'reason'))
+wait_duration = metrics.histogram(
+    'admission_wait_seconds', 'Time admitted requests spent queued', ('cost_class',))
+
+
+class Overloaded(Exception):
+    """
+    Raised when a cost class cannot admit a computation in time
+    """
+
+    def __init__(self, cost_class, reason, retry_after):
+        super().__init__(f"Too many concurrent {cost_class} requests ({reason})")
+        self.cost_class = cost_class
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class CostClass:
+    """
+    Concurrency limit with a bounded, deadline-limited wait queue
+    """
+
+    def __init__(self, name, concurrency, queue, timeout):
+        """
+        Args:
+            name (str): Cost class name
+            concurrency (int): Computations running at once
+            queue (int): Computations allowed to wait for a slot
+            timeout (float): Longest wait for a slot, in seconds
+        """
+        self.name = name
+        self.concurrency = concurrency
+        self.queue = queue
+        self.timeout = timeout
+        self.active = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.shed = 0
+        self.service_time = None  # Moving average of computation time, in seconds
+        self._cond = threading.Condition()
+
+    def _estimated_wait(self):
+        # Lower bound: every waiter ahead of us, and us, need a full computation on some slot
+        if self.service_time is None:
+            return 0.0
+        return (self.waiting + 1) / self.concurrency * self.service_time
+
+    def _reject(self, reason):
+        # Retry once the queue is expected to have drained
+        wait = self._estimated_wait() if self.service_time is not None else self.timeout
+        self.shed += 1
+        shed_total.inc(self.name, reason)
+        raise Overloaded(self.name, reason, max(1, math.ceil(wait)))
+
+    def acquire(self):
+        """
+        Take a slot, waiting up to the timeout
+
+        Raises:
+            Overloaded: The queue is full, or no slot can be had before the deadline
+        """
+        start = time.monotonic()
+        with self._cond:
+            if self.active >= self.concurrency:
+                if self.waiting >= self.queue:
+                    self._reject('queue_full')
+                # Fail fast rather than hold a request thread for a wait that cannot succeed
+                if self._estimated_wait() > self.timeout:
+                    self._reject('deadline')
+
+                deadline = start + self.timeout
+                self.waiting += 1
+                try:
+                    while self.active >= self.concurrency:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._reject('deadline')
+                        self._cond.wait(remaining)
+                finally:
+                    self.waiting -= 1
+
+            self.active += 1
+            self.admitted += 1
+        wait_duration.observe(time.monotonic() - start, self.name)
+
+    def release(self, elapsed):
+        """
+        Return a slot
+
+        Args:
+            elapsed (float): Seconds the computation held the slot
+        """
+        with self._cond:
+            self.active -= 1
+            self.service_time = elapsed if self.service_time is None else 0.8 * self.service_time + 0.2 * elapsed
+            self._cond.notify()
+
+    def get_stats(self):
+        with self._cond:
+            return {
+                "concurrency": self.concurrency,
+                "queue": self.queue,
+                "timeout": self.timeout,
+                "in_flight": self.active,
+                "queued": self.waiting,
+                "admitted": self.admitted,
+                "shed": self.shed,
+                "service_time_ms": None if self.service_time is None else round(self.service_time * 1000, 3)
+            }
+
+
+class AdmissionController:
+    """
+    Per-cost-class limits on computations that miss the cache
+
+    Callers take a slot only after their cache lookup misses, so cached
+    responses are never queued behind cold builds; a burst of cold requests
+    waits briefly for a slot and is then rejected with a retry hint instead
+    of occupying every request thread.
+    """
+
+    def __init__(self, classes=ADMISSION_CLASSES, enabled=ADMISSION_ENABLED):
+        """
+        Args:
+            classes (dict): Cost class name -> {'concurrency', 'queue', 'timeout'}
+            enabled (bool): Admit everything immediately when False
+        """
+        self.enabled = enabled
+        self.classes = {name: CostClass(name, **limits) for name, limits in classes.items()}
+
+    @contextlib.contextmanager
+    def slot(self, cost_class):
+        """
+        Run a block holding a slot of a cost class
+
+        Args:
+            cost_class (str): Cost class name
+
+        Raises:
+            Overloaded: No slot could be had in time
+        """
+        limiter = self.classes.get(cost_class)
+        if not self.enabled or limiter is None:
+            yield
+            return
+
+        limiter.acquire()
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            limiter.release(time.monotonic() - start)
+
+    def get_stats(self):
+        """
+        Get per-class limits and load
+
+        Returns:
+            dict: Cost class -> limits, in-flight and queued computations, admitted and shed counts
+        """
+        return {"enabled": self.enabled, "classes": {name: limiter.get_stats() for name, limiter in self.classes.items()}}
+
+
+def init_app(app):
+    """
+    Answer Overloaded with 503 and a Retry-After header
+
+    Args:
+        app (Flask): Application
+    """
+    @app.errorhandler(Overloaded)
+    def overloaded(e):
+        response = jsonify({"error": str(e), "cost_class": e.cost_class, "retry_after": e.retry_after})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response
+
+
+# Create global instance
+admission = AdmissionController()
+
+metrics.callback('admission_in_flight', 'Computations holding an admission slot', ('cost_class',),
+                 lambda: {(name,): limiter.active for name, limiter in admission.classes.items()})
+metrics.callback('admission_queue_depth', 'Computations waiting for an admission slot', ('cost_class',),
+                 lambda: {(name,): limiter.waiting for name, limiter in admission.classes.items()})
@@ -1,5 +1,24 @@
 import time
 
+# Multi-word cache key prefixes; other keys are grouped by their first word
+KEY_FAMILIES = ('line_shape', 'route_stops')
+
+
+def key_family(key):
+   """
+   Get the family of a cache key, e.g. 'subway' for 'subway_ace'
+
+   Args:
+       key (str): Cache key
+
+   Returns:
+       str: Key family
+   """
+   for family in KEY_FAMILIES:
+       if key.startswith(family):
+           return family
+   return key.split('_', 1)[0]
+
 
 class SimpleCache:
    """
@@ -9,6 +28,14 @@ class SimpleCache:
    def __init__(self):
        self.cache = {}  # Cache data storage
        self.timestamps = {}  # Timestamp storage
+       self.counters = {}  # Key family -> [hits, misses, evictions]
+
+   def _count(self, key, index):
+       family = key_family(key)
+       counters = self.counters.get(family)
+       if counters is None:
+           counters = self.counters[family] = [0, 0, 0]
+       counters[index] += 1
 
    def get(self, key, timeout=60):
        """
@@ -23,6 +50,7 @@ class SimpleCache:
        """
        # Check if key exists
        if key not in self.cache:
+           self._count(key, 1)
            return None
 
        # Check if expired
@@ -30,20 +58,24 @@ class SimpleCache:
        if current_time - self.timestamps[key] > timeout:
            # Remove expired data
            self.remove(key)
+           self._count(key, 1)
+           self._count(key, 2)
            return None
 
+       self._count(key, 0)
        return self.cache[key]
 
-   def set(self, key, value):
+   def set(self, key, value, timestamp=None):
        """
        Set cache data
 
        Args:
            key (str): Cache key
            value (any): Data to cache
+           timestamp (float): When the data was produced, for expiry (default: now)
        """
        self.cache[key] = value
-       self.timestamps[key] = time.time()
+       self.timestamps[key] = time.time() if timestamp is None else timestamp
 
    def remove(self, key):
        """
@@ -68,9 +100,18 @@ class SimpleCache:
        Returns:
            dict: Dictionary with cache stats
        """
+       families = {
+           family: {"hits": hits, "misses": misses, "evictions": evictions, "entries": 0}
+           for family, (hits, misses, evictions) in list(self.counters.items())
+       }
+       for key in list(self.cache):
+           families.setdefault(key_family(key), {"hits": 0, "misses": 0, "evictions": 0, "entries": 0})
+           families[key_family(key)]["entries"] += 1
+
        return {
            "total_keys": len(self.cache),
-           "keys": list(self.cache.keys())
+           "keys": list(self.cache.keys()),
+           "families": families
        }
 
 
@@ -0,0 +1,166 @@
+import bisect
+import collections
+import datetime
+import os
+import struct
+import threading
+import zlib
+
+# Record header: fetch timestamp (float64) and compressed payload length (uint32)
+RECORD_HEADER = struct.Struct('<dI')
+
+
+class FeedArchive:
+    """
+    Append-only archive of raw GTFS-RT snapshots
+
+    Snapshots are stored as zlib-compressed upstream protobuf payloads in
+    hourly partitions (<root>/<feed>/<YYYY-MM-DD>/<HH>.gtfsrt.z, UTC), so any
+    historical timestamp can be replayed through the regular parser.
+    """
+
+    def __init__(self, root, compression_level=6, lookback_hours=2, max_indexes=64):
+        self.root = root
+        self.compression_level = compression_level
+        self.lookback_hours = lookback_hours
+        self.max_indexes = max_indexes  # Partition indexes kept in memory
+        self._lock = threading.Lock()
+        self._indexes = collections.OrderedDict()  # partition path -> (file size, timestamps, offsets), LRU
+
+    def _partition_path(self, feed_key, timestamp):
+        """
+        Get the partition file holding a timestamp
+
+        Args:
+            feed_key (str): Archived feed key (e.g. 'subway_ace')
+            timestamp (float): Unix timestamp
+
+        Returns:
+            str: Partition file path
+        """
+        moment = datetime.datetime.fromtimestamp(timestamp, tz=datetime.timezone.utc)
+        return os.path.join(self.root, feed_key, moment.strftime('%Y-%m-%d'), f"{moment.strftime('%H')}.gtfsrt.z")
+
+    def record(self, feed_key, raw, timestamp):
+        """
+        Append a snapshot to the archive
+
+        Args:
+            feed_key (str): Archived feed key
+            raw (bytes): Raw upstream protobuf payload
+            timestamp (float): Fetch time
+        """
+        payload = zlib.compress(raw, self.compression_level)
+        path = self._partition_path(feed_key, timestamp)
+
+        try:
+            with self._lock:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, 'ab') as f:
+                    f.write(RECORD_HEADER.pack(timestamp, len(payload)) + payload)
+        except OSError as e:
+            print(f"Archive write failed for {feed_key}: {str(e)}")
+
+    def _index(self, path):
+        """
+        Get the (timestamps, offsets) index of a partition file
+
+        Only record headers are read; the index is reused until the file grows.
+
+        Args:
+            path (str): Partition file path
+
+        Returns:
+            tuple: (list of timestamps, list of payload offsets), empty if missing
+        """
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return [], []
+
+        with self._lock:
+            cached = self._indexes.get(path)
+            if cached and cached[0] == size:
+                self._indexes.move_to_end(path)
+                return cached[1], cached[2]
+
+        timestamps, offsets = [], []
+        with open(path, 'rb') as f:
+            position = 0
+            while position + RECORD_HEADER.size <= size:
+                f.seek(position)
+                timestamp, length = RECORD_HEADER.unpack(f.read(RECORD_HEADER.size))
+                if position + RECORD_HEADER.size + length > size:
+                    break  # Record still being written
+                timestamps.append(timestamp)
+                offsets.append(position)
+                position += RECORD_HEADER.size + length
+
+        with self._lock:
+            self._indexes[path] = (size, timestamps, offsets)
+            self._indexes.move_to_end(path)
+            while len(self._indexes) > self.max_indexes:
+                self._indexes.popitem(last=False)
+        return timestamps, offsets
+
+    def _read(self, path, offset):
+        """
+        Read and decompress the record at an offset
+
+        Args:
+            path (str): Partition file path
+            offset (int): Record offset
+
+        Returns:
+            tuple: (fetch timestamp, raw payload)
+        """
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            timestamp, length = RECORD_HEADER.unpack(f.read(RECORD_HEADER.size))
+            return timestamp, zlib.decompress(f.read(length))
+
+    def snapshot_at(self, feed_key, timestamp):
+        """
+        Get the snapshot that was live at a given time
+
+        Args:
+            feed_key (str): Archived feed key
+            timestamp (float): Unix timestamp to replay
+
+        Returns:
+            tuple: (fetch timestamp, raw payload) or None if nothing was archived
+        """
+        for hours_back in range(self.lookback_hours + 1):
+            try:
+                path = self._partition_path(feed_key, timestamp - hours_back * 3600)
+            except (ValueError, OverflowError, OSError):
+                return None  # Not a representable time
+            timestamps, offsets = self._index(path)
+
+            # Latest record at or before the requested time
+            i = bisect.bisect_right(timestamps, timestamp) - 1
+            if i >= 0:
+                return self._read(path, offsets[i])
+
+        return None
+
+    def snapshots(self, feed_key, start, end):
+        """
+        Iterate over archived snapshots in a time range
+
+        Args:
+            feed_key (str): Archived feed key
+            start (float): Range start (inclusive)
+            end (float): Range end (inclusive)
+
+        Yields:
+            tuple: (fetch timestamp, raw payload)
+        """
+        hour = start - start % 3600
+        while hour <= end:
+            path = self._partition_path(feed_key, hour)
+            timestamps, offsets = self._index(path)
+            for timestamp, offset in zip(timestamps, offsets):
+                if start <= timestamp <= end:
+                    yield self._read(path, offset)
+            hour += 3600
@@ -0,0 +1,125 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+class FeedStore:
+    """
+    Persistent last-known-good store for upstream feeds
+
+    Keeps the most recent successful raw payload and parsed result for each
+    cache key in a small SQLite database, so a restarted process can serve
+    data before its first upstream refresh.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        """
+        Open the database on first use
+
+        Returns:
+            sqlite3.Connection: Open connection
+        """
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS feeds ("
+                "cache_key TEXT PRIMARY KEY, "
+                "fetched_at REAL NOT NULL, "
+                "raw BLOB, "
+                "parsed TEXT NOT NULL)"
+            )
+            conn.commit()
+            self._conn = conn
+
+        return self._conn
+
+    def save(self, key, raw, parsed):
+        """
+        Persist the latest successful payload for a feed
+
+        Args:
+            key (str): Cache key
+            raw (bytes): Raw upstream payload
+            parsed (any): JSON-serializable parsed result
+        """
+        try:
+            with self._lock:
+                conn = self._connect()
+                conn.execute(
+                    "INSERT OR REPLACE INTO feeds (cache_key, fetched_at, raw, parsed) VALUES (?, ?, ?, ?)",
+                    (key, time.time(), raw, json.dumps(parsed, separators=(',', ':')))
+                )
+                conn.commit()
+        except (sqlite3.Error, OSError, TypeError, ValueError) as e:
+            print(f"Feed store write failed for {key}: {str(e)}")
+
+    def load(self, key):
+        """
+        Load the last-known-good entry for a feed
+
+        Args:
+            key (str): Cache key
+
+        Returns:
+            dict: Entry with 'fetched_at', 'raw' and 'parsed', or None if not stored
+        """
+        try:
+            with self._lock:
+                row = self._connect().execute(
+                    "SELECT fetched_at, raw, parsed FROM feeds WHERE cache_key = ?", (key,)
+                ).fetchone()
+        except (sqlite3.Error, OSError) as e:
+            print(f"Feed store read failed for {key}: {str(e)}")
+            return None
+
+        if row is None:
+            return None
+
+        return {"fetched_at": row[0], "raw": row[1], "parsed": json.loads(row[2])}
+
+    def load_all(self, max_age=None):
+        """
+        Load every stored entry
+
+        Args:
+            max_age (int): Skip entries older than this many seconds
+
+        Returns:
+            dict: Mapping of cache key to entry
+        """
+        query = "SELECT cache_key, fetched_at, raw, parsed FROM feeds"
+        params = ()
+        if max_age is not None:
+            query += " WHERE fetched_at >= ?"
+            params = (time.time() - max_age,)
+
+        try:
+            with self._lock:
+                rows = self._connect().execute(query, params).fetchall()
+        except (sqlite3.Error, OSError) as e:
+            print(f"Feed store read failed: {str(e)}")
+            return {}
+
+        return {
+            key: {"fetched_at": fetched_at, "raw": raw, "parsed": json.loads(parsed)}
+            for key, fetched_at, raw, parsed in rows
+        }
+
+    def close(self):
+        """Close the underlying database connection"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,187 @@
+import numpy as np
+
+HOURS = 48  # GTFS service-day hours run past 24
+DAY = 24 * 3600
+
+
+class FrequencyTable:
+    """
+    Scheduled departures and headways per route, direction, stop, service and hour
+
+    Built from the columnar stop_times in a few vectorized passes: rows are
+    sorted by (route, direction, service, stop) series and time, headways are
+    differences between consecutive departures of a series (attributed to
+    the hour of the later one), and per-hour groups are reduced with
+    reduceat. Groups are stored as sorted integer keys with the route as
+    the major component, so a route's rows are one binary-searched slice.
+    The sorted departure times are kept per series, so headways across
+    several services or stops can be taken from their merged departures.
+    """
+
+    def __init__(self, feed):
+        """
+        Build the table
+
+        Args:
+            feed (StaticFeed): Static feed with stop_times
+        """
+        stop_times = feed.stop_times
+        self.route_ids = list(feed.route_trips)
+        self.route_codes = {route_id: i for i, route_id in enumerate(self.route_ids)}
+        self.service_ids = sorted({trip['service_id'] for trip in feed.trips.values()})
+        service_codes = self._service_codes = {service_id: i for i, service_id in enumerate(self.service_ids)}
+        self.stop_ids = stop_times.stop_ids
+        self._stop_codes = {stop_id: i for i, stop_id in enumerate(self.stop_ids)}
+        n_services, n_stops = len(self.service_ids), len(self.stop_ids)
+
+        # Per-trip route, direction (0, 1, or 2 when unspecified) and service, -1 if not in trips.txt
+        n_trips = len(stop_times.trip_ids)
+        trip_route = np.full(n_trips, -1, dtype=np.int64)
+        trip_direction = np.zeros(n_trips, dtype=np.int64)
+        trip_service = np.zeros(n_trips, dtype=np.int64)
+        for i, trip_id in enumerate(stop_times.trip_ids):
+            trip = feed.trips.get(trip_id)
+            if trip is not None:
+                trip_route[i] = self.route_codes[trip['route_id']]
+                trip_direction[i] = int(trip['direction_id']) if trip.get('direction_id') in ('0', '1') else 2
+                trip_service[i] = service_codes[trip['service_id']]
+
+        times = np.where(stop_times.departure >= 0, stop_times.departure, stop_times.arrival).astype(np.int64)
+        valid = (trip_route[stop_times.trip] >= 0) & (times >= 0)
+        trip = stop_times.trip[valid]
+        times = times[valid]
+        series = ((trip_route[trip] * 3 + trip_direction[trip]) * n_services + trip_service[trip]) * n_stops \
+            + stop_times.stop[valid]
+
+        order = np.lexsort((times, series))
+        series, times = series[order], times[order]
+        hours = np.minimum(times // 3600, HOURS - 1)
+
+        # Headway before each departure within its series (NaN for the first)
+        headways = np.full(len(times), np.nan)
+        same = series[1:] == series[:-1]
+        headways[1:][same] = (times[1:] - times[:-1])[same]
+
+        groups = series * HOURS + hours
+        self.keys, starts = np.unique(groups, return_index=True)
+        self.trips = np.diff(np.append(starts, len(groups))).astype(np.int32)
+
+        has_headway = ~np.isnan(headways)
+        counts = np.add.reduceat(has_headway.astype(np.int32), starts)
+        sums = np.add.reduceat(np.where(has_headway, headways, 0), starts)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            self.headway_mean = np.where(counts > 0, sums / counts, np.nan).astype(np.float32)
+        self.headway_min = np.fmin.reduceat(headways, starts).astype(np.float32)
+        self.headway_max = np.fmax.reduceat(headways, starts).astype(np.float32)
+        self.headway_count = counts.astype(np.int32)
+
+        # Departure times of each series, a contiguous sorted run
+        self._series, series_starts = np.unique(series, return_index=True)
+        self._series_starts = np.append(series_starts, len(series))
+        self._times = times.astype(np.int32)
+
+        self._route_span = 3 * n_services * n_stops * HOURS
+        self._n_services, self._n_stops = n_services, n_stops
+
+    def __len__(self):
+        return len(self.keys)
+
+    def rows(self, route_id, stop_ids=None, service_ids=None, direction=None):
+        """
+        Get a route's frequency rows
+
+        Args:
+            route_id (str): Route ID
+            stop_ids (set): Only these stops
+            service_ids (set): Only these services
+            direction (int): Only this direction_id
+
+        Returns:
+            list: Rows by direction, stop, service and hour
+        """
+        code = self.route_codes.get(route_id)
+        if code is None:
+            return []
+
+        start, end = np.searchsorted(self.keys, [code * self._route_span, (code + 1) * self._route_span])
+        keys = self.keys[start:end]
+        series, hours = np.divmod(keys, HOURS)
+        series, stops = np.divmod(series, self._n_stops)
+        series, services = np.divmod(series, self._n_services)
+        directions = series % 3
+
+        keep = np.ones(len(keys), dtype=bool)
+        if stop_ids is not None:
+            keep &= np.isin(stops, [i for i, stop_id in enumerate(self.stop_ids) if stop_id in stop_ids])
+        if service_ids is not None:
+            keep &= np.isin(services, [i for i, service_id in enumerate(self.service_ids) if service_id in service_ids])
+        if direction is not None:
+            keep &= directions == direction
+
+        rows = []
+        for i in np.flatnonzero(keep).tolist():
+            j = start + i
+            rows.append({
+                "direction_id": int(directions[i]) if directions[i] < 2 else None,
+                "stop_id": self.stop_ids[stops[i]],
+                "service_id": self.service_ids[services[i]],
+                "hour": int(hours[i]),
+                "trips": int(self.trips[j]),
+                "headways": int(self.headway_count[j]),
+                "headway_mean": None if np.isnan(self.headway_mean[j]) else round(float(self.headway_mean[j]), 1),
+                "headway_min": None if np.isnan(self.headway_min[j]) else int(self.headway_min[j]),
+                "headway_max": None if np.isnan(self.headway_max[j]) else int(self.headway_max[j])
+            })
+        return rows
+
+    def _departures(self, code, direction, services, stops):
+        """Sorted departure times of one route and direction at some services and stops"""
+        wanted = ((code * 3 + direction) * self._n_services + np.array(services)[:, None]) * self._n_stops \
+            + np.array(stops)[None, :]
+        wanted = wanted.ravel()
+        found = np.minimum(np.searchsorted(self._series, wanted), len(self._series) - 1)
+        found = found[self._series[found] == wanted]
+        return np.sort(np.concatenate([self._times[self._series_starts[i]:self._series_starts[i + 1]]
+                                       for i in found.tolist()] or [np.empty(0, dtype=np.int32)]))
+
+    def scheduled_headway(self, route_id, stop_ids, service_ids, hour, direction=None, previous_service_ids=()):
+        """
+        Get the scheduled headway of a route at some stops in an hour
+
+        Departures of every stop and service given are merged within each
+        direction, so two services running at once give the combined
+        headway, while trains in opposite directions never count as
+        following each other. Without a direction, the headways of each
+        direction are pooled.
+
+        Args:
+            route_id (str): Route ID
+            stop_ids (set): Stops (e.g. a station's platforms)
+            service_ids (set): Active services
+            hour (int): Service-day hour
+            direction (int): Only this direction_id
+            previous_service_ids (set): Services of the previous day, whose
+                departures past 24:00 are merged in shifted back by a day
+
+        Returns:
+            tuple: (trips, mean headway in seconds or None)
+        """
+        code = self.route_codes.get(route_id)
+        stops = [self._stop_codes[stop_id] for stop_id in stop_ids if stop_id in self._stop_codes]
+        services = [self._service_codes[service_id] for service_id in service_ids if service_id in self._service_codes]
+        previous = [self._service_codes[service_id] for service_id in previous_service_ids
+                    if service_id in self._service_codes]
+        if code is None or not stops or not (services or previous) or not len(self._series):
+            return 0, None
+
+        trips, headways = 0, []
+        for d in (0, 1, 2) if direction is None else (direction,):
+            times = self._departures(code, d, services, stops) if services else np.empty(0, dtype=np.int32)
+            if previous:
+                times = np.sort(np.concatenate((times, self._departures(code, d, previous, stops) - DAY)))
+            in_hour = np.minimum(times // 3600, HOURS - 1) == hour
+            trips += int(in_hour.sum())
+            headways.append(np.diff(times)[in_hour[1:]])
+
+        headways = np.concatenate(headways)
+        return trips, (round(float(headways.mean()), 1) if len(headways) else None)
@@ -1,11 +1,16 @@
 from google.transit import gtfs_realtime_pb2
-import time
 import datetime
 
+# Entity payloads a FeedEntity can carry
+ENTITY_KINDS = ('trip_update', 'vehicle', 'alert')
 
-def parse_gtfs_rt(content, feed_id):
+
+def parse_feed(content, feed_id):
     """
-    Parse GTFS-RT data
+    Parse GTFS-RT data into the API representation
+
+    Optional fields absent from the message are omitted. Module-level so
+    it can run in a worker process (see utils.parse_pool).
 
     Args:
         content (bytes): GTFS-RT binary content
@@ -41,19 +46,25 @@ def parse_gtfs_rt(content, feed_id):
                         "trip_id": vehicle.trip.trip_id,
                         "route_id": vehicle.trip.route_id
                     },
-                    "timestamp": vehicle.timestamp,
-                    "human_time": datetime.datetime.fromtimestamp(vehicle.timestamp).strftime(
-                        '%Y-%m-%d %H:%M:%S') if vehicle.timestamp else None
+                    "timestamp": vehicle.timestamp
                 }
 
+                if vehicle.timestamp:
+                    vehicle_data["human_time"] = datetime.datetime.fromtimestamp(vehicle.timestamp).strftime(
+                        '%Y-%m-%d %H:%M:%S')
+
                 if vehicle.HasField('position'):
                     vehicle_data["position"] = {
                         "latitude": vehicle.position.latitude,
-                        "longitude": vehicle.position.longitude,
-                        "bearing": vehicle.position.bearing if vehicle.position.HasField('bearing') else None,
-                        "speed": vehicle.position.speed if vehicle.position.HasField('speed') else None
+                        "longitude": vehicle.position.longitude
                     }
 
+                    if vehicle.position.HasField('bearing'):
+                        vehicle_data["position"]["bearing"] = vehicle.position.bearing
+
+                    if vehicle.position.HasField('speed'):
+                        vehicle_data["position"]["speed"] = vehicle.position.speed
+
                 if vehicle.HasField('current_status'):
                     status_mapping = {
                         0: "INCOMING_AT",
@@ -75,32 +86,43 @@ def parse_gtfs_rt(content, feed_id):
                         "trip_id": trip_update.trip.trip_id,
                         "route_id": trip_update.trip.route_id
                     },
-                    "timestamp": trip_update.timestamp,
-                    "human_time": datetime.datetime.fromtimestamp(trip_update.timestamp).strftime(
-                        '%Y-%m-%d %H:%M:%S') if trip_update.timestamp else None,
                     "stop_time_updates": []
                 }
 
+                if trip_update.trip.HasField('start_date'):
+                    update_data["trip"]["start_date"] = trip_update.trip.start_date
+
+                if trip_update.HasField('timestamp'):
+                    update_data["timestamp"] = trip_update.timestamp
+                    update_data["human_time"] = datetime.datetime.fromtimestamp(trip_update.timestamp).strftime(
+                        '%Y-%m-%d %H:%M:%S')
+
                 for stop_time in trip_update.stop_time_update:
                     stop_data = {"stop_id": stop_time.stop_id}
 
                     if stop_time.HasField('arrival'):
-                        arrival_time = datetime.datetime.fromtimestamp(
-                            stop_time.arrival.time) if stop_time.arrival.time else None
-                        stop_data["arrival"] = {
-                            "time": stop_time.arrival.time,
-                            "human_time": arrival_time.strftime('%Y-%m-%d %H:%M:%S') if arrival_time else None,
-                            "delay": stop_time.arrival.delay if stop_time.arrival.HasField('delay') else None
-                        }
+                        arrival_data = {"time": stop_time.arrival.time}
+
+                        if stop_time.arrival.time:
+                            arrival_data["human_time"] = datetime.datetime.fromtimestamp(
+                                stop_time.arrival.time).strftime('%Y-%m-%d %H:%M:%S')
+
+                        if stop_time.arrival.HasField('delay'):
+                            arrival_data["delay"] = stop_time.arrival.delay
+
+                        stop_data["arrival"] = arrival_data
 
                     if stop_time.HasField('departure'):
-                        departure_time = datetime.datetime.fromtimestamp(
-                            stop_time.departure.time) if stop_time.departure.time else None
-                        stop_data["departure"] = {
-                            "time": stop_time.departure.time,
-                            "human_time": departure_time.strftime('%Y-%m-%d %H:%M:%S') if departure_time else None,
-                            "delay": stop_time.departure.delay if stop_time.departure.HasField('delay') else None
-                        }
+                        departure_data = {"time": stop_time.departure.time}
+
+                        if stop_time.departure.time:
+                            departure_data["human_time"] = datetime.datetime.fromtimestamp(
+                                stop_time.departure.time).strftime('%Y-%m-%d %H:%M:%S')
+
+                        if stop_time.departure.HasField('delay'):
+                            departure_data["delay"] = stop_time.departure.delay
+
+                        stop_data["departure"] = departure_data
 
                     update_data["stop_time_updates"].append(stop_data)
 
@@ -111,30 +133,42 @@ def parse_gtfs_rt(content, feed_id):
                 alert = entity.alert
                 alert_data = {
                     "active_period": [],
-                    "informed_entity": [],
-                    "cause": alert.cause,
-                    "effect": alert.effect,
-                    "url": alert.url.translation[0].text if alert.url.translation else None,
-                    "header_text": alert.header_text.translation[0].text if alert.header_text.translation else None,
-                    "description_text": alert.description_text.translation[
-                        0].text if alert.description_text.translation else None
+                    "informed_entity": []
                 }
 
+                # Add basic info
+                if alert.HasField('cause'):
+                    alert_data["cause"] = alert.cause
+
+                if alert.HasField('effect'):
+                    alert_data["effect"] = alert.effect
+
+                # Process URL
+                if alert.HasField('url') and alert.url.translation:
+                    alert_data["url"] = alert.url.translation[0].text
+
+                # Process title and description
+                if alert.HasField('header_text') and alert.header_text.translation:
+                    alert_data["header_text"] = alert.header_text.translation[0].text
+
+                if alert.HasField('description_text') and alert.description_text.translation:
+                    alert_data["description_text"] = alert.description_text.translation[0].text
+
                 # Process active periods
                 for period in alert.active_period:
                     period_data = {}
+
                     if period.HasField('start'):
-                        start_time = datetime.datetime.fromtimestamp(period.start)
                         period_data["start"] = {
                             "timestamp": period.start,
-                            "human_time": start_time.strftime('%Y-%m-%d %H:%M:%S')
+                            "human_time": datetime.datetime.fromtimestamp(period.start).strftime(
+                                '%Y-%m-%d %H:%M:%S')
                         }
 
                     if period.HasField('end'):
-                        end_time = datetime.datetime.fromtimestamp(period.end)
                         period_data["end"] = {
                             "timestamp": period.end,
-                            "human_time": end_time.strftime('%Y-%m-%d %H:%M:%S')
+                            "human_time": datetime.datetime.fromtimestamp(period.end).strftime('%Y-%m-%d %H:%M:%S')
                         }
 
                     alert_data["active_period"].append(period_data)
@@ -142,12 +176,16 @@ def parse_gtfs_rt(content, feed_id):
                 # Process affected entities
                 for entity in alert.informed_entity:
                     entity_info = {}
+
                     if entity.HasField('agency_id'):
                         entity_info["agency_id"] = entity.agency_id
+
                     if entity.HasField('route_id'):
                         entity_info["route_id"] = entity.route_id
+
                     if entity.HasField('route_type'):
                         entity_info["route_type"] = entity.route_type
+
                     if entity.HasField('stop_id'):
                         entity_info["stop_id"] = entity.stop_id
 
@@ -160,4 +198,43 @@ def parse_gtfs_rt(content, feed_id):
         return result
 
     except Exception as e:
-        return {"error": f"Error parsing GTFS-RT data: {str(e)}"}
\ No newline at end of file
+        return {"error": f"Error parsing GTFS-RT data: {str(e)}"}
+
+
+def filter_feed(content, route_ids=None, entity_types=None):
+    """
+    Re-encode a GTFS-RT feed keeping only some entities
+
+    Args:
+        content (bytes): GTFS-RT binary content
+        route_ids (set): Keep entities for these routes (default: all)
+        entity_types (set): Keep these entity kinds: 'trip_update', 'vehicle', 'alert' (default: all)
+
+    Returns:
+        bytes: Serialized FeedMessage with the original header
+    """
+    feed = gtfs_realtime_pb2.FeedMessage()
+    feed.ParseFromString(content)
+
+    filtered = gtfs_realtime_pb2.FeedMessage()
+    filtered.header.CopyFrom(feed.header)
+
+    for entity in feed.entity:
+        kinds = [kind for kind in ENTITY_KINDS if entity.HasField(kind)]
+        if entity_types and not any(kind in entity_types for kind in kinds):
+            continue
+
+        if route_ids:
+            routes = set()
+            if entity.HasField('trip_update'):
+                routes.add(entity.trip_update.trip.route_id)
+            if entity.HasField('vehicle'):
+                routes.add(entity.vehicle.trip.route_id)
+            if entity.HasField('alert'):
+                routes.update(informed.route_id for informed in entity.alert.informed_entity)
+            if not routes & route_ids:
+                continue
+
+        filtered.entity.add().CopyFrom(entity)
+
+    return filtered.SerializeToString()
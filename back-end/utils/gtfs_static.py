@@ -0,0 +1,680 @@
+import concurrent.futures
+import contextlib
+import csv
+import datetime
+import hashlib
+import io
+import multiprocessing
+import os
+import sys
+import threading
+import zipfile
+from zoneinfo import ZoneInfo
+import numpy as np
+from utils.service_calendar import ServiceCalendar
+from utils.frequency import FrequencyTable
+from utils.station_complexes import StationComplexes
+from utils.timetable import Timetable
+
+
+def parse_gtfs_time(value):
+    """
+    Convert a GTFS HH:MM:SS time to seconds after service-day noon minus 12h
+
+    Args:
+        value (str): GTFS time (hours may exceed 24)
+
+    Returns:
+        int: Seconds, or -1 if the time is empty
+    """
+    if not value:
+        return -1
+    hours, minutes, seconds = value.split(':')
+    return int(hours) * 3600 + int(minutes) * 60 + int(seconds)
+
+
+def format_gtfs_time(seconds):
+    """
+    Convert seconds after service-day noon minus 12h to GTFS HH:MM:SS
+
+    Args:
+        seconds (int): Seconds (may exceed 24 hours)
+
+    Returns:
+        str: GTFS time
+    """
+    hours, seconds = divmod(int(seconds), 3600)
+    return f"{hours:02d}:{seconds // 60:02d}:{seconds % 60:02d}"
+
+
+@contextlib.contextmanager
+def open_table(source, name):
+    """
+    Open a GTFS table as a text stream from a directory or a .zip
+
+    Zip members are decompressed as they are read, never extracted to disk.
+
+    Args:
+        source (str): GTFS directory or zip file path
+        name (str): Table name without extension
+
+    Yields:
+        io.TextIOBase: Table stream, or None if the table is missing
+    """
+    filename = f"{name}.txt"
+
+    if os.path.isdir(source):
+        path = os.path.join(source, filename)
+        if not os.path.exists(path):
+            yield None
+            return
+        with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+            yield f
+        return
+
+    with zipfile.ZipFile(source) as archive:
+        member = next((n for n in archive.namelist() if os.path.basename(n) == filename), None)
+        if member is None:
+            yield None
+            return
+        with archive.open(member) as raw:
+            yield io.TextIOWrapper(raw, encoding='utf-8-sig', newline='')
+
+
+def parse_stop_times(source, chunk_rows=100000):
+    """
+    Parse stop_times into columns with bounded working memory
+
+    Rows are streamed through csv.reader and flushed to int32 arrays every
+    chunk_rows rows, so only one chunk of Python objects is alive at a time.
+    Module-level so it can run in a worker process.
+
+    Args:
+        source (str): GTFS directory or zip file path
+        chunk_rows (int): Rows per chunk
+
+    Returns:
+        dict: StopTimes constructor arguments
+    """
+    trip_ids, trip_index = [], {}
+    stop_ids, stop_index = [], {}
+    chunks = {column: [] for column in ('trip_idx', 'stop_idx', 'sequence', 'arrival', 'departure')}
+    buffers = {column: [] for column in chunks}
+
+    def flush():
+        for column, values in buffers.items():
+            if values:
+                chunks[column].append(np.array(values, dtype=np.int32))
+                values.clear()
+
+    with open_table(source, 'stop_times') as f:
+        if f is not None:
+            reader = csv.reader(f)
+            header = next(reader, [])
+            trip_col, stop_col = header.index('trip_id'), header.index('stop_id')
+            sequence_col = header.index('stop_sequence')
+            arrival_col = header.index('arrival_time') if 'arrival_time' in header else None
+            departure_col = header.index('departure_time') if 'departure_time' in header else None
+
+            for row in reader:
+                if not row:
+                    continue
+
+                trip_id = row[trip_col]
+                trip = trip_index.get(trip_id)
+                if trip is None:
+                    trip = trip_index[trip_id] = len(trip_ids)
+                    trip_ids.append(trip_id)
+
+                stop_id = row[stop_col]
+                stop = stop_index.get(stop_id)
+                if stop is None:
+                    stop = stop_index[stop_id] = len(stop_ids)
+                    stop_ids.append(stop_id)
+
+                buffers['trip_idx'].append(trip)
+                buffers['stop_idx'].append(stop)
+                buffers['sequence'].append(int(row[sequence_col]))
+                buffers['arrival'].append(parse_gtfs_time(row[arrival_col]) if arrival_col is not None else -1)
+                buffers['departure'].append(parse_gtfs_time(row[departure_col]) if departure_col is not None else -1)
+
+                if len(buffers['trip_idx']) >= chunk_rows:
+                    flush()
+
+    flush()
+    columns = {
+        column: np.concatenate(parts) if parts else np.zeros(0, dtype=np.int32)
+        for column, parts in chunks.items()
+    }
+
+    return dict(trip_ids=trip_ids, stop_ids=stop_ids, **columns)
+
+
+def parse_shapes(source):
+    """
+    Parse shapes into ordered point lists
+
+    Module-level so it can run in a worker process.
+
+    Args:
+        source (str): GTFS directory or zip file path
+
+    Returns:
+        dict: shape_id -> list of (lat, lon) points in sequence order
+    """
+    points = {}
+    with open_table(source, 'shapes') as f:
+        if f is not None:
+            reader = csv.reader(f)
+            header = next(reader, [])
+            shape_col, sequence_col = header.index('shape_id'), header.index('shape_pt_sequence')
+            lat_col, lon_col = header.index('shape_pt_lat'), header.index('shape_pt_lon')
+
+            for row in reader:
+                if row:
+                    points.setdefault(row[shape_col], []).append(
+                        (int(row[sequence_col]), float(row[lat_col]), float(row[lon_col])))
+
+    return {
+        shape_id: [(lat, lon) for _, lat, lon in sorted(rows)]
+        for shape_id, rows in points.items()
+    }
+
+
+class StopTimes:
+    """
+    Columnar stop_times table
+
+    Rows are sorted by trip and stop_sequence; each trip's rows are the slice
+    offsets[i]:offsets[i + 1] of the column arrays.
+    """
+
+    def __init__(self, trip_ids, stop_ids, trip_idx, stop_idx, sequence, arrival, departure):
+        order = np.lexsort((sequence, trip_idx))
+        self.trip_ids = [sys.intern(trip_id) for trip_id in trip_ids]
+        self.stop_ids = [sys.intern(stop_id) for stop_id in stop_ids]
+        self.trip_index = {trip_id: i for i, trip_id in enumerate(trip_ids)}
+        self.trip = trip_idx[order]
+        self.stop = stop_idx[order]
+        self.sequence = sequence[order]
+        self.arrival = arrival[order]
+        self.departure = departure[order]
+        self.offsets = np.searchsorted(self.trip, np.arange(len(trip_ids) + 1))
+
+    def __len__(self):
+        return len(self.trip)
+
+    def for_trip(self, trip_id):
+        """
+        Get the stop pattern of a trip
+
+        Args:
+            trip_id (str): Static trip ID
+
+        Returns:
+            list: (stop_sequence, stop_id, arrival, departure) tuples in order
+        """
+        i = self.trip_index.get(trip_id)
+        if i is None:
+            return []
+
+        start, end = self.offsets[i], self.offsets[i + 1]
+        return [
+            (int(self.sequence[j]), self.stop_ids[self.stop[j]], int(self.arrival[j]), int(self.departure[j]))
+            for j in range(start, end)
+        ]
+
+
+class StaticFeed:
+    """
+    Static GTFS feed loaded from a directory or a .zip
+
+    Tables are read on first access and kept in memory as indexes.
+    """
+
+    # Tables large enough to be worth parsing in a worker process
+    LARGE_TABLES = {'stop_times': parse_stop_times, 'shapes': parse_shapes}
+
+    def __init__(self, source, chunk_rows=100000):
+        self.source = source
+        self.chunk_rows = chunk_rows
+        self._lock = threading.RLock()
+        self._tables = {}
+        self._members = None
+
+    def has_table(self, name):
+        """
+        Check whether the feed contains a table
+
+        Args:
+            name (str): Table name without extension (e.g. 'stop_times')
+
+        Returns:
+            bool: True if the table exists
+        """
+        if os.path.isdir(self.source):
+            return os.path.exists(os.path.join(self.source, f"{name}.txt"))
+
+        if self._members is None:
+            with zipfile.ZipFile(self.source) as archive:
+                self._members = {os.path.basename(n) for n in archive.namelist()}
+        return f"{name}.txt" in self._members
+
+    def read_table(self, name):
+        """
+        Iterate over the rows of a table
+
+        Args:
+            name (str): Table name without extension
+
+        Yields:
+            dict: CSV row
+        """
+        with open_table(self.source, name) as f:
+            if f is not None:
+                yield from csv.DictReader(f)
+
+    def _interned_rows(self, name):
+        """
+        Iterate over the rows of a table with interned values
+
+        IDs, names and service labels repeat across rows and across agencies,
+        so interning keeps a single copy of each string in memory.
+
+        Args:
+            name (str): Table name without extension
+
+        Yields:
+            dict: CSV row
+        """
+        for row in self.read_table(name):
+            yield {key: sys.intern(value) if value else value for key, value in row.items()}
+
+    def _load(self, name, builder):
+        """
+        Build and memoize an index
+
+        Args:
+            name (str): Index name
+            builder (callable): Builds the index
+
+        Returns:
+            any: The index
+        """
+        if name not in self._tables:
+            with self._lock:
+                if name not in self._tables:
+                    self._tables[name] = builder()
+        return self._tables[name]
+
+    @property
+    def version(self):
+        """str: Fingerprint of the source files' sizes and modification times"""
+        def build():
+            if os.path.isdir(self.source):
+                paths = sorted(os.path.join(self.source, name) for name in os.listdir(self.source))
+            else:
+                paths = [self.source]
+            digest = hashlib.sha1()
+            for path in paths:
+                stat = os.stat(path)
+                digest.update(f"{os.path.basename(path)}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+            return digest.hexdigest()[:12]
+        return self._load('version', build)
+
+    @property
+    def agency_timezone(self):
+        """str: Timezone of the feed's agencies"""
+        return self._load('agency_timezone', lambda: next(
+            (row['agency_timezone'] for row in self.read_table('agency')), 'America/New_York'))
+
+    @property
+    def stops(self):
+        """dict: stop_id -> stops.txt row"""
+        return self._load('stops', lambda: {row['stop_id']: row for row in self._interned_rows('stops')})
+
+    @property
+    def trips(self):
+        """dict: trip_id -> trips.txt row"""
+        return self._load('trips', lambda: {row['trip_id']: row for row in self._interned_rows('trips')})
+
+    @property
+    def calendar(self):
+        """dict: service_id -> calendar.txt row"""
+        return self._load('calendar', lambda: {row['service_id']: row for row in self._interned_rows('calendar')})
+
+    @property
+    def routes(self):
+        """dict: route_id -> routes.txt row, in file order"""
+        return self._load('routes', lambda: {row['route_id']: row for row in self._interned_rows('routes')})
+
+    @property
+    def route_trips(self):
+        """dict: route_id -> list of trip_ids"""
+        def build():
+            index = {}
+            for trip_id, trip in self.trips.items():
+                index.setdefault(trip['route_id'], []).append(trip_id)
+            return index
+
+        return self._load('route_trips', build)
+
+    @property
+    def route_shapes(self):
+        """dict: route_id -> list of distinct shape_ids in trip order"""
+        def build():
+            index = {}
+            for trip in self.trips.values():
+                if trip.get('shape_id'):
+                    shapes = index.setdefault(trip['route_id'], [])
+                    if trip['shape_id'] not in shapes:
+                        shapes.append(trip['shape_id'])
+            return index
+
+        return self._load('route_shapes', build)
+
+    @property
+    def route_shape_counts(self):
+        """dict: route_id -> {service_id: {shape_id: trip count}}"""
+        def build():
+            index = {}
+            for trip in self.trips.values():
+                if trip.get('shape_id'):
+                    counts = index.setdefault(trip['route_id'], {}).setdefault(trip['service_id'], {})
+                    counts[trip['shape_id']] = counts.get(trip['shape_id'], 0) + 1
+            return index
+
+        return self._load('route_shape_counts', build)
+
+    @property
+    def route_service_stops(self):
+        """dict: route_id -> {service_id: set of stop_ids served by its trips}"""
+        return self._load('route_service_stops', self._build_route_service_stops)
+
+    def _build_route_service_stops(self):
+        stop_times = self.stop_times
+        if not len(stop_times):
+            return {}
+
+        route_ids = list(self.route_trips)
+        route_codes = {route_id: i for i, route_id in enumerate(route_ids)}
+        service_ids = sorted({trip['service_id'] for trip in self.trips.values()})
+        service_codes = {service_id: i for i, service_id in enumerate(service_ids)}
+
+        # (route, service) group code per trip, -1 for trips missing from trips.txt
+        trip_groups = np.full(len(stop_times.trip_ids), -1, dtype=np.int64)
+        for i, trip_id in enumerate(stop_times.trip_ids):
+            trip = self.trips.get(trip_id)
+            if trip is not None:
+                trip_groups[i] = route_codes[trip['route_id']] * len(service_ids) + service_codes[trip['service_id']]
+
+        # Distinct (route, service, stop) triples in one vectorized pass
+        n_stops = len(stop_times.stop_ids)
+        row_groups = trip_groups[stop_times.trip]
+        valid = row_groups >= 0
+        triples = np.unique(row_groups[valid] * n_stops + stop_times.stop[valid])
+
+        index = {}
+        for triple in triples.tolist():
+            group, stop_code = divmod(triple, n_stops)
+            route_code, service_code = divmod(group, len(service_ids))
+            index.setdefault(route_ids[route_code], {}).setdefault(service_ids[service_code], set()).add(
+                stop_times.stop_ids[stop_code])
+        return index
+
+    @property
+    def route_stops(self):
+        """dict: route_id -> set of stop_ids served by any of its trips"""
+        def build():
+            return {
+                route_id: set().union(*by_service.values())
+                for route_id, by_service in self.route_service_stops.items()
+            }
+
+        return self._load('route_stops', build)
+
+    @property
+    def station_complexes(self):
+        """StationComplexes: Stops clustered by parent station and transfers.txt"""
+        return self._load('station_complexes', lambda: StationComplexes(
+            self.stops, self._interned_rows('transfers'), lambda: self.route_stops))
+
+    @property
+    def frequencies(self):
+        """FrequencyTable: Scheduled trips and headways per route, direction, stop, service and hour"""
+        return self._load('frequencies', lambda: FrequencyTable(self))
+
+    @property
+    def timetable(self):
+        """Timetable: Connections compiled from stop_times for journey searches"""
+        return self._load('timetable', lambda: Timetable(self))
+
+    @property
+    def service_calendar(self):
+        """ServiceCalendar: Active services per date from calendar.txt and calendar_dates.txt"""
+        return self._load('service_calendar', lambda: ServiceCalendar(
+            self.calendar.values(), self._interned_rows('calendar_dates')))
+
+    def today(self):
+        """
+        Get the current date in the feed's timezone
+
+        Returns:
+            datetime.date: Today's service date
+        """
+        return datetime.datetime.now(ZoneInfo(self.agency_timezone)).date()
+
+    def schedule_date(self, date):
+        """
+        Get the date whose services run on a date
+
+        Outside the feed's calendar this is the same weekday of the nearest
+        covered week (see ServiceCalendar.effective_date).
+
+        Args:
+            date (datetime.date): Service date
+
+        Returns:
+            datetime.date: Date the schedule is taken from
+        """
+        return self.service_calendar.effective_date(date)
+
+    def _active_filter(self, date):
+        """
+        Get a predicate for services running on a date
+
+        Same policy as services_on.
+
+        Args:
+            date (datetime.date): Service date
+
+        Returns:
+            callable: service_id -> bool
+        """
+        calendar = self.service_calendar
+        if calendar.date_range()[0] is None:
+            return lambda service_id: True
+        mask = calendar.mask(calendar.effective_date(date))
+        return lambda service_id: bool(calendar.bit(service_id) & mask)
+
+    def route_shapes_on(self, route_id, date):
+        """
+        Get a route's shapes on a date, most frequent first
+
+        Args:
+            route_id (str): Route ID
+            date (datetime.date): Service date
+
+        Returns:
+            list: (shape_id, trip count) pairs
+        """
+        is_active = self._active_filter(date)
+        totals = {}
+        for service_id, counts in self.route_shape_counts.get(route_id, {}).items():
+            if is_active(service_id):
+                for shape_id, count in counts.items():
+                    totals[shape_id] = totals.get(shape_id, 0) + count
+
+        return sorted(totals.items(), key=lambda item: -item[1])
+
+    def route_stops_on(self, route_id, date):
+        """
+        Get the stops served by a route's trips on a date
+
+        Args:
+            route_id (str): Route ID
+            date (datetime.date): Service date
+
+        Returns:
+            set: Stop IDs
+        """
+        is_active = self._active_filter(date)
+        stops = set()
+        for service_id, stop_ids in self.route_service_stops.get(route_id, {}).items():
+            if is_active(service_id):
+                stops |= stop_ids
+        return stops
+
+    @property
+    def shapes(self):
+        """dict: shape_id -> list of (lat, lon) points in sequence order"""
+        return self._load('shapes', self._build_shapes)
+
+    def _build_shapes(self):
+        return parse_shapes(self.source)
+
+    @property
+    def stop_times(self):
+        """StopTimes: Columnar stop_times table"""
+        return self._load('stop_times', self._build_stop_times)
+
+    def _build_stop_times(self):
+        return StopTimes(**parse_stop_times(self.source, self.chunk_rows))
+
+    def preload(self, processes=True):
+        """
+        Build every index up front
+
+        Args:
+            processes (bool): Parse large tables in worker processes while
+                the small ones are built in this one
+
+        Returns:
+            StaticFeed: This feed
+        """
+        pending = [name for name in self.LARGE_TABLES if name not in self._tables and self.has_table(name)]
+
+        if processes and pending:
+            # Spawn rather than fork: the registry loads feeds from several threads
+            context = multiprocessing.get_context('spawn')
+            with concurrent.futures.ProcessPoolExecutor(max_workers=len(pending), mp_context=context) as pool:
+                args = {'stop_times': (self.source, self.chunk_rows), 'shapes': (self.source,)}
+                futures = {name: pool.submit(self.LARGE_TABLES[name], *args[name]) for name in pending}
+
+                for name in ('stops', 'routes', 'trips', 'calendar'):
+                    getattr(self, name)
+
+                stop_times = futures.pop('stop_times', None)
+                if stop_times is not None:
+                    self._load('stop_times', lambda: StopTimes(**stop_times.result()))
+                shapes = futures.pop('shapes', None)
+                if shapes is not None:
+                    self._load('shapes', shapes.result)
+
+        for name in ('stops', 'routes', 'trips', 'calendar', 'shapes', 'stop_times',
+                     'route_trips', 'route_shapes', 'route_shape_counts', 'route_service_stops',
+                     'route_stops', 'service_calendar', 'station_complexes', 'frequencies'):
+            getattr(self, name)
+        return self
+
+    def services_on(self, date):
+        """
+        Get the service_ids active on a date
+
+        Dates outside the calendar use the services of the same weekday in
+        the nearest covered week; a feed without any calendar runs every
+        service every day.
+
+        Args:
+            date (datetime.date): Service date
+
+        Returns:
+            set: Active service_ids
+        """
+        calendar = self.service_calendar
+        if calendar.date_range()[0] is None:
+            return {trip['service_id'] for trip in self.trips.values()}
+        return calendar.active(calendar.effective_date(date))
+
+    def service_day_start(self, date):
+        """
+        Get the Unix time that GTFS times on a service date are relative to
+
+        GTFS times count from noon minus 12 hours, which differs from
+        midnight on daylight saving changeover days.
+
+        Args:
+            date (datetime.date): Service date
+
+        Returns:
+            int: Unix timestamp
+        """
+        noon = datetime.datetime(date.year, date.month, date.day, 12, tzinfo=ZoneInfo(self.agency_timezone))
+        return int(noon.timestamp()) - 12 * 3600
+
+
+class FeedRegistry:
+    """
+    Registry of static GTFS feeds keyed by agency
+
+    Each agency's indexes live in their own StaticFeed namespace. A source
+    may be a GTFS directory or .zip; missing sources are skipped.
+    """
+
+    def __init__(self, sources, processes=True, chunk_rows=100000):
+        self.processes = processes
+        self.feeds = {
+            agency: StaticFeed(source, chunk_rows)
+            for agency, source in sources.items() if os.path.exists(source)
+        }
+
+    def __contains__(self, agency):
+        return agency in self.feeds
+
+    def get(self, agency):
+        """
+        Get an agency's static feed
+
+        Args:
+            agency (str): Agency key (e.g. 'subway', 'lirr', 'mnr')
+
+        Returns:
+            StaticFeed: The feed, or None if not loaded
+        """
+        return self.feeds.get(agency)
+
+    def load_all(self):
+        """
+        Build every feed's indexes concurrently
+
+        One thread per feed. The threads overlap file I/O and the worker
+        processes that parse each feed's large tables (see preload); the
+        index building itself is Python code serialized by the GIL, so it
+        does not speed up with more feeds.
+
+        Returns:
+            dict: Agency -> error message for feeds that failed to load
+        """
+        errors = {}
+        if not self.feeds:
+            return errors
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(self.feeds)) as executor:
+            futures = {executor.submit(feed.preload, self.processes): agency for agency, feed in self.feeds.items()}
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    errors[futures[future]] = str(e)
+
+        return errors
@@ -0,0 +1,215 @@
+"""Minimal Prometheus metrics registry (text exposition format 0.0.4)"""
+import bisect
+import threading
+import time
+from flask import Response, g, request
+from utils.cache import cache
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Latency buckets in seconds
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """
+    Monotonic counter with labels
+    """
+
+    type_name = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        """
+        Increment the counter
+
+        Args:
+            *labels: Label values, in labelnames order
+            amount (float): Increment
+        """
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for labels, value in sorted(values.items()):
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram with labels
+    """
+
+    type_name = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}  # labels -> [per-bucket counts (last is +Inf), sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        """
+        Record an observation
+
+        Args:
+            value (float): Observed value
+            *labels: Label values, in labelnames order
+        """
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def samples(self):
+        with self._lock:
+            values = {labels: (list(counts), total) for labels, (counts, total) in self._values.items()}
+        for labels, (counts, total) in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                yield f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, labels)} {_number(total)}"
+            yield f"{self.name}_count{_labels(self.labelnames, labels)} {cumulative}"
+
+
+class CallbackMetric:
+    """
+    Counter or gauge whose values are read from a callback at scrape time
+    """
+
+    def __init__(self, name, documentation, labelnames, collect, type_name='gauge'):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.collect = collect  # () -> {label tuple: value}
+        self.type_name = type_name
+
+    def samples(self):
+        for labels, value in sorted(self.collect().items()):
+            yield f"{self.name}{_labels(self.labelnames, labels)} {_number(value)}"
+
+
+class MetricsRegistry:
+    """
+    Collection of metrics rendered together
+    """
+
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def callback(self, name, documentation, labelnames, collect, type_name='gauge'):
+        return self.register(CallbackMetric(name, documentation, labelnames, collect, type_name))
+
+    def render(self):
+        """
+        Render every metric
+
+        Returns:
+            str: Prometheus text exposition
+        """
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+def init_app(app, registry=None):
+    """
+    Record request latency for every route and serve /metrics
+
+    Args:
+        app (Flask): Application
+        registry (MetricsRegistry): Registry to expose (default: global)
+    """
+    registry = registry or metrics
+
+    @app.before_request
+    def start_timer():
+        g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def record_latency(response):
+        start = g.pop('metrics_start', None)
+        if start is not None:
+            # Route templates, not raw paths, keep label cardinality bounded
+            endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+            request_duration.observe(time.perf_counter() - start, endpoint, request.method, response.status_code)
+        return response
+
+    @app.route('/metrics')
+    def get_metrics():
+        """Prometheus metrics"""
+        return Response(registry.render(), content_type=CONTENT_TYPE)
+
+
+# Create global registry
+metrics = MetricsRegistry()
+
+request_duration = metrics.histogram(
+    'http_request_duration_seconds', 'Request latency by route', ('endpoint', 'method', 'status'))
+upstream_duration = metrics.histogram(
+    'upstream_fetch_duration_seconds', 'Upstream feed fetch latency', ('feed',))
+upstream_bytes = metrics.counter(
+    'upstream_response_bytes_total', 'Bytes received from upstream feeds', ('feed',))
+upstream_errors = metrics.counter(
+    'upstream_errors_total', 'Failed upstream feed fetches', ('feed', 'reason'))
+parse_duration = metrics.histogram(
+    'feed_parse_duration_seconds', 'Time to parse an upstream feed payload', ('feed',))
+
+
+def _cache_stat(field):
+    return lambda: {(family,): stats[field] for family, stats in cache.get_stats()["families"].items()}
+
+
+metrics.callback('cache_requests_total', 'Cache lookups by key family and result', ('family', 'result'),
+                 lambda: {(family, result): stats[field]
+                          for family, stats in cache.get_stats()["families"].items()
+                          for result, field in (('hit', 'hits'), ('miss', 'misses'))},
+                 type_name='counter')
+metrics.callback('cache_evictions_total', 'Expired cache entries removed', ('family',),
+                 _cache_stat('evictions'), type_name='counter')
+metrics.callback('cache_entries', 'Cached entries by key family', ('family',), _cache_stat('entries'))
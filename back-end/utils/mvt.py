@@ -0,0 +1,154 @@
+"""Minimal Mapbox Vector Tile (v2.1) encoder"""
+import struct
+
+GEOM_POINT = 1
+GEOM_LINESTRING = 2
+
+CMD_MOVE_TO = 1
+CMD_LINE_TO = 2
+
+
+def _varint(value):
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _zigzag(value):
+    return (value << 1) ^ (value >> 31)
+
+
+def _field(number, wire_type):
+    return _varint((number << 3) | wire_type)
+
+
+def _bytes_field(number, data):
+    return _field(number, 2) + _varint(len(data)) + data
+
+
+def _uint_field(number, value):
+    return _field(number, 0) + _varint(value)
+
+
+def _packed_field(number, values):
+    return _bytes_field(number, b''.join(_varint(v) for v in values))
+
+
+def _encode_value(value):
+    if isinstance(value, bool):
+        return _uint_field(7, int(value))
+    if isinstance(value, int):
+        return _field(6, 0) + _varint((value << 1) ^ (value >> 63))
+    if isinstance(value, float):
+        return _field(3, 1) + struct.pack('<d', value)
+    return _bytes_field(1, str(value).encode('utf-8'))
+
+
+def _command(command_id, count):
+    return (command_id & 0x7) | (count << 3)
+
+
+def encode_geometry(geom_type, parts):
+    """
+    Encode tile-space coordinates as MVT geometry commands
+
+    Args:
+        geom_type (int): GEOM_POINT or GEOM_LINESTRING
+        parts (list): Lists of (x, y) integer tile coordinates
+
+    Returns:
+        list: Command integers
+    """
+    commands = []
+    cursor_x = cursor_y = 0
+
+    if geom_type == GEOM_POINT:
+        points = [pt for part in parts for pt in part]
+        commands.append(_command(CMD_MOVE_TO, len(points)))
+        for x, y in points:
+            commands += [_zigzag(x - cursor_x), _zigzag(y - cursor_y)]
+            cursor_x, cursor_y = x, y
+        return commands
+
+    for part in parts:
+        if len(part) < 2:
+            continue
+        x, y = part[0]
+        commands += [_command(CMD_MOVE_TO, 1), _zigzag(x - cursor_x), _zigzag(y - cursor_y)]
+        cursor_x, cursor_y = x, y
+
+        commands.append(_command(CMD_LINE_TO, len(part) - 1))
+        for x, y in part[1:]:
+            commands += [_zigzag(x - cursor_x), _zigzag(y - cursor_y)]
+            cursor_x, cursor_y = x, y
+
+    return commands
+
+
+def encode_layer(name, features, extent=4096):
+    """
+    Encode a tile layer
+
+    Args:
+        name (str): Layer name
+        features (list): (geom_type, parts, properties) tuples in tile coordinates
+        extent (int): Tile extent
+
+    Returns:
+        bytes: Encoded layer message
+    """
+    keys, key_index = [], {}
+    values, value_index = [], {}
+    encoded_features = []
+
+    for geom_type, parts, properties in features:
+        geometry = encode_geometry(geom_type, parts)
+        if len(geometry) <= 1:
+            continue
+
+        tags = []
+        for key, value in properties.items():
+            if value is None:
+                continue
+            if key not in key_index:
+                key_index[key] = len(keys)
+                keys.append(key)
+            value_key = (type(value).__name__, value)
+            if value_key not in value_index:
+                value_index[value_key] = len(values)
+                values.append(value)
+            tags += [key_index[key], value_index[value_key]]
+
+        encoded_features.append(
+            _packed_field(2, tags) + _uint_field(3, geom_type) + _packed_field(4, geometry)
+        )
+
+    layer = _uint_field(15, 2) + _bytes_field(1, name.encode('utf-8'))
+    for feature in encoded_features:
+        layer += _bytes_field(2, feature)
+    for key in keys:
+        layer += _bytes_field(3, key.encode('utf-8'))
+    for value in values:
+        layer += _bytes_field(4, _encode_value(value))
+    layer += _uint_field(5, extent)
+
+    return layer
+
+
+def encode_tile(layers):
+    """
+    Encode a vector tile
+
+    Args:
+        layers (list): Encoded layer messages
+
+    Returns:
+        bytes: Tile message
+    """
+    return b''.join(_bytes_field(3, layer) for layer in layers)
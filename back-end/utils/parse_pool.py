@@ -0,0 +1,95 @@
+import concurrent.futures
+import marshal
+import multiprocessing
+import threading
+from concurrent.futures.process import BrokenProcessPool
+from config import PARSE_POOL_WORKERS, PARSE_POOL_MIN_BYTES, PARSE_POOL_TIMEOUT
+from utils.gtfs_parser import parse_feed
+
+
+def _parse_compact(content, feed_id):
+    """
+    Parse a feed in a worker and marshal the result
+
+    marshal round-trips the plain dicts, lists and scalars of a parsed feed
+    several times faster than pickle, which keeps the unavoidable decode in
+    the parent process short.
+
+    Args:
+        content (bytes): GTFS-RT binary content
+        feed_id (str): Feed ID
+
+    Returns:
+        bytes: Marshalled parse result
+    """
+    return marshal.dumps(parse_feed(content, feed_id))
+
+
+class ParsePool:
+    """
+    Worker processes for GTFS-RT parsing
+
+    Decoding and converting a large feed is CPU-bound Python that holds the
+    GIL; in a worker process it runs on another core while request threads
+    keep serving cached responses. The pool is started on first use.
+    """
+
+    def __init__(self, workers=PARSE_POOL_WORKERS, min_bytes=PARSE_POOL_MIN_BYTES, timeout=PARSE_POOL_TIMEOUT):
+        """
+        Args:
+            workers (int): Worker processes (0 parses inline)
+            min_bytes (int): Payloads smaller than this are parsed inline
+            timeout (float): Seconds to wait for a worker before parsing inline
+        """
+        self.workers = workers
+        self.min_bytes = min_bytes
+        self.timeout = timeout
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _executor(self):
+        with self._lock:
+            if self._pool is None:
+                # Spawn rather than fork: the parent runs several threads
+                context = multiprocessing.get_context('spawn')
+                self._pool = concurrent.futures.ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+            return self._pool
+
+    def parse(self, content, feed_id):
+        """
+        Parse GTFS-RT data, in a worker process if the payload is large
+
+        Args:
+            content (bytes): GTFS-RT binary content
+            feed_id (str): Feed ID
+
+        Returns:
+            dict: Parsed data
+        """
+        if self.workers <= 0 or len(content) < self.min_bytes:
+            return parse_feed(content, feed_id)
+
+        try:
+            future = self._executor().submit(_parse_compact, content, feed_id)
+            return marshal.loads(future.result(timeout=self.timeout))
+        except concurrent.futures.TimeoutError:
+            # A stuck or backlogged worker; don't hold the request (and the feed's refresh) on it
+            future.cancel()
+            print(f"Parse pool timed out after {self.timeout}s, parsing {feed_id} inline")
+            return parse_feed(content, feed_id)
+        except BrokenProcessPool as e:
+            # A worker died; start a fresh pool next time and parse this one inline
+            print(f"Parse pool failed, parsing inline: {str(e)}")
+            self.shutdown()
+            return parse_feed(content, feed_id)
+
+    def shutdown(self):
+        """Stop the worker processes"""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+
+# Create global instance
+parse_pool = ParsePool()
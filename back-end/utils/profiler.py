@@ -0,0 +1,261 @@
+"""Sampling profiler for slow requests"""
+import collections
+import hmac
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from flask import Response, abort, jsonify, request
+
+
+class RequestProfiler:
+    """
+    Samples the stacks of in-flight requests from a background thread
+
+    Every request is sampled while it runs; when it finishes, the profile
+    is kept only if the request took longer than the threshold. The last
+    max_profiles profiles are kept in a ring buffer.
+    """
+
+    def __init__(self, threshold=0.5, interval=0.005, max_profiles=20):
+        self.threshold = threshold
+        self.interval = interval
+        self.profiles = collections.deque(maxlen=max_profiles)
+        self._ids = itertools.count(1)
+        self._active = {}  # thread id -> in-flight request profile
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._frame_names = {}  # code object -> frame name
+        self._thread = None
+
+    def _frame_name(self, code):
+        name = self._frame_names.get(code)
+        if name is None:
+            name = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            self._frame_names[code] = name
+        return name
+
+    def _sample_loop(self):
+        own = threading.get_ident()
+        while True:
+            if not self._active:
+                self._wake.wait()
+                self._wake.clear()
+                continue
+
+            frames = sys._current_frames()
+            with self._lock:
+                active = list(self._active.items())
+            for ident, profile in active:
+                frame = frames.get(ident)
+                if frame is None or ident == own:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(self._frame_name(frame.f_code))
+                    frame = frame.f_back
+                stack = tuple(reversed(stack))  # Root first
+                profile["samples"][stack] += 1
+            del frames
+            time.sleep(self.interval)
+
+    def start(self, method, path):
+        """
+        Start sampling the current thread
+
+        Args:
+            method (str): HTTP method
+            path (str): Request path
+        """
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._sample_loop, name='request-profiler', daemon=True)
+                    self._thread.start()
+
+        profile = {
+            "method": method,
+            "path": path,
+            "started_at": time.time(),
+            "start": time.perf_counter(),
+            "samples": collections.Counter()
+        }
+        with self._lock:
+            self._active[threading.get_ident()] = profile
+        self._wake.set()
+
+    def stop(self, endpoint=None, status=None):
+        """
+        Stop sampling the current thread and keep the profile if it was slow
+
+        Args:
+            endpoint (str): Route template
+            status (int): Response status
+
+        Returns:
+            dict: The stored profile, or None
+        """
+        with self._lock:
+            profile = self._active.pop(threading.get_ident(), None)
+        if profile is None:
+            return None
+
+        duration = time.perf_counter() - profile.pop("start")
+        if duration < self.threshold:
+            return None
+
+        profile.update({
+            "id": next(self._ids),
+            "endpoint": endpoint,
+            "status": status,
+            "duration": duration,
+            "interval": self.interval
+        })
+        self.profiles.append(profile)
+        return profile
+
+    def get(self, profile_id):
+        """
+        Get a stored profile
+
+        Args:
+            profile_id (int): Profile ID
+
+        Returns:
+            dict: Profile, or None if it has been evicted
+        """
+        return next((p for p in list(self.profiles) if p["id"] == profile_id), None)
+
+    def summaries(self):
+        """
+        List stored profiles, newest first
+
+        Returns:
+            list: Profile metadata without samples
+        """
+        summaries = []
+        for profile in reversed(list(self.profiles)):
+            summary = {key: value for key, value in profile.items() if key != "samples"}
+            summary["sample_count"] = sum(profile["samples"].values())
+            summaries.append(summary)
+        return summaries
+
+
+def to_collapsed(profile):
+    """
+    Render a profile in collapsed-stack format (flamegraph.pl, speedscope)
+
+    Args:
+        profile (dict): Profile
+
+    Returns:
+        str: One 'frame;frame;frame count' line per distinct stack
+    """
+    return ''.join(f"{';'.join(stack)} {count}\n" for stack, count in profile["samples"].most_common())
+
+
+def to_speedscope(profile):
+    """
+    Render a profile in speedscope's sampled file format
+
+    Args:
+        profile (dict): Profile
+
+    Returns:
+        dict: speedscope document
+    """
+    frames, frame_index = [], {}
+    samples, weights = [], []
+    for stack, count in profile["samples"].items():
+        indexes = []
+        for name in stack:
+            if name not in frame_index:
+                frame_index[name] = len(frames)
+                frames.append({"name": name})
+            indexes.append(frame_index[name])
+        samples.append(indexes)
+        weights.append(count * profile["interval"] * 1000)
+
+    name = f"{profile['method']} {profile['path']}"
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": name,
+        "exporter": "nyc-transit-hub",
+        "shared": {"frames": frames},
+        "profiles": [{
+            "type": "sampled",
+            "name": name,
+            "unit": "milliseconds",
+            "startValue": 0,
+            "endValue": sum(weights),
+            "samples": samples,
+            "weights": weights
+        }]
+    }
+
+
+def init_app(app, profiler, admin_token=None):
+    """
+    Profile slow requests and serve the profiles under /admin/profiles
+
+    Args:
+        app (Flask): Application
+        profiler (RequestProfiler): Profiler
+        admin_token (str): Token required as "Authorization: Bearer <token>";
+            without one the profiler is not installed, since profiles expose code paths and timings
+    """
+    if not admin_token:
+        print("Profiler not enabled: set PROFILER_ADMIN_TOKEN to serve /admin/profiles")
+        return
+
+    @app.before_request
+    def start_profile():
+        if not request.path.startswith('/admin/'):
+            profiler.start(request.method, request.path)
+
+    @app.after_request
+    def stop_profile(response):
+        profiler.stop(request.url_rule.rule if request.url_rule else None, response.status_code)
+        return response
+
+    @app.teardown_request
+    def discard_profile(exc):
+        # after_request is skipped when a request fails outside the view
+        if exc is not None:
+            profiler.stop(request.url_rule.rule if request.url_rule else None, 500)
+
+    def check_token():
+        # Header only: a token in the query string ends up in access logs and browser history
+        scheme, _, token = request.headers.get('Authorization', '').partition(' ')
+        if scheme.lower() != 'bearer':
+            token = ''
+        if not hmac.compare_digest(token.encode(), admin_token.encode()):
+            abort(403)
+
+    @app.route('/admin/profiles')
+    def list_profiles():
+        """List profiles of recent slow requests"""
+        check_token()
+        return jsonify(profiler.summaries())
+
+    @app.route('/admin/profiles/<int:profile_id>.collapsed')
+    def get_profile_collapsed(profile_id):
+        """Download a profile as collapsed stacks"""
+        check_token()
+        profile = profiler.get(profile_id)
+        if profile is None:
+            abort(404)
+        return Response(to_collapsed(profile), mimetype='text/plain',
+                        headers={"Content-Disposition": f"attachment; filename=profile-{profile_id}.collapsed"})
+
+    @app.route('/admin/profiles/<int:profile_id>.speedscope.json')
+    def get_profile_speedscope(profile_id):
+        """Download a profile for speedscope"""
+        check_token()
+        profile = profiler.get(profile_id)
+        if profile is None:
+            abort(404)
+        return Response(json.dumps(to_speedscope(profile)), mimetype='application/json',
+                        headers={"Content-Disposition": f"attachment; filename=profile-{profile_id}.speedscope.json"})
@@ -0,0 +1,130 @@
+import datetime
+
+WEEKDAYS = ('monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday')
+
+
+def parse_gtfs_date(value):
+    """
+    Convert a GTFS YYYYMMDD date
+
+    Args:
+        value (str): GTFS date
+
+    Returns:
+        datetime.date: The date
+    """
+    return datetime.datetime.strptime(value, '%Y%m%d').date()
+
+
+class ServiceCalendar:
+    """
+    Date-aware service calendar
+
+    Active services for every date covered by calendar.txt and
+    calendar_dates.txt are precomputed as integer bitsets (bit i set when
+    service i runs), so a date lookup is a single dict access.
+    """
+
+    def __init__(self, calendar_rows, calendar_date_rows=()):
+        calendar_rows = list(calendar_rows)
+        calendar_date_rows = list(calendar_date_rows)
+
+        self.service_ids = []
+        self._service_bits = {}
+        for row in calendar_rows + calendar_date_rows:
+            if row['service_id'] not in self._service_bits:
+                self._service_bits[row['service_id']] = 1 << len(self.service_ids)
+                self.service_ids.append(row['service_id'])
+
+        self._masks = {}  # date -> bitset of active services
+
+        # Weekly patterns within each service's date range
+        for row in calendar_rows:
+            bit = self._service_bits[row['service_id']]
+            days = [row.get(day) == '1' for day in WEEKDAYS]
+            date = parse_gtfs_date(row['start_date'])
+            end = parse_gtfs_date(row['end_date'])
+            while date <= end:
+                if days[date.weekday()]:
+                    self._masks[date] = self._masks.get(date, 0) | bit
+                date += datetime.timedelta(days=1)
+
+        # Exceptions: 1 adds service on a date, 2 removes it
+        for row in calendar_date_rows:
+            bit = self._service_bits[row['service_id']]
+            date = parse_gtfs_date(row['date'])
+            if row.get('exception_type') == '1':
+                self._masks[date] = self._masks.get(date, 0) | bit
+            elif row.get('exception_type') == '2':
+                self._masks[date] = self._masks.get(date, 0) & ~bit
+
+        dates = [date for date, mask in self._masks.items() if mask]
+        self._range = (min(dates), max(dates)) if dates else (None, None)
+
+    def mask(self, date):
+        """
+        Get the bitset of services active on a date
+
+        Args:
+            date (datetime.date): Service date
+
+        Returns:
+            int: Bitset over service_ids
+        """
+        return self._masks.get(date, 0)
+
+    def bit(self, service_id):
+        """
+        Get the bit of a service
+
+        Args:
+            service_id (str): Service ID
+
+        Returns:
+            int: Bit, or 0 for unknown services
+        """
+        return self._service_bits.get(service_id, 0)
+
+    def active(self, date):
+        """
+        Get the service_ids active on a date
+
+        Args:
+            date (datetime.date): Service date
+
+        Returns:
+            set: Active service_ids
+        """
+        mask = self.mask(date)
+        return {service_id for i, service_id in enumerate(self.service_ids) if mask >> i & 1}
+
+    def date_range(self):
+        """
+        Get the span of dates with any service
+
+        Returns:
+            tuple: (first date, last date) or (None, None) if empty
+        """
+        return self._range
+
+    def effective_date(self, date):
+        """
+        Get the date whose services stand in for a date
+
+        Dates outside the calendar's span (e.g. after the feed has expired)
+        use the same weekday of the nearest covered week, so an outdated
+        feed still yields one realistic day of service. Dates inside the
+        span are returned unchanged, even if nothing runs on them.
+
+        Args:
+            date (datetime.date): Requested date
+
+        Returns:
+            datetime.date: Date to look services up on
+        """
+        first, last = self._range
+        if first is None or first <= date <= last:
+            return date
+        if date > last:
+            return date - datetime.timedelta(weeks=-(-(date - last).days // 7))
+        return date + datetime.timedelta(weeks=-(-(first - date).days // 7))
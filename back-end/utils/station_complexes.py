@@ -0,0 +1,215 @@
+import numpy as np
+
+
+class UnionFind:
+    """
+    Disjoint sets over 0..n-1 with path halving and union by size
+    """
+
+    def __init__(self, n):
+        self.parent = list(range(n))
+        self.size = [1] * n
+
+    def find(self, i):
+        parent = self.parent
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(self, a, b):
+        a, b = self.find(a), self.find(b)
+        if a == b:
+            return
+        if self.size[a] < self.size[b]:
+            a, b = b, a
+        self.parent[b] = a
+        self.size[a] += self.size[b]
+
+
+def _csr(groups, n_groups, *columns):
+    """
+    Pack grouped rows into compressed sparse rows
+
+    Args:
+        groups (np.ndarray): Group of each row
+        n_groups (int): Number of groups
+        *columns (np.ndarray): Row values, one array per column
+
+    Returns:
+        tuple: (offsets, *columns sorted by group); group g is column[offsets[g]:offsets[g + 1]]
+    """
+    order = np.argsort(groups, kind='stable')
+    offsets = np.zeros(n_groups + 1, dtype=np.int32)
+    np.cumsum(np.bincount(groups, minlength=n_groups), out=offsets[1:])
+    return (offsets,) + tuple(column[order] for column in columns)
+
+
+class StationComplexes:
+    """
+    Station complexes and the transfer graph
+
+    Stops are clustered with union-find over parent stations and
+    transfers.txt. Complex membership and the transfer adjacency are
+    stored as compressed sparse rows over dense stop codes, so membership,
+    routes and transfers for any stop are O(1) lookups plus a slice.
+    """
+
+    def __init__(self, stops, transfers, route_stops):
+        """
+        Build the complexes
+
+        Args:
+            stops (dict): stop_id -> stops.txt row
+            transfers (iterable): transfers.txt rows
+            route_stops (callable): Returns route_id -> set of stop_ids; only
+                called when routes are first requested, since it needs stop_times
+        """
+        self.stop_ids = list(stops)
+        self.codes = {stop_id: i for i, stop_id in enumerate(self.stop_ids)}
+        n = len(self.stop_ids)
+
+        # Cluster platforms with their parent station, then stations joined by transfers
+        sets = UnionFind(n)
+        for stop_id, stop in stops.items():
+            parent = stop.get('parent_station')
+            if parent in self.codes:
+                sets.union(self.codes[stop_id], self.codes[parent])
+
+        sources, targets, times = [], [], []
+        for row in transfers:
+            source, target = self.codes.get(row['from_stop_id']), self.codes.get(row['to_stop_id'])
+            if source is None or target is None:
+                continue
+            sets.union(source, target)
+            if row.get('transfer_type') != '3':  # 3: transfer not possible
+                sources.append(source)
+                targets.append(target)
+                times.append(int(row['min_transfer_time']) if row.get('min_transfer_time') else 0)
+
+        # Dense complex codes, numbered in stop order
+        roots = np.array([sets.find(i) for i in range(n)], dtype=np.int32)
+        _, first, self.complex_of = np.unique(roots, return_index=True, return_inverse=True)
+        order = np.argsort(first)
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+        self.complex_of = rank[self.complex_of].astype(np.int32)
+        n_complexes = len(order)
+
+        # Members of each complex (CSR)
+        self.member_offsets, self.member_codes = _csr(self.complex_of, n_complexes, np.arange(n, dtype=np.int32))
+
+        # Transfer adjacency between stops (CSR), with min_transfer_time weights
+        self.transfer_offsets, self.transfer_targets, self.transfer_times = _csr(
+            np.array(sources, dtype=np.int32), n,
+            np.array(targets, dtype=np.int32), np.array(times, dtype=np.int32))
+
+        # Complex ID: its first station (location_type 1, or a stop without a parent)
+        self.complex_ids = []
+        for c in range(n_complexes):
+            member_ids = [self.stop_ids[i] for i in self.member_codes[self.member_offsets[c]:self.member_offsets[c + 1]]]
+            stations = [s for s in member_ids if stops[s].get('location_type') == '1' or not stops[s].get('parent_station')]
+            self.complex_ids.append(min(stations or member_ids))
+        self.complex_codes = {complex_id: c for c, complex_id in enumerate(self.complex_ids)}
+
+        self._stops = stops
+        self._route_stops = route_stops
+        self._complex_routes = None
+
+    def __len__(self):
+        return len(self.complex_ids)
+
+    def complex_id(self, stop_id):
+        """
+        Get the complex containing a stop
+
+        Args:
+            stop_id (str): Any stop, platform or station ID
+
+        Returns:
+            str: Complex ID, or None for unknown stops
+        """
+        code = self.codes.get(stop_id)
+        return None if code is None else self.complex_ids[self.complex_of[code]]
+
+    def members(self, complex_id):
+        """
+        Get the stops in a complex
+
+        Args:
+            complex_id (str): Complex ID
+
+        Returns:
+            list: stop_ids
+        """
+        c = self.complex_codes[complex_id]
+        return [self.stop_ids[i] for i in self.member_codes[self.member_offsets[c]:self.member_offsets[c + 1]]]
+
+    def routes(self, complex_id):
+        """
+        Get the routes serving a complex
+
+        Args:
+            complex_id (str): Complex ID
+
+        Returns:
+            list: Sorted route_ids
+        """
+        if self._complex_routes is None:
+            complex_routes = [set() for _ in self.complex_ids]
+            for route_id, stop_ids in self._route_stops().items():
+                for stop_id in stop_ids:
+                    code = self.codes.get(stop_id)
+                    if code is not None:
+                        complex_routes[self.complex_of[code]].add(route_id)
+            self._complex_routes = [sorted(routes) for routes in complex_routes]
+
+        return self._complex_routes[self.complex_codes[complex_id]]
+
+    def transfers_from(self, stop_id):
+        """
+        Get the transfers out of a stop
+
+        Args:
+            stop_id (str): Stop ID
+
+        Returns:
+            list: (to_stop_id, min_transfer_time seconds) pairs
+        """
+        code = self.codes.get(stop_id)
+        if code is None:
+            return []
+        start, end = self.transfer_offsets[code], self.transfer_offsets[code + 1]
+        return [
+            (self.stop_ids[target], int(seconds))
+            for target, seconds in zip(self.transfer_targets[start:end], self.transfer_times[start:end])
+        ]
+
+    def describe(self, complex_id):
+        """
+        Build the API representation of a complex
+
+        Args:
+            complex_id (str): Complex ID
+
+        Returns:
+            dict: Complex with its stations, platforms, routes and transfers
+        """
+        members = self.members(complex_id)
+        stations = [
+            {"id": stop_id, "name": self._stops[stop_id]['stop_name']}
+            for stop_id in members
+            if self._stops[stop_id].get('location_type') == '1' or not self._stops[stop_id].get('parent_station')
+        ]
+        transfers = [
+            {"from_stop_id": stop_id, "to_stop_id": target, "min_transfer_time": seconds}
+            for stop_id in members for target, seconds in self.transfers_from(stop_id)
+        ]
+        return {
+            "id": complex_id,
+            "name": self._stops[complex_id]['stop_name'],
+            "stations": stations,
+            "stops": members,
+            "routes": self.routes(complex_id),
+            "transfers": transfers
+        }
@@ -0,0 +1,272 @@
+import re
+import unicodedata
+
+# Canonical forms for common station name words
+ABBREVIATIONS = {
+    'street': 'st', 'sts': 'st',
+    'avenue': 'av', 'ave': 'av', 'avenues': 'avs',
+    'square': 'sq',
+    'road': 'rd',
+    'boulevard': 'blvd',
+    'parkway': 'pkwy',
+    'place': 'pl',
+    'heights': 'hts',
+    'junction': 'jct',
+    'center': 'ctr', 'centre': 'ctr',
+    'terminal': 'term',
+    'plaza': 'plz',
+    'and': '&',
+}
+ORDINAL = re.compile(r'^(\d+)(st|nd|rd|th)$')
+TOKEN = re.compile(r'[a-z0-9&]+')
+
+
+def normalize_tokens(name):
+    """
+    Split a station name into canonical tokens
+
+    "42 St-Times Sq" and "Times Square - 42nd Street" both give
+    ['42', 'st', 'times', 'sq'] in their own order.
+
+    Args:
+        name (str): Station name or query
+
+    Returns:
+        list: Tokens
+    """
+    name = unicodedata.normalize('NFKD', name).encode('ascii', 'ignore').decode().lower()
+    tokens = []
+    for token in TOKEN.findall(name.replace("'", '')):
+        match = ORDINAL.match(token)
+        if match:
+            token = match.group(1)
+        tokens.append(ABBREVIATIONS.get(token, token))
+    return tokens
+
+
+def trigrams(text):
+    """
+    Get the padded character trigrams of a string
+
+    Args:
+        text (str): Normalized text
+
+    Returns:
+        set: Trigrams
+    """
+    text = f"  {text} "
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def edit_distance(a, b, limit):
+    """
+    Get the optimal string alignment distance (edits plus transpositions)
+
+    Args:
+        a (str): First word
+        b (str): Second word
+        limit (int): Stop early and return limit + 1 once the distance exceeds this
+
+    Returns:
+        int: Distance
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+
+    previous2, previous = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = a[i - 1] != b[j - 1]
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        if min(current) > limit:
+            return limit + 1
+        previous2, previous = previous, current
+
+    return previous[-1]
+
+
+class TrieNode:
+    __slots__ = ('children', 'stations')
+
+    def __init__(self):
+        self.children = {}
+        self.stations = set()  # Stations with a word under this prefix
+
+
+class StationIndex:
+    """
+    Autocomplete index over station names
+
+    A word prefix trie answers typed-ahead queries; a trigram index over
+    the name vocabulary shortlists words within a small edit distance to
+    catch typos when the trie finds too little. Child platforms are grouped under their parent station.
+    """
+
+    def __init__(self, feeds):
+        """
+        Build the index
+
+        Args:
+            feeds (dict): Agency -> StaticFeed
+        """
+        self.stations = []
+        self._keys = []  # Sorted token tuple per station
+        self._root = TrieNode()
+        self._words = {}  # word -> set of stations
+        self._word_trigrams = {}  # trigram -> set of words
+        self._similar = {}  # query word -> similar words, for repeated typos
+
+        for agency, feed in feeds.items():
+            stops = feed.stops
+            platforms = {}
+            for stop_id, stop in stops.items():
+                parent = stop.get('parent_station')
+                if parent and parent in stops:
+                    platforms.setdefault(parent, []).append(stop_id)
+
+            for stop_id, stop in stops.items():
+                location_type = stop.get('location_type') or '0'
+                is_station = location_type == '1' or (location_type == '0' and not stop.get('parent_station'))
+                if is_station:
+                    self._add(agency, stop_id, stop, sorted(platforms.get(stop_id, [])))
+
+        for word in self._words:
+            for gram in trigrams(word):
+                self._word_trigrams.setdefault(gram, set()).add(word)
+
+    def _add(self, agency, stop_id, stop, platforms):
+        index = len(self.stations)
+        tokens = normalize_tokens(stop['stop_name'])
+        self.stations.append({
+            "id": stop_id,
+            "name": stop['stop_name'],
+            "agency": agency,
+            "lat": float(stop['stop_lat']),
+            "lng": float(stop['stop_lon']),
+            "platforms": platforms
+        })
+        self._keys.append(tuple(sorted(tokens)))
+
+        for token in set(tokens):
+            self._words.setdefault(token, set()).add(index)
+            node = self._root
+            for char in token:
+                node = node.children.setdefault(char, TrieNode())
+                node.stations.add(index)
+
+    def _prefix(self, token):
+        node = self._root
+        for char in token:
+            node = node.children.get(char)
+            if node is None:
+                return ()
+        return node.stations
+
+    def _match_token(self, token, fuzzy):
+        """
+        Score stations against one query word
+
+        Args:
+            token (str): Normalized query word
+            fuzzy (bool): Also match similarly spelled words
+
+        Returns:
+            dict: Station index -> match quality (1 whole word, 0.8 prefix, below for typos)
+        """
+        matches = dict.fromkeys(self._prefix(token), 0.8)
+        matches.update(dict.fromkeys(self._words.get(token, ()), 1.0))
+
+        # Words that match as typed are not treated as typos
+        if fuzzy and not matches:
+            for word, quality in self._similar_words(token).items():
+                for index in self._words[word]:
+                    if matches.get(index, 0) < quality:
+                        matches[index] = quality
+
+        return matches
+
+    def _similar_words(self, token):
+        """
+        Find vocabulary words within a small edit distance of a query word
+
+        Args:
+            token (str): Normalized query word
+
+        Returns:
+            dict: Word -> match quality
+        """
+        similar = self._similar.get(token)
+        if similar is None:
+            # Trigrams shortlist the vocabulary; edit distance confirms the typo
+            limit = 1 if len(token) <= 5 else 2
+            candidates = set()
+            for gram in trigrams(token):
+                candidates.update(self._word_trigrams.get(gram, ()))
+
+            similar = {}
+            for word in candidates:
+                distance = edit_distance(token, word, limit)
+                if distance <= limit:
+                    similar[word] = 0.7 * (1 - distance / max(len(token), len(word)))
+
+            if len(self._similar) >= 4096:
+                self._similar.clear()
+            self._similar[token] = similar
+
+        return similar
+
+    def _score(self, tokens, fuzzy):
+        per_token = sorted((self._match_token(token, fuzzy) for token in set(tokens)), key=len)
+        if not per_token[0]:
+            return {}
+
+        key = tuple(sorted(tokens))
+        scored = {}
+        for index in per_token[0]:
+            qualities = [matches.get(index) for matches in per_token]
+            if None in qualities:
+                continue
+            score = sum(qualities) / len(qualities) - len(self._keys[index]) / 100
+            if self._keys[index] == key:
+                score += 1  # Same words in any order
+            scored[index] = score
+        return scored
+
+    def search(self, query, limit=10, agency=None):
+        """
+        Find stations by name
+
+        Every query word must start a word of the name, in any order. If
+        that yields fewer than limit stations, misspelled words are matched
+        too.
+
+        Args:
+            query (str): Search text
+            limit (int): Maximum results
+            agency (str): Only return stations of this agency
+
+        Returns:
+            list: Stations with a relevance score, best first
+        """
+        tokens = normalize_tokens(query)
+        if not tokens:
+            return []
+
+        scored = self._score(tokens, fuzzy=False)
+        if len(scored) < limit:
+            scored = self._score(tokens, fuzzy=True)
+
+        ranked = sorted(scored.items(), key=lambda item: (-item[1], self.stations[item[0]]["name"]))
+        results = []
+        for index, score in ranked:
+            station = self.stations[index]
+            if agency and station["agency"] != agency:
+                continue
+            results.append(dict(station, score=round(score, 3)))
+            if len(results) >= limit:
+                break
+
+        return results
@@ -0,0 +1,191 @@
+import datetime
+import threading
+import numpy as np
+
+DAY = 86400
+
+
+class Timetable:
+    """
+    Compiled timetable for connection scan queries
+
+    Every pair of consecutive stop_times of a trip becomes a connection
+    between two stations (platforms are folded into their parent station).
+    Connections are kept as parallel arrays sorted by departure time, and the
+    connections running on a service day are selected with a vectorized mask
+    and cached, so a query only scans the slice departing inside its window.
+    """
+
+    def __init__(self, feed, max_days=7):
+        """
+        Compile the timetable
+
+        Args:
+            feed (StaticFeed): Static feed with stop_times
+            max_days (int): Service days whose connections are kept compiled
+        """
+        self.feed = feed
+        self.max_days = max_days
+        stop_times = feed.stop_times
+        stops = feed.stops
+
+        # Stations: topmost ancestor of each stop (boarding areas sit below platforms)
+        self.station_ids = []
+        self.station_codes = {}
+        for stop_id in stops:
+            station = self._station_of(stops, stop_id)
+            if station not in self.station_codes:
+                self.station_codes[station] = len(self.station_ids)
+                self.station_ids.append(station)
+            self.station_codes[stop_id] = self.station_codes[station]
+
+        station_of = np.array(
+            [self.station_codes.get(stop_id, -1) for stop_id in stop_times.stop_ids], dtype=np.int32)[stop_times.stop]
+
+        # Consecutive rows of the same trip, skipping untimed stops
+        departure = np.where(stop_times.departure >= 0, stop_times.departure, stop_times.arrival)
+        arrival = np.where(stop_times.arrival >= 0, stop_times.arrival, stop_times.departure)
+        same_trip = stop_times.trip[:-1] == stop_times.trip[1:]
+        valid = same_trip & (departure[:-1] >= 0) & (arrival[1:] >= 0)
+        source, target = station_of[:-1], station_of[1:]
+        valid &= (source >= 0) & (target >= 0) & (source != target)
+
+        order = np.argsort(departure[:-1][valid], kind='stable')
+        self.departure = departure[:-1][valid][order]
+        self.arrival = arrival[1:][valid][order]
+        self.source = source[valid][order]
+        self.target = target[valid][order]
+        self.trip = stop_times.trip[:-1][valid][order]
+
+        # Service code per trip, -1 for trips missing from trips.txt
+        self.service_ids = sorted({trip['service_id'] for trip in feed.trips.values()})
+        service_codes = {service_id: i for i, service_id in enumerate(self.service_ids)}
+        trip_service = np.full(len(stop_times.trip_ids), -1, dtype=np.int32)
+        for i, trip_id in enumerate(stop_times.trip_ids):
+            trip = feed.trips.get(trip_id)
+            if trip is not None:
+                trip_service[i] = service_codes[trip['service_id']]
+        self.connection_service = trip_service[self.trip]
+
+        # Walking transfers between stations, and the minimum change time within each
+        self.change_time = np.zeros(len(self.station_ids), dtype=np.int32)
+        self.footpaths = {}
+        complexes = feed.station_complexes
+        for stop_id in complexes.stop_ids:
+            source_code = self.station_codes[stop_id]
+            for to_stop_id, seconds in complexes.transfers_from(stop_id):
+                target_code = self.station_codes[to_stop_id]
+                if target_code == source_code:
+                    self.change_time[source_code] = max(self.change_time[source_code], seconds)
+                else:
+                    paths = self.footpaths.setdefault(source_code, {})
+                    paths[target_code] = min(paths.get(target_code, seconds), seconds)
+        self.footpaths = {code: list(paths.items()) for code, paths in self.footpaths.items()}
+
+        self._days = {}  # service date -> connection arrays
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _station_of(stops, stop_id):
+        seen = {stop_id}
+        parent = stops[stop_id].get('parent_station')
+        while parent and parent in stops and parent not in seen:
+            seen.add(parent)
+            stop_id = parent
+            parent = stops[stop_id].get('parent_station')
+        return stop_id
+
+    def connections_on(self, date):
+        """
+        Get the connections running on a service day
+
+        Trips of the previous service day that run past midnight are
+        included, shifted back by 24 hours.
+
+        Args:
+            date (datetime.date): Service date
+
+        Returns:
+            tuple: (departure, arrival, source, target, trip) arrays sorted by departure
+        """
+        with self._lock:
+            connections = self._days.get(date)
+        if connections is not None:
+            return connections
+
+        today = np.flatnonzero(self._service_mask(date))
+        overnight = np.flatnonzero(self._service_mask(date - datetime.timedelta(days=1)) & (self.arrival >= DAY))
+        selected = np.concatenate((today, overnight))
+        shift = np.concatenate((np.zeros(len(today), dtype=np.int32), np.full(len(overnight), DAY, dtype=np.int32)))
+
+        departure = self.departure[selected] - shift
+        order = np.argsort(departure, kind='stable')
+        selected = selected[order]
+        connections = (
+            departure[order],
+            self.arrival[selected] - shift[order],
+            self.source[selected],
+            self.target[selected],
+            self.trip[selected]
+        )
+
+        with self._lock:
+            if len(self._days) >= self.max_days:
+                self._days.pop(next(iter(self._days)))
+            self._days[date] = connections
+        return connections
+
+    def _service_mask(self, date):
+        active = self.feed.services_on(date)
+        codes = np.array([i for i, service_id in enumerate(self.service_ids) if service_id in active], dtype=np.int32)
+        return np.isin(self.connection_service, codes)
+
+    def earliest_arrivals(self, origin, departure, horizon, date):
+        """
+        Find the earliest arrival at every station reachable from an origin
+
+        Connection scan: connections departing between the departure time
+        and the horizon are scanned once in departure order.
+
+        Args:
+            origin (int): Origin station code
+            departure (int): Departure time in seconds after midnight of the service day
+            horizon (int): Maximum travel time in seconds
+            date (datetime.date): Service date
+
+        Returns:
+            dict: Station code -> earliest arrival time in seconds
+        """
+        deadline = departure + horizon
+        departures, arrivals, sources, targets, trips = self.connections_on(date)
+        start = np.searchsorted(departures, departure, side='left')
+        end = np.searchsorted(departures, deadline, side='right')
+
+        arrival = {origin: departure}
+        ready = {origin: departure}  # Earliest time a new trip can be boarded at each station
+        self._walk(origin, departure, deadline, arrival, ready)
+        boarded = set()
+        change_time = self.change_time
+
+        for dep, arr, source, target, trip in zip(
+                departures[start:end].tolist(), arrivals[start:end].tolist(), sources[start:end].tolist(),
+                targets[start:end].tolist(), trips[start:end].tolist()):
+            if trip not in boarded:
+                if ready.get(source, deadline + 1) > dep:
+                    continue
+                boarded.add(trip)
+            if arr <= deadline and arr < arrival.get(target, deadline + 1):
+                arrival[target] = arr
+                board = arr + int(change_time[target])
+                if board < ready.get(target, board + 1):
+                    ready[target] = board
+                self._walk(target, arr, deadline, arrival, ready)
+
+        return arrival
+
+    def _walk(self, station, time, deadline, arrival, ready):
+        for target, seconds in self.footpaths.get(station, ()):
+            walked = time + seconds
+            if walked <= deadline and walked < arrival.get(target, deadline + 1):
+                arrival[target] = walked
+                ready[target] = min(ready.get(target, walked), walked)
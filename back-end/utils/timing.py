@@ -0,0 +1,178 @@
+"""Per-request phase timing (fetch / parse / serialize)"""
+import collections
+import contextlib
+import json
+import threading
+import time
+from flask import request
+from flask.json.provider import DefaultJSONProvider
+
+PHASES = ('fetch', 'parse', 'serialize')
+
+
+class PhaseTimer:
+    """
+    Accumulates phase durations for the request running on each thread
+
+    Outside a request (CLI, benchmarks) phases are not recorded.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+
+    def begin(self):
+        """Start recording phases for the current thread"""
+        self._local.phases = {}
+        self._local.feed = None
+        self._local.start = time.perf_counter()
+
+    def end(self):
+        """
+        Stop recording for the current thread
+
+        Returns:
+            tuple: (feed label or None, phase -> seconds, total seconds), or None if not recording
+        """
+        phases = getattr(self._local, 'phases', None)
+        if phases is None:
+            return None
+        self._local.phases = None
+        return self._local.feed, phases, time.perf_counter() - self._local.start
+
+    def set_feed(self, feed):
+        """
+        Label the current request with the feed it serves
+
+        Args:
+            feed (str): Feed label, e.g. 'subway_ace'
+        """
+        if getattr(self._local, 'phases', None) is not None:
+            self._local.feed = feed
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """
+        Time a block as part of a phase
+
+        Args:
+            name (str): Phase name
+        """
+        phases = getattr(self._local, 'phases', None)
+        if phases is None:
+            yield
+            return
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            phases[name] = phases.get(name, 0.0) + time.perf_counter() - start
+
+
+class PhaseStats:
+    """
+    Aggregated phase timings per feed over the most recent requests
+    """
+
+    def __init__(self, max_samples=1024):
+        self.max_samples = max_samples
+        self._samples = {}  # (feed, phase) -> deque of seconds
+        self._counts = collections.Counter()  # feed -> requests
+        self._lock = threading.Lock()
+
+    def record(self, feed, phases, total):
+        with self._lock:
+            self._counts[feed] += 1
+            for name, seconds in list(phases.items()) + [('total', total)]:
+                samples = self._samples.get((feed, name))
+                if samples is None:
+                    samples = self._samples[(feed, name)] = collections.deque(maxlen=self.max_samples)
+                samples.append(seconds)
+
+    def summary(self):
+        """
+        Summarize phase timings per feed
+
+        Returns:
+            dict: Feed -> request count, per-phase latency in milliseconds and the dominant phase
+        """
+        with self._lock:
+            samples = {key: sorted(values) for key, values in self._samples.items()}
+            counts = dict(self._counts)
+
+        feeds = {}
+        for (feed, name), values in samples.items():
+            entry = feeds.setdefault(feed, {"requests": counts.get(feed, 0), "phases": {}})
+            entry["phases"][name] = {
+                "samples": len(values),
+                "mean_ms": round(sum(values) / len(values) * 1000, 3),
+                "p50_ms": round(values[len(values) // 2] * 1000, 3),
+                "p95_ms": round(values[min(len(values) - 1, int(len(values) * 0.95))] * 1000, 3),
+                "max_ms": round(values[-1] * 1000, 3)
+            }
+
+        for entry in feeds.values():
+            # Time spent per request on average, including requests that skipped a phase
+            shares = {
+                name: stats["mean_ms"] * stats["samples"]
+                for name, stats in entry["phases"].items() if name != 'total'
+            }
+            entry["dominant_phase"] = max(shares, key=shares.get) if shares else None
+
+        return feeds
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """
+    JSON provider that records jsonify time as the serialize phase
+    """
+
+    def response(self, *args, **kwargs):
+        with timer.phase('serialize'):
+            return super().response(*args, **kwargs)
+
+
+def init_app(app, log=True):
+    """
+    Time request phases, add a Server-Timing header and log realtime requests
+
+    Args:
+        app (Flask): Application
+        log (bool): Print one JSON line per request that served a feed
+    """
+    app.json = TimedJSONProvider(app)
+
+    @app.before_request
+    def start_timing():
+        timer.begin()
+
+    @app.after_request
+    def add_server_timing(response):
+        timing = timer.end()
+        if timing is None:
+            return response
+
+        feed, phases, total = timing
+        metrics = [f"{name};dur={phases[name] * 1000:.2f}" for name in PHASES if name in phases]
+        metrics.append(f"total;dur={total * 1000:.2f}")
+        response.headers['Server-Timing'] = ', '.join(metrics)
+
+        if feed:
+            phase_stats.record(feed, phases, total)
+            if log:
+                print(json.dumps({
+                    "event": "request_timing",
+                    "method": request.method,
+                    "path": request.path,
+                    "feed": feed,
+                    "status": response.status_code,
+                    "phases_ms": {name: round(seconds * 1000, 3) for name, seconds in phases.items()},
+                    "total_ms": round(total * 1000, 3)
+                }))
+
+        return response
+
+
+# Create global instances
+timer = PhaseTimer()
+phase_stats = PhaseStats()
@@ -0,0 +1,42 @@
+import { decodeTile } from '../../utility/vectorTiles'
+
+// Encoded by the back-end's utils/mvt.py: a 'routes' layer with one two-part
+// line and a 'stations' layer with one point carrying each value type
+const TILE = new Uint8Array([
+    26, 74, 120, 2, 10, 6, 114, 111, 117, 116, 101, 115, 18, 26, 18, 4, 0, 0, 1, 1, 24, 2, 34, 16, 9, 0, 0, 18, 20,
+    10, 20, 9, 9, 160, 1, 200, 1, 10, 19, 20, 26, 8, 114, 111, 117, 116, 101, 95, 105, 100, 26, 5, 99, 111, 108, 111,
+    114, 34, 3, 10, 1, 65, 34, 9, 10, 7, 35, 50, 56, 53, 48, 65, 68, 40, 128, 32, 26, 101, 120, 2, 10, 8, 115, 116,
+    97, 116, 105, 111, 110, 115, 18, 19, 18, 10, 0, 0, 1, 1, 2, 2, 3, 3, 4, 4, 24, 1, 34, 3, 9, 10, 14, 26, 2, 105,
+    100, 26, 4, 110, 97, 109, 101, 26, 5, 108, 101, 118, 101, 108, 26, 5, 114, 97, 116, 105, 111, 26, 4, 111, 112,
+    101, 110, 34, 5, 10, 3, 65, 50, 55, 34, 7, 10, 5, 52, 50, 32, 83, 116, 34, 2, 48, 1, 34, 9, 25, 0, 0, 0, 0, 0, 0,
+    248, 63, 34, 2, 56, 1, 40, 128, 32
+])
+
+test('decodes layers, geometry and properties', () => {
+    const [routes, stations] = decodeTile(TILE)
+
+    expect(routes.name).toBe('routes')
+    expect(routes.extent).toBe(4096)
+    expect(routes.features).toEqual([
+        {
+            type: 2,
+            properties: { route_id: 'A', color: '#2850AD' },
+            geometry: [
+                [
+                    { x: 0, y: 0 },
+                    { x: 10, y: 5 },
+                    { x: 20, y: 0 }
+                ],
+                [
+                    { x: 100, y: 100 },
+                    { x: 90, y: 110 }
+                ]
+            ]
+        }
+    ])
+
+    expect(stations.name).toBe('stations')
+    expect(stations.features[0].type).toBe(1)
+    expect(stations.features[0].geometry).toEqual([[{ x: 5, y: 7 }]])
+    expect(stations.features[0].properties).toEqual({ id: 'A27', name: '42 St', level: -1, ratio: 1.5, open: true })
+})
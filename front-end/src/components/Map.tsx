@@ -2,12 +2,16 @@
 import React, { useEffect, useState, useRef } from 'react';
 import GoogleMapReact from 'google-map-react';
 import Marker from './Marker';
+import { createVectorTileMapType } from '../utility/vectorTiles';
 
 interface MapProps {
   center: { lat: number; lng: number };
   zoom: number;
 }
 
+// 后端按 z/x/y 提供的矢量切片（站点 + 线路形状）
+const TILE_URL = 'http://127.0.0.1:5000/tiles/{z}/{x}/{y}.mvt';
+
 export default function SubwayMap() {
   const [stations, setStations] = useState([]);          // 存放所有站点数据
   const [lineCoordinates, setLineCoordinates] = useState([]);  // 当前要绘制的线路坐标
@@ -70,10 +74,12 @@ export default function SubwayMap() {
 
   }, [lineCoordinates]);
 
-  // 4. Google Map 的 onGoogleApiLoaded 回调
+  // 4. Google Map 的 onGoogleApiLoaded 回调：
+  // 叠加矢量切片图层，地图只下载当前视野和缩放级别内的线路形状；站点仍由 Marker 负责点击
   const handleApiLoaded = ({ map, maps }) => {
     mapRef.current = map;
     mapsRef.current = maps;
+    map.overlayMapTypes.push(createVectorTileMapType(maps, TILE_URL));
   };
 
   return (
@@ -0,0 +1,249 @@
+/**
+ * Minimal Mapbox Vector Tile (v2.1) reader and a Google Maps overlay that
+ * draws the back-end's /tiles/{z}/{x}/{y}.mvt tiles onto canvases, so the
+ * map only downloads the stations and route shapes that are visible.
+ */
+
+export type TileValue = string | number | boolean
+
+export interface TileFeature {
+    type: number
+    properties: Record<string, TileValue>
+    geometry: { x: number; y: number }[][]
+}
+
+export interface TileLayer {
+    name: string
+    extent: number
+    features: TileFeature[]
+}
+
+const GEOM_POINT = 1
+const GEOM_LINESTRING = 2
+
+class Reader {
+    pos: number
+    end: number
+
+    constructor(public buf: Uint8Array, start = 0, end = buf.length) {
+        this.pos = start
+        this.end = end
+    }
+
+    varint(): number {
+        let value = 0
+        let shift = 0
+        let byte: number
+        do {
+            byte = this.buf[this.pos++]
+            value += (byte & 0x7f) * 2 ** shift
+            shift += 7
+        } while (byte & 0x80)
+        return value
+    }
+
+    // Reader over the next length-delimited field
+    sub(): Reader {
+        const length = this.varint()
+        const reader = new Reader(this.buf, this.pos, this.pos + length)
+        this.pos += length
+        return reader
+    }
+
+    string(): string {
+        const reader = this.sub()
+        return new TextDecoder().decode(this.buf.subarray(reader.pos, reader.end))
+    }
+
+    packed(): number[] {
+        const reader = this.sub()
+        const values: number[] = []
+        while (reader.pos < reader.end) values.push(reader.varint())
+        return values
+    }
+
+    skip(wireType: number) {
+        if (wireType === 0) this.varint()
+        else if (wireType === 1) this.pos += 8
+        else if (wireType === 2) this.pos += this.varint()
+        else if (wireType === 5) this.pos += 4
+        else throw new Error('Unsupported wire type ' + wireType)
+    }
+}
+
+const zigzag = (n: number): number => (n % 2 === 0 ? n / 2 : -(n + 1) / 2)
+
+const readValue = (reader: Reader): TileValue => {
+    let value: TileValue = ''
+    while (reader.pos < reader.end) {
+        const tag = reader.varint()
+        const field = tag >> 3
+        if (field === 1) value = reader.string()
+        else if (field === 2) {
+            value = new DataView(reader.buf.buffer, reader.buf.byteOffset + reader.pos, 4).getFloat32(0, true)
+            reader.pos += 4
+        } else if (field === 3) {
+            value = new DataView(reader.buf.buffer, reader.buf.byteOffset + reader.pos, 8).getFloat64(0, true)
+            reader.pos += 8
+        } else if (field === 4 || field === 5) value = reader.varint()
+        else if (field === 6) value = zigzag(reader.varint())
+        else if (field === 7) value = reader.varint() === 1
+        else reader.skip(tag & 0x7)
+    }
+    return value
+}
+
+const decodeGeometry = (commands: number[]): { x: number; y: number }[][] => {
+    const parts: { x: number; y: number }[][] = []
+    let x = 0
+    let y = 0
+    let i = 0
+    while (i < commands.length) {
+        const command = commands[i] & 0x7
+        const count = commands[i] >> 3
+        i++
+        if (command === 7) continue // ClosePath
+        for (let n = 0; n < count; n++) {
+            x += zigzag(commands[i++])
+            y += zigzag(commands[i++])
+            if (command === 1) parts.push([])
+            parts[parts.length - 1].push({ x, y })
+        }
+    }
+    return parts
+}
+
+/**
+ * Decode a vector tile
+ * @param data Tile bytes
+ * @returns The tile's layers
+ */
+export const decodeTile = (data: ArrayBuffer | Uint8Array): TileLayer[] => {
+    const tile = new Reader(data instanceof Uint8Array ? data : new Uint8Array(data))
+    const layers: TileLayer[] = []
+    while (tile.pos < tile.end) {
+        const tag = tile.varint()
+        if (tag >> 3 !== 3) {
+            tile.skip(tag & 0x7)
+            continue
+        }
+
+        const reader = tile.sub()
+        const keys: string[] = []
+        const values: TileValue[] = []
+        const raw: { tags: number[]; type: number; geometry: number[] }[] = []
+        const layer: TileLayer = { name: '', extent: 4096, features: [] }
+        while (reader.pos < reader.end) {
+            const field = reader.varint()
+            if (field >> 3 === 1) layer.name = reader.string()
+            else if (field >> 3 === 3) keys.push(reader.string())
+            else if (field >> 3 === 4) values.push(readValue(reader.sub()))
+            else if (field >> 3 === 5) layer.extent = reader.varint()
+            else if (field >> 3 === 2) {
+                const featureReader = reader.sub()
+                const feature = { tags: [] as number[], type: 0, geometry: [] as number[] }
+                while (featureReader.pos < featureReader.end) {
+                    const featureField = featureReader.varint()
+                    if (featureField >> 3 === 2) feature.tags = featureReader.packed()
+                    else if (featureField >> 3 === 3) feature.type = featureReader.varint()
+                    else if (featureField >> 3 === 4) feature.geometry = featureReader.packed()
+                    else featureReader.skip(featureField & 0x7)
+                }
+                raw.push(feature)
+            } else reader.skip(field & 0x7)
+        }
+
+        // Keys and values may follow the features that reference them
+        layer.features = raw.map(({ tags, type, geometry }) => {
+            const properties: Record<string, TileValue> = {}
+            for (let i = 0; i + 1 < tags.length; i += 2) properties[keys[tags[i]]] = values[tags[i + 1]]
+            return { type, properties, geometry: decodeGeometry(geometry) }
+        })
+        layers.push(layer)
+    }
+    return layers
+}
+
+/**
+ * Draw decoded layers onto a tile canvas: route lines in their route color,
+ * then stations as dots
+ */
+export const drawTile = (canvas: HTMLCanvasElement, layers: TileLayer[], size: number) => {
+    const context = canvas.getContext('2d')
+    if (!context) return
+
+    const ratio = canvas.width / size
+    const ordered = [...layers].sort((a, b) => (a.name === 'stations' ? 1 : 0) - (b.name === 'stations' ? 1 : 0))
+    for (const layer of ordered) {
+        const scale = canvas.width / layer.extent
+        for (const feature of layer.features) {
+            if (feature.type === GEOM_LINESTRING) {
+                context.strokeStyle = String(feature.properties.color || '#808183')
+                context.lineWidth = 3 * ratio
+                context.lineJoin = 'round'
+                context.lineCap = 'round'
+                context.beginPath()
+                for (const part of feature.geometry) {
+                    part.forEach(({ x, y }, i) =>
+                        i === 0 ? context.moveTo(x * scale, y * scale) : context.lineTo(x * scale, y * scale)
+                    )
+                }
+                context.stroke()
+            } else if (feature.type === GEOM_POINT) {
+                context.fillStyle = '#ffffff'
+                context.strokeStyle = '#222222'
+                context.lineWidth = ratio
+                for (const part of feature.geometry) {
+                    for (const { x, y } of part) {
+                        context.beginPath()
+                        context.arc(x * scale, y * scale, 3.5 * ratio, 0, 2 * Math.PI)
+                        context.fill()
+                        context.stroke()
+                    }
+                }
+            }
+        }
+    }
+}
+
+/**
+ * Create a Google Maps overlay map type backed by vector tiles
+ * @param maps The google.maps namespace
+ * @param tileUrl Tile URL template with {z}, {x} and {y}
+ * @returns A MapType for map.overlayMapTypes
+ */
+export const createVectorTileMapType = (maps: any, tileUrl: string) => {
+    const size = 256
+    const requests = new Map<HTMLCanvasElement, AbortController>()
+
+    return {
+        tileSize: new maps.Size(size, size),
+        maxZoom: 18, // TILE_MAX_ZOOM on the back-end
+        name: 'Subway',
+        getTile(coord: { x: number; y: number }, zoom: number, ownerDocument: Document) {
+            const canvas = ownerDocument.createElement('canvas')
+            const ratio = window.devicePixelRatio || 1
+            canvas.width = canvas.height = size * ratio
+            canvas.style.width = canvas.style.height = size + 'px'
+
+            // Google Maps repeats the world horizontally; wrap x into range
+            const count = 1 << zoom
+            const x = ((coord.x % count) + count) % count
+            if (coord.y < 0 || coord.y >= count) return canvas
+
+            const controller = new AbortController()
+            requests.set(canvas, controller)
+            const url = tileUrl.replace('{z}', String(zoom)).replace('{x}', String(x)).replace('{y}', String(coord.y))
+            fetch(url, { signal: controller.signal })
+                .then((res) => (res.ok ? res.arrayBuffer() : null))
+                .then((data) => data && drawTile(canvas, decodeTile(data), size))
+                .catch((err) => err.name !== 'AbortError' && console.error('Failed to load tile', url, err))
+                .finally(() => requests.delete(canvas))
+            return canvas
+        },
+        releaseTile(canvas: HTMLCanvasElement) {
+            requests.get(canvas)?.abort()
+            requests.delete(canvas)
+        }
+    }
+}